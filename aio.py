@@ -0,0 +1,147 @@
+"""
+asyncio facade over MockDocker. Calls run on the event loop against the same
+state as the synchronous client, optionally after a simulated latency.
+"""
+from .mock_docker import DeferredCall
+
+
+class AsyncMockDocker:
+    """
+    Async client surface for a MockDocker instance. latency is the simulated
+    delay of every API call in seconds, either a number or a callable that
+    returns one per call. It is added to the latency of the MockDocker clock
+    and awaited with the clock, so calls wait concurrently and a
+    clock.VirtualClock is advanced instead of sleeping.
+    """
+
+    def __init__(self, mock_docker, latency=0):
+        self.mock_docker = mock_docker
+        self.latency = latency
+
+    def DockerClient(self, base_url=None, **kwargs):
+        """
+        Return an AsyncClient for the session MockDocker.DockerClient opens
+        """
+        return AsyncClient(self.mock_docker.DockerClient(base_url=base_url, **kwargs), self)
+
+    def from_env(self, environment=None, **kwargs):
+        return AsyncClient(self.mock_docker.from_env(environment=environment, **kwargs), self)
+
+    async def _call(self, func, *args, **kwargs):
+        delay = self.latency() if callable(self.latency) else self.latency
+        # The first attempt stops at the API call with its clock latency
+        call = None
+        try:
+            with self.mock_docker._deferred():
+                result = func(*args, **kwargs)
+        except DeferredCall as deferred:
+            call = deferred
+        # Always yield so concurrent calls interleave as they would over a socket
+        await self.mock_docker._clock.async_sleep((delay or 0) + (call.delay if call is not None else 0))
+        if call is None:
+            return result
+        with self.mock_docker._deferred(call):
+            return func(*args, **kwargs)
+
+
+class AsyncClient:
+    """
+    Async view of a MockDocker.Client session
+    """
+
+    def __init__(self, client, aio):
+        self._client = client
+        self._aio = aio
+        self.nodes = AsyncNodes(client.nodes, aio)
+
+    @property
+    def swarm(self):
+        # Resolved on access like Client.swarm
+        return AsyncSwarm(self._client.swarm, self._aio)
+
+
+class AsyncNodes:
+
+    def __init__(self, nodes, aio):
+        self._nodes = nodes
+        self._aio = aio
+
+    async def get(self, id_or_name):
+        return AsyncNode(await self._aio._call(self._nodes.get, id_or_name), self._aio)
+
+    async def list(self, **kwargs):
+        return [AsyncNode(node, self._aio) for node in await self._aio._call(self._nodes.list, **kwargs)]
+
+    async def iter(self, **kwargs):
+        """
+        Asynchronously iterate over the nodes list() would return, the latency
+        is paid once before the first node
+        """
+        nodes = await self._aio._call(self._nodes.iter, **kwargs)
+        for node in nodes:
+            yield AsyncNode(node, self._aio)
+
+    async def update_many(self, node_specs):
+        return [AsyncNode(node, self._aio) for node in await self._aio._call(self._nodes.update_many, node_specs)]
+
+    async def set_availability(self, availability, filters=None):
+        changed = await self._aio._call(self._nodes.set_availability, availability, filters=filters)
+        return [AsyncNode(node, self._aio) for node in changed]
+
+
+class AsyncNode:
+    """
+    Async view of a MockDocker.Node, attributes such as attrs, id and version
+    are read from the wrapped Node
+    """
+
+    def __init__(self, node, aio):
+        self._node = node
+        self._aio = aio
+
+    def __getattr__(self, name):
+        return getattr(self._node, name)
+
+    async def update(self, node_spec, version=None):
+        return await self._aio._call(self._node.update, node_spec, version=version)
+
+    async def reload(self):
+        return await self._aio._call(self._node.reload)
+
+
+class AsyncSwarm:
+    """
+    Async view of a MockDocker.Swarm, attributes such as attrs and version
+    are read from the wrapped Swarm
+    """
+
+    def __init__(self, swarm, aio):
+        self._swarm = swarm
+        self._aio = aio
+
+    def __getattr__(self, name):
+        return getattr(self._swarm, name)
+
+    async def get_unlock_key(self):
+        return await self._aio._call(self._swarm.get_unlock_key)
+
+    async def init(self, **kwargs):
+        return await self._aio._call(self._swarm.init, **kwargs)
+
+    async def join(self, **kwargs):
+        return await self._aio._call(self._swarm.join, **kwargs)
+
+    async def leave(self, force=False):
+        return await self._aio._call(self._swarm.leave, force=force)
+
+    async def unlock(self, key):
+        return await self._aio._call(self._swarm.unlock, key)
+
+    async def update(self, **kwargs):
+        return await self._aio._call(self._swarm.update, **kwargs)
+
+    async def update_batch(self, updates):
+        return await self._aio._call(self._swarm.update_batch, updates)
+
+    async def reload(self):
+        return await self._aio._call(self._swarm.reload)
@@ -0,0 +1,229 @@
+"""
+Clocks used by MockDocker for timestamps, simulated API latency and node
+heartbeats. VirtualClock only moves when it is advanced, so timeouts can be
+tested without sleeping.
+"""
+import abc
+import asyncio
+import datetime
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+def constant(seconds):
+    """
+    Latency distribution that always returns seconds
+    """
+    return lambda rng: seconds
+
+
+def uniform(low, high):
+    """
+    Latency distribution uniform between low and high seconds
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def normal(mean, stddev):
+    """
+    Latency distribution normal around mean seconds, never negative
+    """
+    return lambda rng: max(0.0, rng.gauss(mean, stddev))
+
+
+def exponential(mean):
+    """
+    Latency distribution exponential with the given mean in seconds
+    """
+    return lambda rng: rng.expovariate(1.0 / mean)
+
+
+class Clock(abc.ABC):
+    """
+    Base clock. Keeps the latency distributions of each endpoint, sampled
+    from a seeded random number generator.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        # Endpoint (or None for every endpoint) -> distribution
+        self._latencies = {}
+
+    @abc.abstractmethod
+    def now(self):
+        """
+        Current time in seconds since the epoch
+        """
+
+    @abc.abstractmethod
+    def sleep(self, seconds):
+        """
+        Wait until the clock has moved forward by seconds
+        """
+
+    async def async_sleep(self, seconds):
+        """
+        sleep() for the asyncio facade. Clocks whose sleep does not block, like
+        VirtualClock, sleep then yield to the event loop.
+        """
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def timestamp(self):
+        """
+        Current time in the format Docker uses for CreatedAt and UpdatedAt
+        """
+        now = datetime.datetime.fromtimestamp(self.now(), datetime.timezone.utc)
+        return now.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def set_latency(self, latency, endpoint=None):
+        """
+        Set the simulated latency of API calls through endpoint, an
+        endpoints.Endpoint, or of every endpoint without its own latency when
+        endpoint is None. latency is a number of seconds, a distribution such
+        as clock.normal(0.01, 0.002), or None to remove it.
+        """
+        if latency is None:
+            self._latencies.pop(endpoint, None)
+        elif callable(latency):
+            self._latencies[endpoint] = latency
+        else:
+            self._latencies[endpoint] = constant(latency)
+
+    def latency(self, endpoint=None):
+        """
+        Sample the latency of one API call through endpoint
+        """
+        distribution = self._latencies.get(endpoint) or self._latencies.get(None)
+        if distribution is None:
+            return 0
+        return distribution(self.rng)
+
+
+class SystemClock(Clock):
+    """
+    Wall clock time, latency is simulated with real sleeps
+    """
+
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def async_sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """
+    Clock that only moves when advance() or sleep() is called. Callbacks
+    scheduled with call_later() run, in order, as the clock passes them.
+    """
+
+    def __init__(self, start=None, seed=None):
+        super().__init__(seed)
+        self._now = time.time() if start is None else start
+        self._timers = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # Coroutines woken by async_sleep that have not resumed yet
+        self._waking = 0
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    async def async_sleep(self, seconds):
+        """
+        Wait until the clock reaches now + seconds. Concurrent waits overlap:
+        once every waiting coroutine has scheduled its wake-up the clock is
+        advanced to the earliest deadline, not by each coroutine's latency.
+        """
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+        fired = []
+
+        def wake():
+            with self._lock:
+                self._waking += 1
+            fired.append(True)
+            loop.call_soon_threadsafe(_resolve, woken)
+
+        timer = self.call_later(seconds, wake)
+        try:
+            while not woken.done():
+                # Let the other coroutines schedule their wake-ups first
+                await asyncio.sleep(0)
+                # A woken coroutine that has not resumed yet may wait again
+                # with an earlier deadline, so the clock waits for it
+                if not woken.done() and not self._waking:
+                    until = self._until_next()
+                    if until is not None:
+                        self.advance(until)
+        finally:
+            timer.cancel()
+            if fired:
+                with self._lock:
+                    self._waking -= 1
+
+    def _until_next(self):
+        """
+        Seconds until the earliest callback that has not been cancelled, None if there is none
+        """
+        with self._lock:
+            while self._timers and self._timers[0][2].cancelled:
+                heapq.heappop(self._timers)
+            if not self._timers:
+                return None
+            return max(0, self._timers[0][0] - self._now)
+
+    def advance(self, seconds):
+        """
+        Move the clock forward by seconds, running every callback that comes due
+        """
+        if seconds < 0:
+            raise ValueError("Cannot move the clock backwards")
+        with self._lock:
+            target = self._now + seconds
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > target:
+                    self._now = max(self._now, target)
+                    return
+                when, _, timer = heapq.heappop(self._timers)
+                self._now = max(self._now, when)
+            if not timer.cancelled:
+                timer.callback()
+
+    def call_later(self, delay, callback):
+        """
+        Run callback once the clock has advanced by delay seconds, returns a
+        Timer that can be cancelled
+        """
+        timer = Timer(callback)
+        with self._lock:
+            heapq.heappush(self._timers, (self._now + delay, next(self._sequence), timer))
+        return timer
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Timer:
+
+    __slots__ = ('callback', 'cancelled')
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
@@ -0,0 +1,214 @@
+"""
+Compiles a client_dict definition json into a binary artifact that MockDocker
+can load without parsing and validating the json again
+"""
+import contextlib
+import gc
+import hashlib
+import json
+import marshal
+import os
+import sys
+
+try:
+    from .validate import validate_swarm_data, node_errors
+    from .node_store import build_store, STORE_EXTENSION
+    from .registry import NodeRegistry
+except ImportError:
+    from validate import validate_swarm_data, node_errors
+    from node_store import build_store, STORE_EXTENSION
+    from registry import NodeRegistry
+
+
+MAGIC = b'MDKF'
+# Bump when the layout of the artifact or the validation it records changes
+# 2: the node registry indexes are stored after the client_dict
+# 3: node validation keys results per node, artifacts validated when nodes
+#    without an ID shared a key may hold nodes that now fail
+SCHEMA_VERSION = 3
+ARTIFACT_EXTENSION = '.mdc'
+
+
+def artifact_path(path):
+    """
+    Return the path of the compiled artifact for a client_dict json
+    """
+    return os.path.splitext(path)[0] + ARTIFACT_EXTENSION
+
+
+def _file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _header(path):
+    stat = os.stat(path)
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'python': list(sys.version_info[:2]),
+        'marshal_version': marshal.version,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': _file_hash(path),
+    }
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """
+    Disable the garbage collector for the block. Loading a large fixture
+    allocates many containers that all stay alive, collections triggered
+    along the way only rescan them.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _load_validated(path):
+    """
+    Parse and validate the client_dict json at path, raises an Exception with
+    the validation errors if it is not valid
+    """
+    with open(path, 'r') as client_dict_file:
+        client_dict = json.load(client_dict_file)
+
+    swarm_errors = validate_swarm_data(client_dict.get('swarms', []))
+    if len(swarm_errors) > 0:
+        raise Exception(f'{json.dumps(swarm_errors, indent=4)}')
+    errors = node_errors(client_dict.get('nodes', []), client_dict.get('swarms'))
+    if len(errors) > 0:
+        raise Exception(f'{json.dumps(errors, indent=4)}')
+    return client_dict
+
+
+def compile_fixture(path, output=None):
+    """
+    Validate the client_dict json at path and write it as a compiled artifact.
+    Raises an Exception with the validation errors if the json is not valid.
+    Returns the path of the artifact.
+    """
+    client_dict = _load_validated(path)
+    output = output or artifact_path(path)
+    header = marshal.dumps(_header(path))
+    with open(output, 'wb') as artifact:
+        artifact.write(MAGIC)
+        artifact.write(len(header).to_bytes(4, 'little'))
+        artifact.write(header)
+        # The indexes are stored so loading does not build them again
+        node_index = NodeRegistry(client_dict.get('nodes', [])).snapshot()
+        artifact.write(marshal.dumps((client_dict, node_index)))
+    return output
+
+
+def compile_store(path, output=None):
+    """
+    Validate the client_dict json at path and write it as a memory mapped node
+    store for MockDocker.from_store. Returns the path of the store.
+    """
+    client_dict = _load_validated(path)
+    return build_store(client_dict, output or os.path.splitext(path)[0] + STORE_EXTENSION)
+
+
+def _load_artifact(path, artifact=None):
+    """
+    Return (client_dict, node_index) from the compiled artifact of the json at
+    path, or None if there is no artifact or it is stale
+    """
+    artifact = artifact or artifact_path(path)
+    try:
+        artifact_file = open(artifact, 'rb')
+    except OSError:
+        return None
+
+    with artifact_file:
+        if artifact_file.read(len(MAGIC)) != MAGIC:
+            return None
+        header_length = int.from_bytes(artifact_file.read(4), 'little')
+        try:
+            header = marshal.loads(artifact_file.read(header_length))
+        except (EOFError, ValueError, TypeError):
+            return None
+        if (header.get('schema_version') != SCHEMA_VERSION
+                or header.get('python') != list(sys.version_info[:2])
+                or header.get('marshal_version') != marshal.version):
+            return None
+
+        # Size and mtime are enough when the json has not been touched, otherwise
+        # compare the content hash
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) != (header['source_size'], header['source_mtime_ns']):
+            if stat.st_size != header['source_size'] or _file_hash(path) != header['source_sha256']:
+                return None
+        body = artifact_file.read()
+    with paused_gc():
+        return marshal.loads(body)
+
+
+def load_compiled(path, artifact=None):
+    """
+    Return the client_dict stored in the compiled artifact of the json at path,
+    or None if there is no artifact or it is stale
+    """
+    loaded = _load_artifact(path, artifact)
+    return None if loaded is None else loaded[0]
+
+
+def load_fixture(path):
+    """
+    Return (client_dict, validated, node_index) for the json at path. The
+    compiled artifact is used when it is up to date, otherwise the json is
+    parsed, validated is False and node_index None. node_index is the
+    NodeRegistry.snapshot() stored in the artifact.
+    """
+    loaded = _load_artifact(path)
+    if loaded is not None:
+        return loaded[0], True, loaded[1]
+    with open(path, 'r') as client_dict_file, paused_gc():
+        return json.load(client_dict_file), False, None
+
+
+def load_client_dict(path):
+    """
+    Return (client_dict, validated) for the json at path. The compiled artifact
+    is used when it is up to date, otherwise the json is parsed and validated
+    is False.
+    """
+    return load_fixture(path)[:2]
+
+
+def __main__():
+    """
+    Takes in a file path as an argument, validates the client_dict definition
+    json and writes the compiled artifact next to it
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description='Compile client_dict definition json')
+    parser.add_argument('file_path', help='File path to client_dict definition json')
+    parser.add_argument('-o', '--output', help='File path of the compiled artifact')
+    parser.add_argument('--store', action='store_true',
+                        help='Write a memory mapped node store for MockDocker.from_store instead')
+    args = parser.parse_args()
+
+    try:
+        if args.store:
+            output = compile_store(args.file_path, args.output)
+        else:
+            output = compile_fixture(args.file_path, args.output)
+    except Exception as error:
+        print('*'*10, 'Validation Failed, Not Compiled', '*'*10)
+        print(error)
+        sys.exit(1)
+    print('*'*10, 'Compile Successful', '*'*10)
+    print(f"{args.file_path} -> {output}")
+
+
+if __name__ == '__main__':
+    __main__()
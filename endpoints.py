@@ -0,0 +1,66 @@
+"""
+Parses Docker base_url values into normalized endpoints that MockDocker uses
+to find the node a client connects to and to reuse client sessions.
+"""
+import collections
+import functools
+import os
+import urllib.parse
+
+import docker
+
+
+DEFAULT_BASE_URL = 'unix:///var/run/docker.sock'
+
+# Schemes with a host, and the port used when the url has none
+DEFAULT_PORTS = {
+    'tcp': 2375,
+    'http': 2375,
+    'https': 2376,
+    'ssh': 22,
+}
+
+# Schemes addressing a local socket or pipe by path
+SOCKET_SCHEMES = ('unix', 'npipe')
+
+# host is lower case and None for sockets, path is None for network endpoints
+Endpoint = collections.namedtuple('Endpoint', ('scheme', 'host', 'port', 'path'))
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_base_url(base_url):
+    """
+    Return the normalized Endpoint for a Docker base_url such as
+    tcp://10.0.0.1:2375, ssh://user@node-1, unix:///var/run/docker.sock or a
+    bare host[:port], which is treated as tcp. Raises DockerException for urls
+    Docker would reject.
+    """
+    if '://' not in base_url:
+        base_url = f'tcp://{base_url}'
+    parsed = urllib.parse.urlsplit(base_url)
+    scheme = parsed.scheme.lower()
+
+    if scheme in SOCKET_SCHEMES:
+        path = parsed.netloc + parsed.path
+        if not path:
+            raise docker.errors.DockerException(f"Invalid bind address format: {base_url}")
+        return Endpoint(scheme, None, None, path)
+
+    if scheme not in DEFAULT_PORTS:
+        raise docker.errors.DockerException(f"Invalid bind address protocol: {base_url}")
+    try:
+        port = parsed.port
+    except ValueError:
+        raise docker.errors.DockerException(f"Invalid port: {base_url}")
+    # hostname drops user info and IPv6 brackets and is already lower case
+    if not parsed.hostname:
+        raise docker.errors.DockerException(f"Invalid bind address format: {base_url}")
+    return Endpoint(scheme, parsed.hostname, port or DEFAULT_PORTS[scheme], None)
+
+
+def env_base_url(environment=None):
+    """
+    Return the base_url docker.from_env() would connect to
+    """
+    environment = os.environ if environment is None else environment
+    return environment.get('DOCKER_HOST') or DEFAULT_BASE_URL
@@ -0,0 +1,119 @@
+"""
+Rule based fault injection for MockDocker API calls.
+"""
+import random
+import threading
+
+import docker
+
+
+class FaultRule:
+    """
+    A fault added with FaultInjector.add(). times is the number of calls left
+    to fail, None for no limit.
+    """
+
+    __slots__ = ('method', 'target', 'times', 'probability', 'error', 'message', 'latency')
+
+    def __init__(self, method, target, times, probability, error, message, latency):
+        self.method = method
+        self.target = target
+        self.times = times
+        self.probability = probability
+        self.error = error
+        self.message = message
+        self.latency = latency
+
+    def exception(self):
+        if self.error is None:
+            return None
+        if isinstance(self.error, BaseException):
+            return self.error
+        return self.error(self.message or f"Injected fault in {self.method}")
+
+
+class FaultInjector:
+    """
+    Holds fault rules by (method, target) so checking a call is a dict lookup.
+    Methods are named after the API call, e.g. 'node.update', 'nodes.list' or
+    'swarm.update'. Random decisions use a seeded generator so runs repeat.
+    """
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(rules) for rules in self._rules.values())
+
+    def add(self, method, target=None, times=None, probability=None,
+            error=docker.errors.APIError, message=None, latency=None):
+        """
+        Add a rule for calls to method. target limits it to one object: the
+        node ID for node.* calls, the swarm ID for swarm.* calls and the ID of
+        the connected node for nodes.* calls. None matches any object.
+
+        The rule fires on the next times calls (every call if None), each with
+        the given probability (always if None). Firing waits out latency
+        seconds on the MockDocker clock, then raises error: an exception
+        class, which is called with message, or an exception instance. With
+        error None the rule only adds latency, e.g. to simulate spikes.
+        Returns the FaultRule, which can be passed to remove().
+        """
+        if times is not None and times < 1:
+            raise ValueError("times must be at least 1")
+        if probability is not None and not 0 <= probability <= 1:
+            raise ValueError("probability must be between 0 and 1")
+        rule = FaultRule(method, target, times, probability, error, message, latency)
+        with self._lock:
+            self._rules.setdefault((method, target), []).append(rule)
+        return rule
+
+    def remove(self, rule):
+        with self._lock:
+            rules = self._rules.get((rule.method, rule.target), [])
+            if rule in rules:
+                rules.remove(rule)
+            if not rules:
+                self._rules.pop((rule.method, rule.target), None)
+
+    def clear(self):
+        with self._lock:
+            self._rules.clear()
+
+    def copy(self):
+        """
+        Return an injector with copies of these rules and random state
+        """
+        clone = FaultInjector()
+        clone.rng.setstate(self.rng.getstate())
+        with self._lock:
+            for key, rules in self._rules.items():
+                clone._rules[key] = [FaultRule(rule.method, rule.target, rule.times, rule.probability,
+                                               rule.error, rule.message, rule.latency) for rule in rules]
+        return clone
+
+    def check(self, method, target=None):
+        """
+        Return the rule that fires for a call to method on target, or None.
+        Rules for the target are tried before rules for any object.
+        """
+        if not self._rules:
+            return None
+        with self._lock:
+            for key in ((method, target), (method, None)) if target is not None else ((method, None),):
+                rules = self._rules.get(key)
+                if not rules:
+                    continue
+                for rule in rules:
+                    if rule.probability is not None and self.rng.random() >= rule.probability:
+                        continue
+                    if rule.times is not None:
+                        rule.times -= 1
+                        if rule.times == 0:
+                            rules.remove(rule)
+                            if not rules:
+                                del self._rules[key]
+                    return rule
+        return None
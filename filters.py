@@ -0,0 +1,186 @@
+"""
+Compiles Docker node list filters into predicates that MockDocker can run
+against the node registry.
+"""
+import functools
+
+import docker
+
+
+# Filters that are answered from the registry indexes, with their valid values
+INDEXED_FILTERS = {
+    'role': ('manager', 'worker'),
+    'membership': ('accepted', 'pending'),
+    # Not a Docker filter, lets tests select nodes by Spec.Availability
+    'availability': ('active', 'pause', 'drain'),
+}
+
+# Filters that are checked against each candidate node
+PREDICATE_FILTERS = ('id', 'name', 'label', 'node.label')
+
+# How id and name filters are matched. Docker matches them as prefixes,
+# SUBSTRING keeps the older behavior of matching anywhere in the value.
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+
+
+def normalize_filters(filters):
+    """
+    Convert a Docker filters dict into a hashable, order independent tuple of
+    (filter, values) pairs
+    """
+    if not filters:
+        return ()
+    normalized = []
+    for key, values in filters.items():
+        if key not in INDEXED_FILTERS and key not in PREDICATE_FILTERS:
+            raise docker.errors.APIError(f"Invalid filter '{key}'")
+        if isinstance(values, (str, bool)):
+            values = [values]
+        normalized.append((key, tuple(sorted(set(str(value) for value in values)))))
+    return tuple(sorted(normalized))
+
+
+def compile_filters(filters, match=PREFIX):
+    """
+    Return the NodeFilter for a Docker filters dict, id and name filters are
+    matched according to match
+    """
+    if match not in (PREFIX, SUBSTRING):
+        raise ValueError(f"match must be '{PREFIX}' or '{SUBSTRING}'")
+    return _compile(normalize_filters(filters), match)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(normalized, match):
+    indexed = []
+    checks = []
+    for key, values in normalized:
+        if key in INDEXED_FILTERS:
+            for value in values:
+                if value not in INDEXED_FILTERS[key]:
+                    raise docker.errors.APIError(f"Invalid {key} '{value}' for filter '{key}'")
+            indexed.append(_IndexedFilter(key, values))
+        elif key in ('id', 'name') and match == PREFIX:
+            indexed.append(_PrefixFilter(key, values))
+        elif key == 'id':
+            checks.append(_match_any(values, lambda node: node['attrs']['ID']))
+        elif key == 'name':
+            checks.append(_match_any(values, lambda node: node['attrs']['Spec'].get('Name') or ''))
+        elif key == 'label':
+            checks.append(_match_labels(values, lambda node: node['attrs'].get('Description', {}).get('Engine', {}).get('Labels')))
+        elif key == 'node.label':
+            checks.append(_match_labels(values, lambda node: node['attrs']['Spec'].get('Labels')))
+
+    if not checks:
+        predicate = None
+    elif len(checks) == 1:
+        predicate = checks[0]
+    else:
+        predicate = lambda node: all(check(node) for check in checks)
+    return NodeFilter(tuple(indexed), predicate)
+
+
+def _match_any(values, extract):
+    """
+    Values of the same filter are OR'ed together
+    """
+    if len(values) == 1:
+        value = values[0]
+        return lambda node: value in extract(node)
+    return lambda node: any(value in extract(node) for value in values)
+
+
+def _match_labels(values, extract):
+    """
+    Label filters are AND'ed together, each is either "key" or "key=value"
+    """
+    expected = []
+    for value in values:
+        key, sep, label_value = value.partition('=')
+        expected.append((key, label_value if sep else None))
+
+    def check(node):
+        labels = extract(node) or {}
+        for key, label_value in expected:
+            if key not in labels:
+                return False
+            if label_value is not None and labels[key] != label_value:
+                return False
+        return True
+    return check
+
+
+class _IndexedFilter:
+    """
+    Equality filter answered from a swarm scoped registry index
+    """
+
+    def __init__(self, field, values):
+        self.field = field
+        self.values = values
+
+    def candidates(self, registry, swarm_id):
+        if len(self.values) == 1:
+            return registry.bucket(self.field, (swarm_id, self.values[0]))
+        ids = {}
+        for value in self.values:
+            ids.update(registry.bucket(self.field, (swarm_id, value)))
+        return ids
+
+    def matches(self, registry, node_id):
+        return registry.indexed_value(node_id, self.field)[1] in self.values
+
+
+class _PrefixFilter:
+    """
+    id or name prefix filter answered from the registry prefix indexes
+    """
+
+    def __init__(self, field, values):
+        self.field = field
+        self.values = values
+
+    def candidates(self, registry, swarm_id):
+        ids = {}
+        for value in self.values:
+            ids.update(dict.fromkeys(registry.prefix_match(self.field, swarm_id, value)))
+        return ids
+
+    def matches(self, registry, node_id):
+        key = node_id if self.field == 'id' else registry.indexed_value(node_id, 'name')
+        return key is not None and key.startswith(self.values)
+
+
+class NodeFilter:
+    """
+    A compiled node filter. Indexed filters narrow the candidate nodes using
+    the registry, the predicate is only run on the remaining candidates.
+    """
+
+    def __init__(self, indexed, predicate):
+        self.indexed = indexed
+        self.predicate = predicate
+
+    def select(self, registry, swarm_id):
+        """
+        Iterate over the node dicts in swarm_id matching the filter
+        """
+        if not self.indexed:
+            candidates = registry.bucket('swarm', swarm_id)
+            others = ()
+        else:
+            # Start from the smallest set of indexed candidates, check the
+            # other indexed filters against the node's indexed values
+            narrowed = sorted(((index_filter.candidates(registry, swarm_id), index_filter)
+                               for index_filter in self.indexed), key=lambda entry: len(entry[0]))
+            candidates = narrowed[0][0]
+            others = [index_filter for _, index_filter in narrowed[1:]]
+
+        predicate = self.predicate
+        for node_id in list(candidates):
+            if others and not all(index_filter.matches(registry, node_id) for index_filter in others):
+                continue
+            node = registry.get(node_id)
+            if predicate is None or predicate(node):
+                yield node
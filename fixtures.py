@@ -0,0 +1,69 @@
+"""
+Process wide cache of parsed and validated client_dict definition files.
+"""
+import collections
+import os
+import threading
+
+from .compile_fixture import load_fixture, paused_gc
+
+
+class FixtureCache:
+    """
+    LRU cache of MockDocker instances built from client_dict definition files.
+    Entries are keyed by the file's path, modification time and size so an
+    edited file is parsed again.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, build, options=()):
+        """
+        Return the instance built from path, calling build(client_dict, validated,
+        node_index) to create it if the file is not cached or has changed since it
+        was cached. validated is True when the client_dict came from an up to date
+        compiled artifact, which also provides the node_index snapshot, else None.
+        options is a hashable description of the build arguments.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size, options)
+
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+            # Drop entries for an older version of the file
+            for stale in [entry for entry in self._entries if entry[0] == path and entry[1:3] != key[1:3]]:
+                del self._entries[stale]
+
+        # Everything allocated here stays alive in the template
+        with paused_gc():
+            template = build(*load_fixture(path))
+
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+fixture_cache = FixtureCache()
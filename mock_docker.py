@@ -3,37 +3,621 @@ mock_docker is a temporary db to mock the Docker API in unit tests.
 """
 
 import docker
-import random
-import string
 import json
+import contextlib
+import copy
+import functools
+import threading
 
-from .validate import validate_swarm_data
+from .validate import validate_swarm_data, node_errors, check_node_entry, check_swarm_entry
+from .registry import NodeRegistry, SwarmRegistry
+from .filters import compile_filters, INDEXED_FILTERS, PREFIX
+from .fixtures import fixture_cache
+from .node_store import NodeStore
+from .clock import SystemClock
+from .faults import FaultInjector
+from .tokens import TokenService
+from .endpoints import parse_base_url, env_base_url, DEFAULT_BASE_URL
+from .swarm_spec import compile_patch, check_update, apply_patch, apply_merge_patch, init_attrs
 
-class MockDocker:
+# Journal marker for a key that did not exist before it was set
+_MISSING = object()
 
-    def __init__(self, client_dict={}):
-        # Validate Swarms in client_dict
-        swarm_errors = validate_swarm_data(client_dict['swarms'])
-        if len(swarm_errors) > 0:
-            raise Exception(f'{json.dumps(swarm_errors, indent=4)}')
-            
-        # Validate Nodes in client_dict
 
+class DeferredCall(Exception):
+    """
+    Raised by an API call made under MockDocker._deferred(), carries the
+    latency the async facade awaits before making the call again and the
+    fault rule that fired, applied when it is made again
+    """
+
+    def __init__(self, delay, rule):
+        super().__init__(delay)
+        self.delay = delay
+        self.rule = rule
+
+# Node spec fields set by Node.update
+_NODE_SPEC_FIELDS = ('Availability', 'Role', 'Labels', 'Name')
+
+# Missed heartbeat periods before a node is marked down
+HEARTBEAT_GRACE = 3
+# Dispatcher.HeartbeatPeriod used when a swarm does not set one, in nanoseconds
+DEFAULT_HEARTBEAT_PERIOD = 5000000000
 
+
+def _revalidates(method):
+    """
+    Decorate an API method that writes entries, in strict mode the entries
+    it wrote are validated again once it returns
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self.mock_docker._revalidate()
+        return result
+    return wrapper
+
+
+class MockDocker:
+
+    def __init__(self, client_dict={}, filter_match=PREFIX, validate=True, clock=None, faults=None, tokens=None, strict=False, node_index=None):
+        # Validate Swarms and Nodes in client_dict, skipped for trusted compiled fixtures
+        if validate:
+            swarm_errors = validate_swarm_data(client_dict['swarms'])
+            if len(swarm_errors) > 0:
+                raise Exception(f'{json.dumps(swarm_errors, indent=4)}')
+            errors = node_errors(client_dict['nodes'], client_dict['swarms'])
+            if len(errors) > 0:
+                raise Exception(f'{json.dumps(errors, indent=4)}')
+
+        # Connections are MockDocker.Client sessions, the instance itself is never connected
         self._active_server = None
         self._client_dict = client_dict
+        # 'prefix' (Docker behavior) or 'substring' matching of id and name filters
+        self._filter_match = filter_match
+        # node_index is the NodeRegistry.snapshot() of these nodes stored in a compiled fixture
+        if node_index is not None:
+            self._node_registry = NodeRegistry.from_snapshot(client_dict['nodes'], node_index)
+        else:
+            self._node_registry = NodeRegistry(client_dict['nodes'])
+        self._swarm_registry = SwarmRegistry(client_dict['swarms'])
+        # IDs of the entries this instance may write in place, None for all
+        self._owned_nodes = None
+        self._owned_swarms = None
+        # Swarm objects built by DockerClient, keyed by swarm id then node ID
+        self._swarm_cache = {}
+        # Undo log and savepoints of each thread, see _journal
+        self._log = threading.local()
+        # Per node and per swarm locks, see _locked()
+        self._locks = {}
+        # Open Client sessions and endpoints registered to nodes, keyed by endpoints.Endpoint
+        self._sessions = {}
+        self._endpoints = {}
+        # Source of timestamps and simulated latency, a clock.VirtualClock
+        # also drives node heartbeats
+        self._clock = clock if clock is not None else SystemClock()
+        # Node ID -> Timer marking the node down or ready
+        self._heartbeat_timers = {}
+        # Fault rules checked on every API call, see faults.FaultInjector.add()
+        self.faults = faults if faults is not None else FaultInjector()
+        # Swarm ids, join tokens and unlock keys, a seeded TokenService makes them reproducible
+        self._tokens = tokens if tokens is not None else TokenService()
+        # In strict mode the entries written by each API call are validated
+        # again, see _revalidate(). Keys are ('node', ID) or ('swarm', id).
+        self._strict = strict
+        self._touched = set()
+        # Errors of the entries validated since construction, by key
+        self._entry_errors = {}
         self.nodes = MockDocker.Nodes(self)
         #self.swarm = MockDocker.Swarm()
 
-    def DockerClient(self, base_url):
-        ip_address = base_url.split(":")[1].strip("/")
-        for node in self._client_dict['nodes']:
-            if node['attrs']['Status']['Addr'] == ip_address:
-                # Set Active Server
-                self._active_server = node
-                # Load Swarm based on Active Server
-                self.swarm = MockDocker.Swarm(self)
-                return self
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Return a MockDocker for the client_dict definition json at path. Each file
+        is parsed and validated once per process, every caller gets its own fork
+        of the cached instance. An up to date artifact written by compile_fixture
+        is loaded instead of the json and is not validated again.
+        """
+        def build(client_dict, validated, node_index):
+            return cls(client_dict=client_dict, node_index=node_index, **dict({'validate': not validated}, **kwargs))
+
+        template = fixture_cache.get(path, build, options=tuple(sorted(kwargs.items())))
+        return template.fork()
+
+    @classmethod
+    def from_store(cls, path, cache_size=1024, **kwargs):
+        """
+        Return a MockDocker whose nodes are read from a memory mapped node store
+        written by node_store.build_store. Node entries are decoded when first
+        used, at most cache_size decoded entries are kept unless they were changed.
+        Stores are built from validated fixtures so validation is skipped by default.
+        """
+        store = NodeStore(path, cache_size=cache_size)
+        kwargs.setdefault('validate', False)
+        return cls(client_dict={'swarms': store.swarms, 'nodes': store}, **kwargs)
+
+    def DockerClient(self, base_url=None, **kwargs):
+        """
+        Return a Client session connected to the node at base_url. Sessions
+        share this instance's cluster state, any number can be open at once and
+        connecting to the same endpoint again returns the open session. The
+        host of base_url is matched against node addresses, then host names.
+        Other docker.DockerClient arguments are accepted and ignored.
+        """
+        endpoint = parse_base_url(base_url or DEFAULT_BASE_URL)
+        session = self._sessions.get(endpoint)
+        if session is not None:
+            return session
+
+        node_id = self._endpoints.get(endpoint)
+        if node_id is None and endpoint.host is not None:
+            node = self._node_registry.by_addr(endpoint.host) or self._node_registry.by_hostname(endpoint.host)
+            if node is not None:
+                node_id = node['attrs']['ID']
+        if node_id is None:
+            raise docker.errors.APIError(f"Cannot connect to the Docker daemon at {base_url or DEFAULT_BASE_URL}")
+        return self._sessions.setdefault(endpoint, MockDocker.Client(self, node_id, endpoint))
+
+    def from_env(self, environment=None, **kwargs):
+        """
+        Simulates docker.from_env(), connects to DOCKER_HOST or the default socket
+        """
+        return self.DockerClient(base_url=env_base_url(environment), **kwargs)
+
+    def register_endpoint(self, base_url, id_or_addr):
+        """
+        Route connections to base_url, such as a unix socket, to the node with
+        the given ID or address
+        """
+        node = self._node_registry.get(id_or_addr) or self._node_registry.by_addr(id_or_addr)
+        if node is None:
+            raise docker.errors.APIError(f"No Node with id or address {id_or_addr} found")
+        endpoint = parse_base_url(base_url)
+        self._endpoints[endpoint] = node['attrs']['ID']
+        self._sessions.pop(endpoint, None)
+
+    def fork(self):
+        """
+        Return an isolated MockDocker sharing the node and swarm entries of this
+        instance. After forking, both instances copy an entry the first time they
+        write to it, so unmodified entries are never copied.
+        """
+        if self._savepoints:
+            # Rolling back would write to entries now shared with the clone.
+            # Only the calling thread's savepoints are visible here.
+            raise RuntimeError("Cannot fork a MockDocker with active savepoints")
+
+        clone = MockDocker.__new__(MockDocker)
+        clone._active_server = None
+        clone._client_dict = dict(self._client_dict)
+        clone._filter_match = self._filter_match
+        clone._node_registry = self._node_registry.fork()
+        clone._swarm_registry = self._swarm_registry.fork()
+        clone._owned_nodes = set()
+        clone._owned_swarms = set()
+        clone._swarm_cache = {}
+        clone._log = threading.local()
+        clone._locks = {}
+        clone._sessions = {}
+        clone._endpoints = dict(self._endpoints)
+        clone._clock = self._clock
+        clone._heartbeat_timers = {}
+        clone.faults = self.faults.copy()
+        clone._tokens = self._tokens.copy()
+        clone._strict = self._strict
+        clone._touched = set(self._touched)
+        clone._entry_errors = dict(self._entry_errors)
+        clone.nodes = MockDocker.Nodes(clone)
+
+        # Entries this instance owned are now shared with the clone
+        self._client_dict = dict(self._client_dict)
+        self._owned_nodes = set()
+        self._owned_swarms = set()
+        return clone
+
+    @property
+    def _journal(self):
+        """
+        Undo log of the calling thread, None unless it has an active savepoint.
+        Each thread keeps its own so concurrent writers to different entries
+        never undo or release each other's changes.
+        """
+        return getattr(self._log, 'journal', None)
+
+    @_journal.setter
+    def _journal(self, journal):
+        self._log.journal = journal
+
+    @property
+    def _savepoints(self):
+        savepoints = getattr(self._log, 'savepoints', None)
+        if savepoints is None:
+            savepoints = self._log.savepoints = []
+        return savepoints
+
+    def savepoint(self):
+        """
+        Start recording every change made to this instance by the calling
+        thread and return a Savepoint that rollback() can return to. Used as a
+        context manager the changes are rolled back when the block exits.
+        """
+        if self._journal is None:
+            self._journal = []
+        savepoint = MockDocker.Savepoint(self, len(self._journal))
+        self._savepoints.append(savepoint)
+        return savepoint
+
+    def rollback(self, savepoint):
+        """
+        Undo every change made since savepoint was taken. Savepoints taken after
+        it are discarded.
+        """
+        if savepoint not in self._savepoints:
+            raise ValueError("Savepoint is not active")
+
+        journal = self._journal
+        while len(journal) > savepoint.position:
+            undo = journal.pop()
+            if callable(undo):
+                undo()
+                continue
+            container, key, old_value = undo
+            if old_value is _MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = old_value
+        # Entries validated since the savepoint may hold their old values again
+        self._touched.update(self._entry_errors)
+        self.release(savepoint)
+
+    def release(self, savepoint):
+        """
+        Keep the changes made since savepoint and stop tracking it
+        """
+        if savepoint not in self._savepoints:
+            raise ValueError("Savepoint is not active")
+        del self._savepoints[self._savepoints.index(savepoint):]
+        if not self._savepoints:
+            self._journal = None
+
+    def stop_heartbeat(self, node_id):
+        """
+        Simulate node_id losing contact with its managers. Its Status.State
+        becomes 'down' once HEARTBEAT_GRACE heartbeat periods of the swarm's
+        Dispatcher.HeartbeatPeriod have passed. Requires a clock.VirtualClock.
+        """
+        node = self._node_registry.get(node_id)
+        if node is None:
+            raise docker.errors.APIError(f"No Node with id {node_id} found")
+        self._schedule_state(node_id, self._heartbeat_period(node['swarm']) * HEARTBEAT_GRACE, 'down')
+
+    def resume_heartbeat(self, node_id):
+        """
+        Simulate node_id reconnecting, its Status.State becomes 'ready' at its
+        next heartbeat. Requires a clock.VirtualClock.
+        """
+        node = self._node_registry.get(node_id)
+        if node is None:
+            raise docker.errors.APIError(f"No Node with id {node_id} found")
+        self._schedule_state(node_id, self._heartbeat_period(node['swarm']), 'ready')
+
+    def _heartbeat_period(self, swarm_id):
+        """
+        Dispatcher.HeartbeatPeriod of swarm_id in seconds
+        """
+        swarm = self._swarm_registry.get(swarm_id)
+        period = None
+        if swarm is not None:
+            period = swarm['attrs'].get('Spec', {}).get('Dispatcher', {}).get('HeartbeatPeriod')
+        return (period or DEFAULT_HEARTBEAT_PERIOD) / 1e9
+
+    def _schedule_state(self, node_id, delay, state):
+        if not hasattr(self._clock, 'call_later'):
+            raise RuntimeError("Heartbeats need a MockDocker created with a clock.VirtualClock")
+        timer = self._heartbeat_timers.pop(node_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._heartbeat_timers[node_id] = self._clock.call_later(
+            delay, functools.partial(self._set_node_state, node_id, state))
+
+    def _set_node_state(self, node_id, state):
+        """
+        Set Status.State of a node, bumping its version if it changed
+        """
+        self._heartbeat_timers.pop(node_id, None)
+        with self._locked(('node', node_id)):
+            if self._node_registry.get(node_id)['attrs']['Status'].get('State') == state:
+                return
+            node = self._writable_node(node_id)
+            self._set(node['attrs']['Status'], 'State', state)
+            self._bump_version(node['attrs'])
+        self._revalidate()
+
+    def _api_call(self, method, target=None, endpoint=None):
+        """
+        Called at the start of every API call, waits out the simulated latency
+        of endpoint and of the fault rule that fires, if any, on the clock then
+        raises the rule's error. Under _deferred() the latency is raised in a
+        DeferredCall instead.
+        """
+        deferred = getattr(self._log, 'deferred', None)
+        if deferred is None or deferred is True:
+            delay = self._clock.latency(endpoint)
+            rule = self.faults.check(method, target)
+            if rule is not None and rule.latency:
+                delay += rule.latency
+            if deferred is True:
+                raise DeferredCall(delay, rule)
+            if delay:
+                self._clock.sleep(delay)
+        else:
+            # Made again once the latency was awaited, a later call in the same
+            # function must not be deferred
+            self._log.deferred = None
+            rule = deferred.rule
+        if rule is not None:
+            error = rule.exception()
+            if error is not None:
+                raise error
+
+    @contextlib.contextmanager
+    def _deferred(self, call=None):
+        """
+        Used by the async facade so simulated latency does not block the event
+        loop. An API call made in the block raises DeferredCall with its latency
+        instead of sleeping. Once it has been awaited the call is made again in a
+        block given that DeferredCall, which then goes ahead without waiting.
+        The block must not await, the state is kept per thread.
+        """
+        self._log.deferred = True if call is None else call
+        try:
+            yield
+        finally:
+            self._log.deferred = None
+
+    def _lock_for(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks.setdefault(key, threading.RLock())
+        return lock
+
+    @contextlib.contextmanager
+    def _locked(self, *keys):
+        """
+        Hold the locks for keys, ('node', node_id) or ('swarm', swarm_id), for
+        the duration of the block. Locks are taken in sorted order so batches
+        that overlap cannot deadlock.
+        """
+        with contextlib.ExitStack() as stack:
+            for key in sorted(set(key for key in keys if key[1] is not None)):
+                stack.enter_context(self._lock_for(key))
+            yield
+
+    @contextlib.contextmanager
+    def _atomic(self):
+        """
+        Roll back every change made in the block if it raises
+        """
+        savepoint = self.savepoint()
+        try:
+            yield
+        except BaseException:
+            self.rollback(savepoint)
+            raise
+        self.release(savepoint)
+
+    def _set(self, container, key, value):
+        """
+        Set container[key], recording the old value if a savepoint is active
+        """
+        if self._journal is not None:
+            self._journal.append((container, key, container.get(key, _MISSING)))
+        container[key] = value
+
+    def _delete(self, container, key):
+        """
+        Remove container[key], recording the old value if a savepoint is active
+        """
+        if self._journal is not None:
+            self._journal.append((container, key, container[key]))
+        del container[key]
+
+    def _record_attrs(self, obj, *names):
+        """
+        Record the current value of attributes of a Node or Swarm object before
+        they are changed
+        """
+        if self._journal is not None:
+            for name in names:
+                self._journal.append(functools.partial(setattr, obj, name, getattr(obj, name)))
+
+    def validation_errors(self):
+        """
+        Return the errors of the entries validated in strict mode since
+        construction, as {'nodes': {ID: errors}, 'swarms': {id: errors}}
+        """
+        self._revalidate(raise_errors=False)
+        response = {'nodes': {}, 'swarms': {}}
+        for (kind, entry_id), errors in self._entry_errors.items():
+            if errors:
+                response[f'{kind}s'][entry_id] = errors
+        return response
+
+    def _revalidate(self, raise_errors=True):
+        """
+        Validate the entries written since the last call and cache their
+        results, raises an Exception with the errors of any that are invalid.
+        Only does anything in strict mode.
+        """
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, set()
+        errors = {}
+        for key in touched:
+            kind, entry_id = key
+            if kind == 'node':
+                entry = self._node_registry.get(entry_id)
+                entry_errors = None if entry is None else check_node_entry(
+                    entry, functools.partial(self._node_registry.bucket, 'addr'))
+            else:
+                entry = self._swarm_registry.get(entry_id)
+                entry_errors = None if entry is None else check_swarm_entry(entry)
+            if entry_errors is None:
+                # Removed, e.g. a swarm created under a savepoint that was rolled back
+                self._entry_errors.pop(key, None)
+                continue
+            self._entry_errors[key] = entry_errors
+            if entry_errors:
+                errors.setdefault(f'{kind}s', {})[entry_id] = entry_errors
+        if errors and raise_errors:
+            raise Exception(f'{json.dumps(errors, indent=4)}')
+
+    def _bump_version(self, attrs):
+        """
+        Advance Version.Index and UpdatedAt of a node or swarm attrs dict after a write
+        """
+        self._set(attrs['Version'], 'Index', attrs['Version']['Index'] + 1)
+        self._set(attrs, 'UpdatedAt', self._clock.timestamp())
+
+    def _writable_node(self, node_id):
+        """
+        Return the node dict for node_id, copying it first if it is shared with a fork
+        """
+        node = self._node_registry.get(node_id)
+        if node is None:
+            return None
+        if self._strict:
+            self._touched.add(('node', node_id))
+        if self._owned_nodes is not None and node_id not in self._owned_nodes:
+            node = copy.deepcopy(node)
+            self._owned_nodes.add(node_id)
+        # Also pins entries decoded from a NodeStore so the change is kept
+        self._node_registry.replace(node)
+        self._client_dict['nodes'] = self._node_registry.entries
+        if self._journal is not None:
+            # Reindexes the node once its fields have been restored
+            self._journal.append(functools.partial(self._node_registry.reindex, node))
+        return node
+
+    def _check_node_spec(self, node_spec):
+        """
+        Raise APIError if node_spec has a value Docker would reject
+        """
+        if not isinstance(node_spec, dict):
+            raise docker.errors.APIError("Node spec must be a dict")
+        availability = node_spec.get('Availability')
+        if availability is not None and availability not in INDEXED_FILTERS['availability']:
+            raise docker.errors.APIError(f"Invalid availability '{availability}'")
+        role = node_spec.get('Role')
+        if role is not None and role not in INDEXED_FILTERS['role']:
+            raise docker.errors.APIError(f"Invalid role '{role}'")
+
+    def _write_node_spec(self, node_id, values):
+        """
+        Set the given Spec fields of a node, bump its version and reindex it.
+        Returns the node dict.
+        """
+        node = self._writable_node(node_id)
+        spec = node['attrs']['Spec']
+        for key, value in values.items():
+            self._set(spec, key, value)
+        self._bump_version(node['attrs'])
+        self._node_registry.reindex(node)
+        return node
+
+    def _writable_swarm(self, swarm_id):
+        """
+        Return the swarm dict for swarm_id, copying it first if it is shared with a fork
+        """
+        swarm = self._swarm_registry.get(swarm_id)
+        if swarm is not None and self._strict:
+            self._touched.add(('swarm', swarm_id))
+        if swarm is None or self._owned_swarms is None or swarm_id in self._owned_swarms:
+            return swarm
+        private = copy.deepcopy(swarm)
+        self._swarm_registry.replace(private)
+        self._client_dict['swarms'] = self._swarm_registry.entries
+        self._owned_swarms.add(swarm_id)
+        # Cached Swarm objects point at the shared attrs
+        self._invalidate_swarm_cache(swarm_id)
+        return private
+
+    def _cached_swarm(self, client):
+        """
+        Return the Swarm object for the node client is connected to, building
+        it on the first connection
+        """
+        node = client._active_server
+        node_id = node['attrs']['ID']
+        swarm_objects = self._swarm_cache.setdefault(node['swarm'], {})
+        swarm = swarm_objects.get(node_id)
+        if swarm is None:
+            swarm = swarm_objects.setdefault(node_id, MockDocker.Swarm(client))
+        return swarm
+
+    def _invalidate_swarm_cache(self, swarm_id, node_id=None):
+        """
+        Drop cached Swarm objects for swarm_id, or only the one for node_id
+        """
+        if node_id is None:
+            dropped = self._swarm_cache.pop(swarm_id, None)
+            if dropped is not None and self._journal is not None:
+                self._journal.append(functools.partial(self._swarm_cache.__setitem__, swarm_id, dropped))
+        elif swarm_id in self._swarm_cache:
+            dropped = self._swarm_cache[swarm_id].pop(node_id, None)
+            if dropped is not None and self._journal is not None:
+                self._journal.append(functools.partial(self._swarm_cache.setdefault(swarm_id, {}).__setitem__,
+                                                       node_id, dropped))
+
+    class Client:
+        """
+        A connection to one node, returned by MockDocker.DockerClient. Clients
+        share the cluster state of their MockDocker, attributes a Client does
+        not define are read from it.
+        """
+
+        __slots__ = ('_cluster', '_node_id', '_endpoint', 'nodes')
+
+        def __init__(self, cluster, node_id, endpoint=None):
+            self._cluster = cluster
+            self._node_id = node_id
+            self._endpoint = endpoint
+            self.nodes = MockDocker.Nodes(self)
+
+        def _api_call(self, method, target=None):
+            self._cluster._api_call(method, target, self._endpoint)
+
+        @property
+        def _active_server(self):
+            # Resolved on access, writes may replace the node dict
+            return self._cluster._node_registry.get(self._node_id)
+
+        @property
+        def swarm(self):
+            # Load Swarm based on Active Server, sessions are reused so the
+            # cached Swarm object is looked up on every access
+            return self._cluster._cached_swarm(self)
+
+        def __getattr__(self, name):
+            return getattr(self._cluster, name)
+
+    class Savepoint:
+        """
+        Position in the MockDocker journal returned by MockDocker.savepoint()
+        """
+
+        def __init__(self, mock_docker, position):
+            self.mock_docker = mock_docker
+            self.position = position
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            if self in self.mock_docker._savepoints:
+                self.mock_docker.rollback(self)
+            return False
 
     class Nodes:
 
@@ -41,87 +625,175 @@ class MockDocker:
             self.mock_docker = mock_docker
 
         def get(self, id_or_name):
-            # Verify a connection has been established and node is part of swarm
-            if self.mock_docker._active_server is None or self.mock_docker._active_server['swarm'] is None:
-                raise docker.errors.APIError("No connection established")
+            self.mock_docker._api_call('nodes.get', self._connected_id())
+            self._check_connection()
+            return MockDocker.Node(self._resolve(id_or_name), self.mock_docker)
 
-            # Search through Nodes that belong to the same swarm
-            for node in self.mock_docker._client_dict['nodes']:
-                if node['swarm'] == self.mock_docker._active_server['swarm']:
-                    # Check if id_or_name matches current node
-                    if node['attrs']['ID'] == id_or_name or node['attrs']['Spec']['Name'] == id_or_name:
-                        return MockDocker.Node(node, self.mock_docker)
+        def list(self, **kwargs):
+            return list(self.iter(**kwargs))
 
-            # No match is found Raise APIError
-            raise docker.errors.APIError(f"No Node with id or name {id_or_name} found")
+        def iter(self, **kwargs):
+            """
+            Return an iterator over the nodes list() would return. Nodes are
+            looked up and wrapped one at a time, so stopping early skips the rest.
+            """
+            self.mock_docker._api_call('nodes.list', self._connected_id())
+            self._check_connection()
 
-        def list(self, **kwargs):
+            # Compile the filters once, then select matching nodes of the same swarm
+            node_filter = compile_filters(kwargs.get('filters', None), self.mock_docker._filter_match)
+            selected = node_filter.select(self.mock_docker._node_registry, self.mock_docker._active_server['swarm'])
+            return (MockDocker.Node(node, self.mock_docker) for node in selected)
+
+        @_revalidates
+        def update_many(self, node_specs):
+            """
+            Update several nodes at once. node_specs maps node IDs or names to
+            the node_spec Node.update() takes. Every node and spec is checked
+            before anything changes, either every node is updated or none are.
+            Returns the updated Node objects.
+            """
+            self.mock_docker._api_call('nodes.update_many', self._connected_id())
+            self._check_connection()
+            updates = []
+            for id_or_name, node_spec in node_specs.items():
+                node = self._resolve(id_or_name)
+                if node['state'] == 'fail':
+                    raise docker.errors.APIError(f"Failed to update node {id_or_name}")
+                self.mock_docker._check_node_spec(node_spec)
+                updates.append((node['attrs']['ID'], {key: node_spec.get(key) for key in _NODE_SPEC_FIELDS}))
+
+            node_locks = [('node', node_id) for node_id, _ in updates]
+            with self.mock_docker._locked(*node_locks), self.mock_docker._atomic():
+                return [MockDocker.Node(self.mock_docker._write_node_spec(node_id, values), self.mock_docker)
+                        for node_id, values in updates]
+
+        @_revalidates
+        def set_availability(self, availability, filters=None):
+            """
+            Set Spec.Availability of every node matching filters, for example
+            set_availability('drain', filters={'role': 'worker'}). Either every
+            matching node is changed or none are. Returns the changed Node objects.
+            """
+            self.mock_docker._api_call('nodes.set_availability', self._connected_id())
+            self._check_connection()
+            self.mock_docker._check_node_spec({'Availability': availability})
+            node_filter = compile_filters(filters, self.mock_docker._filter_match)
+            # Collected first, changing availability moves nodes between index buckets
+            targets = [node for node in node_filter.select(self.mock_docker._node_registry, self.mock_docker._active_server['swarm'])
+                       if node['attrs']['Spec'].get('Availability') != availability]
+            for node in targets:
+                if node['state'] == 'fail':
+                    raise docker.errors.APIError(f"Failed to update node {node['attrs']['ID']}")
+
+            node_locks = [('node', node['attrs']['ID']) for node in targets]
+            with self.mock_docker._locked(*node_locks), self.mock_docker._atomic():
+                return [MockDocker.Node(self.mock_docker._write_node_spec(node['attrs']['ID'], {'Availability': availability}),
+                                        self.mock_docker)
+                        for node in targets]
+
+        def _connected_id(self):
+            node = self.mock_docker._active_server
+            return None if node is None else node['attrs']['ID']
+
+        def _check_connection(self):
             # Verify a connection has been established and node is part of swarm
             if self.mock_docker._active_server is None or self.mock_docker._active_server['swarm'] is None:
                 raise docker.errors.APIError("No connection established")
 
-            # Check if filters are passed
-            filters = kwargs.get('filters', None)
-            # Search through Nodes that belong to the same swarm
-            nodes = []
-            for node in self.mock_docker._client_dict['nodes']:
-                if node['swarm'] == self.mock_docker._active_server['swarm']:
-                    if filters:
-                        if 'id' in filters.keys():
-                            if filters['id'] not in node['attrs']['ID']:
-                                continue
-                        if 'name' in filters.keys():
-                            if filters['name'] not in node['attrs']['Spec']['Name']:
-                                continue
-                        if 'membership' in filters.keys():
-                            # Need to figure out how to do this one
-                            pass
-                        if 'role' in filters.keys():
-                            if filters['role'] != node['attrs']['Spec']['Role']:
-                                continue
-
-                    nodes.append(MockDocker.Node(node, self.mock_docker))
-
-            return nodes
+        def _resolve(self, id_or_name):
+            """
+            Return the node dict in the connected swarm for an ID, name or unique short ID
+            """
+            # Look up the node by ID or name within the same swarm
+            swarm_id = self.mock_docker._active_server['swarm']
+            node = self.mock_docker._node_registry.find(id_or_name, swarm_id)
+            if node is not None:
+                return node
+
+            # Resolve short IDs, the prefix must match a single node
+            matches = []
+            for node_id in self.mock_docker._node_registry.prefix_match('id', swarm_id, id_or_name):
+                matches.append(node_id)
+                if len(matches) > 1:
+                    raise docker.errors.APIError(f"Node {id_or_name} is ambiguous")
+            if matches:
+                return self.mock_docker._node_registry.get(matches[0])
+
+            # No match is found Raise APIError
+            raise docker.errors.APIError(f"No Node with id or name {id_or_name} found")
 
     class Node:
+        """
+        View over a node entry of the registry, fields are read from the entry
+        when they are accessed
+        """
+
+        __slots__ = ('_node', '_state', 'mock_docker')
 
         def __init__(self, node_dict, mock_docker):
-            self.attrs = node_dict['attrs']
-            self.id = node_dict['attrs']['ID']
-            self.short_id = node_dict['attrs']['ID'][:10]
-            self.version = node_dict['attrs']['Version']['Index']
-            self._swarm = node_dict['swarm']
+            self._node = node_dict
             self._state = node_dict['state']
             self.mock_docker = mock_docker
 
+        @property
+        def attrs(self):
+            return self._node['attrs']
+
+        @property
+        def id(self):
+            return self._node['attrs']['ID']
+
+        @property
+        def short_id(self):
+            return self._node['attrs']['ID'][:10]
+
+        @property
+        def version(self):
+            return self._node['attrs']['Version']['Index']
+
+        @property
+        def _swarm(self):
+            return self._node['swarm']
+
         def reload(self):
             """
-            Simulates docker.Node.reload() by adjusting the state of the node
+            Simulates docker.Node.reload() by adjusting the state of the node and
+            reading the current entry, which a fork or a node store may have replaced
             """
+            self.mock_docker._api_call('node.reload', self.id)
+            node = self.mock_docker._node_registry.get(self.id)
+            if node is not None:
+                self._node = node
             if self._state == 'fail':
+                self.mock_docker._record_attrs(self, '_state')
                 self._state = 'reload'
 
-        def update(self, node_spec):
+        @_revalidates
+        def update(self, node_spec, version=None):
             """
-            Simulates the update function by adjusting the node entry in MockDocker
+            Simulates the update function by adjusting the node entry in MockDocker.
+            If version is given it must match the node's current Version.Index,
+            like the Docker API an out of date version is rejected.
             """
+            self.mock_docker._api_call('node.update', self.id)
             # Check to see if node is in a fail state
             if self._state == 'fail':
                 raise docker.errors.APIError("Failed to update node")
 
-            # Update the node Spec
-            self.attrs['Spec']['Availability'] = node_spec.get('Availability')
-            self.attrs['Spec']['Role'] = node_spec.get('Role')
-            self.attrs['Spec']['Labels'] = node_spec.get('Labels')
-            self.attrs['Spec']['Name'] = node_spec.get('Name')
+            self.mock_docker._check_node_spec(node_spec)
 
-            # Update the nodes library in MockDocker
-            for node in self.mock_docker._client_dict['nodes']:
-                if node['attrs']['ID'] == self.id:
-                    node['attrs']['Spec'] = self.attrs['Spec']
+            with self.mock_docker._locked(('node', self.id)):
+                current = self.mock_docker._node_registry.get(self.id)['attrs']['Version']['Index']
+                if version is not None and version != current:
+                    raise docker.errors.APIError(f"update out of sequence: node {self.id} is at version {current}")
+
+                # Update the node Spec in the nodes library in MockDocker
+                self._node = self.mock_docker._write_node_spec(
+                    self.id, {key: node_spec.get(key) for key in _NODE_SPEC_FIELDS})
 
             if self._state == 'reload':
+                self.mock_docker._record_attrs(self, '_state')
                 self._state = 'fail'
 
             return True
@@ -129,132 +801,106 @@ class MockDocker:
 
     class Swarm:
 
+        # Fields populated from the swarm's client_dict entry
+        _FIELDS = ('_swarm_id', 'attrs', '_state', '_unlock_key')
+
+        __slots__ = _FIELDS + ('mock_docker',)
+
         def __init__(self, mock_docker):
             self.mock_docker = mock_docker
             # Find which Swarm this node belongs to
-            self._swarm_id = mock_docker._active_server['swarm']
+            self._load(mock_docker._active_server['swarm'])
+
+        def _load(self, swarm_id):
+            """
+            Populate the Swarm object from the client_dict entry of swarm_id
+            """
+            self._swarm_id = swarm_id
             self.attrs = None
-            for swarm in mock_docker._client_dict['swarms']:
-                if swarm['id'] == self._swarm_id:
-                    self.attrs = swarm.get('attrs')
-                    self.version = self.attrs.get('Version').get('Index')
-                    self._state = swarm.get('state')
-                    self._unlock_key = swarm.get('UnlockKey')
-                    break
-            
+            self._state = None
+            self._unlock_key = None
+            swarm = self.mock_docker._swarm_registry.get(swarm_id)
+            if swarm is not None:
+                self.attrs = swarm.get('attrs')
+                self._state = swarm.get('state')
+                self._unlock_key = swarm.get('UnlockKey')
+
+        @property
+        def version(self):
+            if self.attrs is None:
+                return None
+            return self.attrs.get('Version').get('Index')
 
         def get_unlock_key(self):
             """
             Simulates the get_unlock_key function by returning a dictionary with "UnlockKey"
             """
+            self.mock_docker._api_call('swarm.get_unlock_key', self._swarm_id)
             key_dict = {
                 "UnlockKey": self._unlock_key
             }
             return key_dict
 
+        @_revalidates
         def init(self, **kwargs):
             """
-            Initializes a new swarm from a node not a part of a swarm
+            Initializes a new swarm from a node not a part of a swarm. Accepts the
+            docker Swarm.init arguments, plus spec_patch, a JSON merge patch
+            applied to the new swarm's Spec.
             """
-            advertise_addr = kwargs.get('advertise_addr', None)
-            listen_addr = kwargs.get('listen_addr', '0.0.0.0:2377')
-            force_new_cluster = kwargs.get('force_new_cluster', False)
-            default_addr_pool = kwargs.get('default_addr_pool', None)
-            subnet_size = kwargs.get('subnet_size', None)
-            data_path_addr = kwargs.get('data_path_addr')
-            task_history_retention_limit = kwargs.get('task_history_retention_limit')
-            snapshot_interval = kwargs.get('snapshot_interval')
-            keep_old_snapshots = kwargs.get('keep_old_snapshots')
-            log_entries_for_slow_followers = kwargs.get('log_entries_for_slow_followers')
-            heartbeat_tick = kwargs.get('heartbeat_tick')
-            election_tick = kwargs.get('election_tick')
-            dispatcher_heartbeat_period = kwargs.get('dispatcher_heartbeat_period')
-            node_cert_expiry = kwargs.get('node_cert_expiry')
-            external_ca = kwargs.get('external_ca')
-            name = kwargs.get('name')
-            labels = kwargs.get('labels', {})
-            signing_ca_cert = kwargs.get('signing_ca_cert')
-            signing_ca_key = kwargs.get('signing_ca_key')
-            ca_force_rotate = kwargs.get('ca_force_rotate')
-            autolock_managers = kwargs.get('autolock_managers', False)
-            log_driver = kwargs.get('log_driver')
-
+            self.mock_docker._api_call('swarm.init', self._swarm_id)
             if self._swarm_id is not None:
                 raise docker.errors.APIError("This node is already part of a swarm")            
 
-            self._swarm_id = self._generate_token(16)
-            self._unlock_key = self._generate_token(64)
+            self.mock_docker._record_attrs(self, *self._FIELDS)
+            tokens = self.mock_docker._tokens
+            self._swarm_id = tokens.swarm_id()
+            self._unlock_key = tokens.unlock_key()
             
-            self.state = "success"
-            self.mock_docker._active_server['swarm'] = self._swarm_id
-
-            attrs_dict = {
-                "ID": "swarm_2",
-                "Version": {
-                    "Index": 373532
-                },
-                "CreatedAt": "2016-08-18T10:44:24.496525531Z",
-                "UpdatedAt": "2017-08-09T07:09:37.632105588Z",
-                "Spec": {
-                    "Name": name,
-                    "Labels": labels,
-                    "Orchestration": {
-                        "TaskHistoryRetentionLimit": task_history_retention_limit
-                    },
-                    "Raft": {
-                        "SnapshotInterval": snapshot_interval,
-                        "KeepOldSnapshots": keep_old_snapshots,
-                        "LogEntriesForSlowFollowers": log_entries_for_slow_followers,
-                        "ElectionTick": election_tick,
-                        "HeartbeatTick": heartbeat_tick
-                    },
-                    "Dispatcher": {
-                        "HeartbeatPeriod": dispatcher_heartbeat_period
-                    },
-                    "CAConfig": {
-                        "NodeCertExpiry": node_cert_expiry,
-                        "ExternalCAs": external_ca,
-                        "SigningCACert": signing_ca_cert,
-                        "SigningCAKey": signing_ca_key,
-                        "ForceRotate": ca_force_rotate
-                    },
-                    "EncryptionConfig": {
-                        "AutoLockManagers": autolock_managers
-                    },
-                    "TaskDefaults": {
-                        "LogDriver": log_driver
-                    }
-                },
-                "TLSInfo": {
-                    "TrustRoot": "",
-                    "CertIssuerSubject": "",
-                    "CertIssuerPublicKey": ""
-                },
-                "RootRotationInProgress": False,
-                "DataPathPort": 4789,
-                "DefaultAddrPool": default_addr_pool,
-                "SubnetSize": subnet_size,
-                "JoinTokens": {
-                    "Worker": self._generate_token(32),
-                    "Manager": self._generate_token(32)
-                }
+            self._state = "success"
+            node_id = self.mock_docker._active_server['attrs']['ID']
+            self.mock_docker._invalidate_swarm_cache(None, node_id)
+            with self.mock_docker._locked(('node', node_id)):
+                node = self.mock_docker._writable_node(node_id)
+                self.mock_docker._set(node, 'swarm', self._swarm_id)
+                # Docker makes the initializing node a manager, leave() cleared its role
+                spec = node['attrs']['Spec']
+                self.mock_docker._set(spec, 'Role', 'manager')
+                if spec.get('Availability') is None:
+                    self.mock_docker._set(spec, 'Availability', 'active')
+                self.mock_docker._node_registry.reindex(node)
+
+            worker_token = tokens.join_token()
+            join_tokens = {
+                "Worker": worker_token,
+                "Manager": tokens.join_token(previous=worker_token)
             }
+            attrs_dict = init_attrs(self._swarm_id, self.mock_docker._clock.timestamp(), join_tokens, kwargs)
 
             swarm_dict = {
                 "id": self._swarm_id,
-                "state": self.state,
+                "state": self._state,
                 "UnlockKey": self._unlock_key,
                 "attrs": attrs_dict
             }
             self.attrs = attrs_dict
-            self.mock_docker._client_dict['swarms'].append(swarm_dict)
+            self.mock_docker._swarm_registry.add(swarm_dict)
+            self.mock_docker._client_dict['swarms'] = self.mock_docker._swarm_registry.entries
+            if self.mock_docker._strict:
+                self.mock_docker._touched.add(('swarm', self._swarm_id))
+            if self.mock_docker._owned_swarms is not None:
+                self.mock_docker._owned_swarms.add(self._swarm_id)
+            if self.mock_docker._journal is not None:
+                self.mock_docker._journal.append(functools.partial(self.mock_docker._swarm_registry.remove, self._swarm_id))
             return self._swarm_id
 
 
+        @_revalidates
         def join(self, **kwargs):
             """
             Allows node not in a swarm to join an existing swarm
             """
+            self.mock_docker._api_call('swarm.join', self._swarm_id)
             remote_addrs = kwargs.get('remote_addrs')
             join_token = kwargs.get('join_token')
             listen_addr = kwargs.get('listen_addr', '0.0.0.0:2377')
@@ -267,159 +913,170 @@ class MockDocker:
 
             # find swarm that is being joined
             swarm_id = None
-            for node in self.mock_docker._client_dict['nodes']:
-                if node['attrs']['Status']['Addr'] in remote_addrs:
-                    if node['swarm'] is not None:
-                        swarm_id = node['swarm']
-                        break
+            for addr in remote_addrs or []:
+                node = self.mock_docker._node_registry.by_addr(addr)
+                if node is not None and node['swarm'] is not None:
+                    swarm_id = node['swarm']
+                    break
             if swarm_id is None:
                 raise docker.errors.APIError("Swarm not found")
 
-            join_swarm = None
-            for swarm in self.mock_docker._client_dict['swarms']:
-                if swarm['id'] == swarm_id:
-                    join_swarm = swarm
-                    break
+            join_swarm = self.mock_docker._swarm_registry.get(swarm_id)
             if join_swarm is None:
                 raise docker.errors.APIError("Swarm not found")
 
             if join_token == join_swarm['attrs']['JoinTokens']['Manager']:
-                self.mock_docker._active_server['swarm'] = swarm_id
-                self.mock_docker._active_server['attrs']['Spec']['Role'] = 'manager'
-                return True
-            
-            if join_token == join_swarm['attrs']['JoinTokens']['Worker']:
-                self.mock_docker._active_server['swarm'] = swarm_id
-                self.mock_docker._active_server['attrs']['Spec']['Role'] = 'worker'
-                return True
+                role = 'manager'
+            elif join_token == join_swarm['attrs']['JoinTokens']['Worker']:
+                role = 'worker'
+            else:
+                raise docker.errors.APIError("Join token is invalid")
 
-            raise docker.errors.APIError("Join token is invalid")
+            node_id = self.mock_docker._active_server['attrs']['ID']
+            self.mock_docker._invalidate_swarm_cache(None, node_id)
+            with self.mock_docker._locked(('node', node_id)):
+                node = self.mock_docker._writable_node(node_id)
+                self.mock_docker._set(node, 'swarm', swarm_id)
+                self.mock_docker._set(node['attrs']['Spec'], 'Role', role)
+                if node['attrs']['Spec'].get('Availability') is None:
+                    self.mock_docker._set(node['attrs']['Spec'], 'Availability', 'active')
+                self.mock_docker._node_registry.reindex(node)
+            self.mock_docker._record_attrs(self, *self._FIELDS)
+            self._load(swarm_id)
+            return True
             
 
+        @_revalidates
         def leave(self, force=False):
             """
             Request Node to leave the swarm, will fail if node is manager unless
             force is set to true
             """
+            self.mock_docker._api_call('swarm.leave', self._swarm_id)
             if self.mock_docker._active_server['swarm'] is None:
                 raise docker.errors.APIError("Node is not part of a swarm")
             
             if self.mock_docker._active_server['attrs']['Spec']['Role'] == 'manager' and not force:
                 raise docker.errors.APIError("Node is a manager and force is not set")
 
-            self.mock_docker._active_server['swarm'] = None
-            self.mock_docker._active_server['attrs']['Spec']['Role'] = None
-            self._swarm_id = None
-            self.attrs = None
-            self.version = None
-            self._state = None
-            self._unlock_key = None        
+            node_id = self.mock_docker._active_server['attrs']['ID']
+            self.mock_docker._invalidate_swarm_cache(self.mock_docker._active_server['swarm'], node_id)
+            with self.mock_docker._locked(('node', node_id)):
+                node = self.mock_docker._writable_node(node_id)
+                self.mock_docker._set(node, 'swarm', None)
+                self.mock_docker._set(node['attrs']['Spec'], 'Role', None)
+                self.mock_docker._node_registry.reindex(node)
+            self.mock_docker._record_attrs(self, *self._FIELDS)
+            self._load(None)
             return True
 
+        @_revalidates
         def unlock(self, key):
             """
             Unlock Swarm if passed Key is valid
             """
+            self.mock_docker._api_call('swarm.unlock', self._swarm_id)
             # Check that key is a string
             if not isinstance(key, str):
                 raise docker.errors.InvalidArgument("key must be a string")
 
             if key == self._unlock_key:
                 if self._state == "locked":
+                    self.mock_docker._record_attrs(self, '_state')
                     self._state = "success"
+                    # Unlocking applies to every node in the swarm
+                    with self.mock_docker._locked(('swarm', self._swarm_id)):
+                        swarm = self.mock_docker._writable_swarm(self._swarm_id)
+                        if swarm is not None:
+                            self.attrs = swarm['attrs']
+                            self.mock_docker._set(swarm, 'state', self._state)
+                    self.mock_docker._invalidate_swarm_cache(self._swarm_id)
                     return True
 
             raise docker.errors.APIError("Invalid unlock key")
 
         def update(self, **kwargs):
             """
-            Update Swarm Configurations
+            Update Swarm Configurations. Only the arguments that are given are
+            changed, spec_patch is a JSON merge patch applied to the Spec. The
+            swarm version is bumped once per update.
             """
-            default_addr_pool = kwargs.get('default_addr_pool', None)
-            subnet_size = kwargs.get('subnet_size', None)
-            data_path_addr = kwargs.get('data_path_addr')
-            task_history_retention_limit = kwargs.get('task_history_retention_limit')
-            snapshot_interval = kwargs.get('snapshot_interval')
-            keep_old_snapshots = kwargs.get('keep_old_snapshots')
-            log_entries_for_slow_followers = kwargs.get('log_entries_for_slow_followers')
-            heartbeat_tick = kwargs.get('heartbeat_tick')
-            election_tick = kwargs.get('election_tick')
-            dispatcher_heartbeat_period = kwargs.get('dispatcher_heartbeat_period')
-            node_cert_expiry = kwargs.get('node_cert_expiry')
-            external_ca = kwargs.get('external_ca')
-            name = kwargs.get('name')
-            labels = kwargs.get('labels', {})
-            signing_ca_cert = kwargs.get('signing_ca_cert')
-            signing_ca_key = kwargs.get('signing_ca_key')
-            ca_force_rotate = kwargs.get('ca_force_rotate')
-            autolock_managers = kwargs.get('autolock_managers', False)
-            log_driver = kwargs.get('log_driver')
+            return self.update_batch([kwargs])
 
-            rotate_worker_token = kwargs.get('rotate_worker_token', False)
-            rotate_manager_token = kwargs.get('rotate_manager_token', False)
-            rotate_manager_unlock_key = kwargs.get('rotate_manager_unlock_key', False)
+        @_revalidates
+        def update_batch(self, updates):
+            """
+            Apply a sequence of Swarm.update() keyword argument dicts, in order,
+            as a single update. Every entry is checked first and the swarm
+            version is bumped once, either all entries are applied or none are.
+            """
+            self.mock_docker._api_call('swarm.update', self._swarm_id)
+            updates = list(updates)
+            for kwargs in updates:
+                check_update(kwargs)
 
             # Check if Swarm is in Fail State, if so, raise error
             if self._state == 'fail':
                 raise docker.errors.APIError("Update Failed")
 
-            for swarm in self.mock_docker._client_dict['swarms']:
-                if swarm['id'] == self._swarm_id:
-                    # Update attrs with new information
-                    if default_addr_pool is not None: self.attrs['DefaultAddrPool'] = default_addr_pool
-                    if subnet_size is not None: self.attrs['SubnetSize'] = subnet_size
-                    #if data_path_addr is not None: self.attrs['DataPathAddr'] = data_path_addr
-                    if task_history_retention_limit is not None: self.attrs['Spec']['TaskHistoryRetentionLimit'] = task_history_retention_limit
-                    if snapshot_interval is not None: self.attrs['Spec']['Raft']['SnapshotInterval'] = snapshot_interval
-                    if keep_old_snapshots is not None: self.attrs['Spec']['Raft']['KeepOldSnapshots'] = keep_old_snapshots
-                    if log_entries_for_slow_followers is not None: self.attrs['Spec']['Raft']['LogEntriesForSlowFollowers'] = log_entries_for_slow_followers
-                    if heartbeat_tick is not None: self.attrs['Spec']['Raft']['HeartbeatTick'] = heartbeat_tick
-                    if election_tick is not None: self.attrs['Spec']['Raft']['ElectionTick'] = election_tick
-                    if dispatcher_heartbeat_period is not None: self.attrs['Spec']['Dispatcher']['HeartbeatPeriod'] = dispatcher_heartbeat_period
-                    if node_cert_expiry is not None: self.attrs['Spec']['CAConfig']['NodeCertExpiry'] = node_cert_expiry
-                    if external_ca is not None: self.attrs['Spec']['CAConfig']['ExternalCAs'] = external_ca
-                    if name is not None: self.attrs['Spec']['Name'] = name
-                    if labels is not None: self.attrs['Spec']['Labels'] = labels
-                    if signing_ca_cert is not None: self.attrs['Spec']['CAConfig']['SigningCACert'] = signing_ca_cert
-                    if signing_ca_key is not None: self.attrs['Spec']['CAConfig']['SigningCAKey'] = signing_ca_key
-                    if ca_force_rotate is not None: self.attrs['Spec']['CAConfig']['ForceRotate'] = ca_force_rotate
-                    if autolock_managers is not None: self.attrs['Spec']['AutolockManagers'] = autolock_managers
-                    if log_driver is not None: self.attrs['Spec']['TaskDefaults']['LogDriver'] = log_driver
-
-                    # Update tokens if rotation booleans are set
-                    if rotate_worker_token:
-                        new_token = self._generate_token()
-                        self.attrs['JoinTokens']['Worker'] = new_token
-                        #swarm['attrs']['JoinTokens']['Worker'] = new_token
-
-                    if rotate_manager_token:
-                        new_token = self._generate_token()
-                        self.attrs['JoinTokens']['Manager'] = new_token
-                        #swarm['attrs']['JoinTokens']['Manager'] = new_token
-
-                    if rotate_manager_unlock_key:
-                        new_token = self._generate_token(64)
-                        self._unlock_key = new_token
-                        swarm['UnlockKey'] = new_token
-                    break
+            writes = [compile_patch(kwargs) for kwargs in updates]
+            with self.mock_docker._locked(('swarm', self._swarm_id)), self.mock_docker._atomic():
+                swarm = self.mock_docker._writable_swarm(self._swarm_id)
+                if swarm is not None:
+                    self.attrs = swarm['attrs']
+                    rotated = False
+                    for kwargs, entry_writes in zip(updates, writes):
+                        # Update attrs with new information
+                        apply_patch(self.attrs, entry_writes, self.mock_docker._set)
+                        if kwargs.get('spec_patch'):
+                            apply_merge_patch(self.attrs['Spec'], kwargs['spec_patch'],
+                                              self.mock_docker._set, self.mock_docker._delete)
+                        rotated = self._rotate(swarm, kwargs) or rotated
 
-            # Reset state to fail if reload
-            if self._state == 'reload':
-                self._state = 'fail'
+                    # Other nodes' Swarm objects hold the old unlock key
+                    if rotated:
+                        self.mock_docker._invalidate_swarm_cache(self._swarm_id)
+
+                    self.mock_docker._bump_version(self.attrs)
+
+                # Reset state to fail if reload
+                if self._state == 'reload':
+                    self.mock_docker._record_attrs(self, '_state')
+                    self._state = 'fail'
+
+        def _rotate(self, swarm, kwargs):
+            """
+            Rotate the join tokens and unlock key requested in kwargs, returns
+            True if anything was rotated
+            """
+            rotate_worker_token = kwargs.get('rotate_worker_token', False)
+            rotate_manager_token = kwargs.get('rotate_manager_token', False)
+            rotate_manager_unlock_key = kwargs.get('rotate_manager_unlock_key', False)
+
+            # Update tokens if rotation booleans are set
+            tokens = self.mock_docker._tokens
+            if rotate_worker_token:
+                new_token = tokens.join_token(previous=self.attrs['JoinTokens'].get('Worker'))
+                self.mock_docker._set(self.attrs['JoinTokens'], 'Worker', new_token)
+
+            if rotate_manager_token:
+                new_token = tokens.join_token(previous=self.attrs['JoinTokens'].get('Manager'))
+                self.mock_docker._set(self.attrs['JoinTokens'], 'Manager', new_token)
+
+            if rotate_manager_unlock_key:
+                new_token = tokens.unlock_key()
+                self.mock_docker._record_attrs(self, '_unlock_key')
+                self._unlock_key = new_token
+                self.mock_docker._set(swarm, 'UnlockKey', new_token)
+
+            return bool(rotate_worker_token or rotate_manager_token or rotate_manager_unlock_key)
             
         def reload(self):
+            self.mock_docker._api_call('swarm.reload', self._swarm_id)
             if self._state == 'fail':
+                self.mock_docker._record_attrs(self, '_state')
                 self._state = 'reload'
             return True
 
-        def _generate_token(self, length=32):
-            """
-            Generate a random token of the specified length
-            """
-            return ''.join(random.choice(string.ascii_uppercase + string.ascii_letters + string.digits) for _ in range(length))
-            
         def _client_dict_entry(self):
-            for swarm in self.mock_docker._client_dict['swarms']:
-                if swarm['id'] == self._swarm_id:
-                    return swarm
-            return None
\ No newline at end of file
+            return self.mock_docker._swarm_registry.get(self._swarm_id)
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Memory mapped node storage for very large client_dict definitions. Node
+entries stay encoded in the file and are only decoded when they are accessed.
+"""
+import collections
+import json
+import mmap
+import threading
+import weakref
+
+try:
+    from .registry import node_summary
+except ImportError:
+    from registry import node_summary
+
+
+MAGIC = b'MDNS'
+# Bump when the layout or the validation of stored fixtures changes
+# 3: stores built before node validation keyed results per node
+STORE_VERSION = 3
+STORE_EXTENSION = '.mds'
+
+
+def build_store(client_dict, path):
+    """
+    Write the nodes of client_dict to a node store file at path. The swarms
+    and the summary of each node are kept in the header, every node is stored
+    as its own json blob.
+    """
+    blobs = []
+    rows = []
+    offset = 0
+    for node in client_dict.get('nodes', []):
+        blob = json.dumps(node, separators=(',', ':')).encode('utf-8')
+        rows.append(list(node_summary(node)) + [offset, len(blob)])
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({
+        'version': STORE_VERSION,
+        'swarms': client_dict.get('swarms', []),
+        'rows': rows,
+    }, separators=(',', ':')).encode('utf-8')
+
+    with open(path, 'wb') as store_file:
+        store_file.write(MAGIC)
+        store_file.write(len(header).to_bytes(8, 'little'))
+        store_file.write(header)
+        for blob in blobs:
+            store_file.write(blob)
+    return path
+
+
+class _NodeEntry(dict):
+    """
+    Decoded node dict, a dict subclass so it can be weakly referenced
+    """
+    __slots__ = ('__weakref__',)
+
+
+class NodeStore:
+    """
+    Sequence of node dicts backed by a memory mapped node store file. Decoded
+    entries are kept in a bounded LRU cache, entries that have been written
+    back with __setitem__ are pinned in memory. An evicted entry that is still
+    referenced, e.g. by a Node, is returned again instead of a new decode so
+    every holder sees the same dict.
+    """
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self.cache_size = cache_size
+        with open(path, 'rb') as store_file:
+            self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a node store")
+        header_length = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], 'little')
+        self._data_start = len(MAGIC) + 8 + header_length
+        header = json.loads(self._mmap[len(MAGIC) + 8:self._data_start])
+        if header.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported node store version {header.get('version')}")
+
+        self.swarms = header['swarms']
+        # (ID, name, addr, swarm, role, availability, membership, hostname, offset, length)
+        self._rows = [tuple(row) for row in header['rows']]
+        self._pinned = {}
+        self._cache = collections.OrderedDict()
+        # Every decoded entry still referenced, including evicted ones
+        self._live = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for pos in range(len(self._rows)):
+            yield self[pos]
+
+    def __getitem__(self, pos):
+        node = self._pinned.get(pos)
+        if node is not None:
+            return node
+        with self._lock:
+            node = self._cache.get(pos)
+            if node is not None:
+                self._cache.move_to_end(pos)
+                return node
+            node = self._live.get(pos)
+        if node is None:
+            offset, length = self._rows[pos][-2:]
+            start = self._data_start + offset
+            node = _NodeEntry(json.loads(self._mmap[start:start + length]))
+        with self._lock:
+            # Another thread may have decoded it meanwhile, keep the first one
+            node = self._live.setdefault(pos, node)
+            self._cache[pos] = node
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return node
+
+    def __setitem__(self, pos, node_dict):
+        self._pinned[pos] = node_dict
+        with self._lock:
+            self._cache.pop(pos, None)
+
+    @property
+    def cached(self):
+        """
+        Number of decoded entries held in the LRU cache
+        """
+        return len(self._cache)
+
+    def summaries(self):
+        """
+        Iterate over the registry summary of every node without decoding it
+        """
+        for row in self._rows:
+            yield row[:-2]
+
+    def copy(self):
+        """
+        Return a NodeStore sharing the mapped file, with its own pinned entries and cache
+        """
+        clone = NodeStore.__new__(NodeStore)
+        clone.__dict__.update(self.__dict__)
+        clone._pinned = dict(self._pinned)
+        clone._cache = collections.OrderedDict()
+        clone._live = weakref.WeakValueDictionary()
+        clone._lock = threading.Lock()
+        return clone
@@ -0,0 +1,428 @@
+"""
+Index structures used by MockDocker to resolve nodes and swarms without
+scanning the client_dict lists.
+"""
+import bisect
+import threading
+
+
+class PrefixIndex:
+    """
+    Sorted (key, node ID) pairs, prefix lookups are a bisect followed by a
+    walk over the matching keys
+    """
+
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Build an index from a list of (key, node ID) pairs, sorted once
+        """
+        index = cls()
+        index._entries = sorted(pairs)
+        return index
+
+    def copy(self):
+        clone = PrefixIndex()
+        clone._entries = list(self._entries)
+        return clone
+
+    def add(self, key, node_id):
+        bisect.insort(self._entries, (key, node_id))
+
+    def remove(self, key, node_id):
+        idx = bisect.bisect_left(self._entries, (key, node_id))
+        if idx < len(self._entries) and self._entries[idx] == (key, node_id):
+            del self._entries[idx]
+
+    def startswith(self, prefix):
+        """
+        Iterate over the node IDs whose key starts with prefix
+        """
+        entries = self._entries
+        # (prefix,) sorts before every (prefix, node_id) pair
+        idx = bisect.bisect_left(entries, (prefix,))
+        while idx < len(entries) and entries[idx][0].startswith(prefix):
+            yield entries[idx][1]
+            idx += 1
+
+
+def node_summary(node_dict):
+    """
+    Return the values of a node dict that the registry indexes, as
+    (ID, name, addr, swarm, role, availability, membership, hostname)
+    """
+    attrs = node_dict['attrs']
+    spec = attrs['Spec']
+    # Host names are case insensitive
+    hostname = attrs.get('Description', {}).get('Hostname')
+    return (attrs['ID'], spec.get('Name'), attrs['Status'].get('Addr'), node_dict.get('swarm'),
+            spec.get('Role'), spec.get('Availability'), spec.get('Membership', 'accepted'),
+            hostname.lower() if hostname else hostname)
+
+
+class NodeRegistry:
+    """
+    Keeps the node entries of a client_dict indexed by ID, name, address and
+    swarm membership. Indexes hold node IDs, the node dicts themselves are only
+    referenced from the ID table and the client_dict list.
+
+    A forked registry shares its containers with the original. A write
+    copies only the containers it changes: the node list, the indexed values,
+    the index of each changed field, each changed bucket and prefix index.
+    """
+
+    # Indexed fields. role, availability and membership are keyed by
+    # (swarm, value) so a bucket only holds nodes of one swarm.
+    FIELDS = ('name', 'addr', 'swarm', 'role', 'availability', 'membership', 'hostname')
+
+    def __init__(self, node_list):
+        # node_list is the client_dict list, or a NodeStore that decodes
+        # entries on access and provides their summaries without decoding
+        self._nodes = node_list
+        # Containers this registry may change in place, None for all of them.
+        # Keys are 'nodes', 'keys', ('index', field), ('bucket', field, value)
+        # and ('prefix', field, swarm_id).
+        self._owned = None
+        # Held while the containers or indexes are changed, writers to
+        # different nodes only serialize here
+        self._lock = threading.Lock()
+        # Node ID -> position in node_list
+        self._pos = {}
+        self._indexes = {field: {} for field in self.FIELDS}
+        self._field_pos = {field: pos for pos, field in enumerate(self.FIELDS)}
+        # Prefix indexes over node IDs and names, one per swarm
+        self._prefixes = {'id': {}, 'name': {}}
+        # Last indexed values for each node, used to diff on reindex
+        self._keys = {}
+
+        if hasattr(node_list, 'summaries'):
+            summaries = node_list.summaries()
+        else:
+            summaries = (node_summary(node) for node in node_list)
+        # Prefix pairs are collected and sorted once per swarm, inserting
+        # them one at a time would shift the sorted lists for every node
+        prefix_pairs = {'id': {}, 'name': {}}
+        for pos, summary in enumerate(summaries):
+            node_id = summary[0]
+            self._pos[node_id] = pos
+            keys = self._summary_keys(summary)
+            self._index_fields(node_id, keys)
+            swarm_id = keys[self._field_pos['swarm']]
+            name = keys[self._field_pos['name']]
+            prefix_pairs['id'].setdefault(swarm_id, []).append((node_id, node_id))
+            if name is not None:
+                prefix_pairs['name'].setdefault(swarm_id, []).append((name, node_id))
+        for field, by_swarm in prefix_pairs.items():
+            for swarm_id, pairs in by_swarm.items():
+                self._prefixes[field][swarm_id] = PrefixIndex.from_pairs(pairs)
+
+    @classmethod
+    def from_snapshot(cls, node_list, snapshot):
+        """
+        Return a registry for node_list from the snapshot() of a registry
+        built from the same nodes, without indexing them again
+        """
+        registry = cls.__new__(cls)
+        registry._nodes = node_list
+        registry._owned = None
+        registry._lock = threading.Lock()
+        registry._field_pos = {field: pos for pos, field in enumerate(cls.FIELDS)}
+        registry._pos, registry._indexes, prefixes, registry._keys = snapshot
+        registry._prefixes = {field: {swarm_id: PrefixIndex.from_pairs(entries) for swarm_id, entries in indexes.items()}
+                              for field, indexes in prefixes.items()}
+        return registry
+
+    def snapshot(self):
+        """
+        Return the indexes as plain containers that marshal can store, see from_snapshot()
+        """
+        prefixes = {field: {swarm_id: index._entries for swarm_id, index in indexes.items()}
+                    for field, indexes in self._prefixes.items()}
+        return (self._pos, self._indexes, prefixes, self._keys)
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __iter__(self):
+        for pos in self._pos.values():
+            yield self._nodes[pos]
+
+    @property
+    def entries(self):
+        """
+        The client_dict list of node dicts
+        """
+        return self._nodes
+
+    def fork(self):
+        """
+        Return a registry sharing this registry's containers
+        """
+        clone = NodeRegistry.__new__(NodeRegistry)
+        clone.__dict__.update(self.__dict__)
+        clone._lock = threading.Lock()
+        # The outer dicts are small, copying them lets each registry swap in
+        # its own copies of the containers it writes
+        clone._indexes = dict(self._indexes)
+        clone._prefixes = {field: dict(indexes) for field, indexes in self._prefixes.items()}
+        self._owned = set()
+        clone._owned = set()
+        return clone
+
+    def replace(self, node_dict):
+        """
+        Store node_dict as the dict of its node, either a copy of the current
+        dict or the decoded dict of a NodeStore entry that is about to change
+        """
+        with self._lock:
+            if not self._owns('nodes'):
+                self._nodes = self._nodes.copy()
+            self._nodes[self._pos[node_dict['attrs']['ID']]] = node_dict
+
+    def reindex(self, node_dict):
+        """
+        Update the indexes of a node after its name, address or swarm changed
+        """
+        node_id = node_dict['attrs']['ID']
+        keys = self._summary_keys(node_summary(node_dict))
+        with self._lock:
+            old_keys = self._keys.get(node_id)
+            if old_keys == keys:
+                return
+            if not self._owns('keys'):
+                self._keys = dict(self._keys)
+            self._reindex(node_id, old_keys, keys)
+
+    def get(self, node_id):
+        """
+        Return the node dict with the given ID, or None
+        """
+        pos = self._pos.get(node_id)
+        if pos is None:
+            return None
+        return self._nodes[pos]
+
+    def by_addr(self, addr):
+        """
+        Return the node dict with the given Status.Addr, or None
+        """
+        for node_id in self._indexes['addr'].get(addr, ()):
+            return self.get(node_id)
+        return None
+
+    def by_hostname(self, hostname):
+        """
+        Return the node dict with the given Description.Hostname, or None
+        """
+        for node_id in self._indexes['hostname'].get(hostname.lower(), ()):
+            return self.get(node_id)
+        return None
+
+    def find(self, id_or_name, swarm_id):
+        """
+        Return the node in swarm_id matching id_or_name by ID or Spec.Name, or None
+        """
+        swarm_pos = self._field_pos['swarm']
+        if id_or_name in self._pos and self._keys[id_or_name][swarm_pos] == swarm_id:
+            return self.get(id_or_name)
+        for node_id in self._indexes['name'].get(id_or_name, ()):
+            if self._keys[node_id][swarm_pos] == swarm_id:
+                return self.get(node_id)
+        return None
+
+    def in_swarm(self, swarm_id):
+        """
+        Iterate over the node dicts that are members of swarm_id
+        """
+        for node_id in list(self._indexes['swarm'].get(swarm_id, ())):
+            yield self.get(node_id)
+
+    def swarm_size(self, swarm_id):
+        return len(self._indexes['swarm'].get(swarm_id, ()))
+
+    def bucket(self, field, value):
+        """
+        Return the IDs of the nodes indexed under value for field
+        """
+        return self._indexes[field].get(value, {})
+
+    def prefix_match(self, field, swarm_id, prefix):
+        """
+        Iterate over the IDs of the nodes in swarm_id whose ID or name starts with prefix
+        """
+        index = self._prefixes[field].get(swarm_id)
+        if index is None:
+            return iter(())
+        return index.startswith(prefix)
+
+    def indexed_value(self, node_id, field):
+        """
+        Return the value node_id is currently indexed under for field
+        """
+        return self._keys[node_id][self._field_pos[field]]
+
+    def _owns(self, key):
+        """
+        Return True if the container for key may be changed in place, and
+        from now on count it as owned. Callers copy it when this is False.
+        """
+        if self._owned is None or key in self._owned:
+            return True
+        self._owned.add(key)
+        return False
+
+    def _writable_index(self, field):
+        if not self._owns(('index', field)):
+            self._indexes[field] = dict(self._indexes[field])
+        return self._indexes[field]
+
+    def _writable_bucket(self, field, value):
+        index = self._writable_index(field)
+        bucket = index.get(value)
+        if bucket is None:
+            # New buckets belong to this registry
+            self._owns(('bucket', field, value))
+            bucket = index[value] = {}
+        elif not self._owns(('bucket', field, value)):
+            bucket = index[value] = dict(bucket)
+        return bucket
+
+    def _writable_prefix(self, field, swarm_id):
+        indexes = self._prefixes[field]
+        index = indexes.get(swarm_id)
+        if index is None:
+            self._owns(('prefix', field, swarm_id))
+            index = indexes[swarm_id] = PrefixIndex()
+        elif not self._owns(('prefix', field, swarm_id)):
+            index = indexes[swarm_id] = index.copy()
+        return index
+
+    @staticmethod
+    def _summary_keys(summary):
+        node_id, name, addr, swarm, role, availability, membership, hostname = summary
+        return (name, addr, swarm, (swarm, role), (swarm, availability), (swarm, membership), hostname)
+
+    def _index_fields(self, node_id, keys):
+        self._keys[node_id] = keys
+        for index, value in zip(self._indexes.values(), keys):
+            # dict used as an insertion ordered set
+            index.setdefault(value, {})[node_id] = None
+
+    def _reindex(self, node_id, old_keys, keys):
+        """
+        Move a node between the buckets and prefix indexes of the fields that
+        changed, copying only the shared containers it writes
+        """
+        self._keys[node_id] = keys
+        for field, old_value, value in zip(self.FIELDS, old_keys, keys):
+            if old_value == value:
+                continue
+            if old_value in self._indexes[field]:
+                bucket = self._writable_bucket(field, old_value)
+                bucket.pop(node_id, None)
+                if not bucket:
+                    del self._indexes[field][old_value]
+            self._writable_bucket(field, value)[node_id] = None
+
+        swarm_pos = self._field_pos['swarm']
+        name_pos = self._field_pos['name']
+        old_swarm, swarm_id = old_keys[swarm_pos], keys[swarm_pos]
+        old_name, name = old_keys[name_pos], keys[name_pos]
+        if old_swarm != swarm_id:
+            self._writable_prefix('id', old_swarm).remove(node_id, node_id)
+            self._writable_prefix('id', swarm_id).add(node_id, node_id)
+        if (old_name, old_swarm) != (name, swarm_id):
+            if old_name is not None:
+                self._writable_prefix('name', old_swarm).remove(old_name, node_id)
+            if name is not None:
+                self._writable_prefix('name', swarm_id).add(name, node_id)
+
+
+class SwarmRegistry:
+    """
+    Keeps the swarm entries of a client_dict indexed by swarm id, forks the
+    same way as NodeRegistry
+    """
+
+    def __init__(self, swarm_list):
+        self._swarms = swarm_list
+        self._shared = False
+        self._lock = threading.Lock()
+        self._by_id = {swarm.get('id'): swarm for swarm in swarm_list}
+        self._pos = {swarm.get('id'): pos for pos, swarm in enumerate(swarm_list)}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    @property
+    def entries(self):
+        """
+        The client_dict list of swarm dicts
+        """
+        return self._swarms
+
+    def fork(self):
+        """
+        Return a registry sharing this registry's containers
+        """
+        clone = SwarmRegistry.__new__(SwarmRegistry)
+        clone.__dict__.update(self.__dict__)
+        clone._lock = threading.Lock()
+        self._shared = clone._shared = True
+        return clone
+
+    def add(self, swarm_dict):
+        """
+        Append a new swarm dict to the client_dict and index it
+        """
+        with self._lock:
+            self._unshare()
+            self._pos[swarm_dict['id']] = len(self._swarms)
+            self._swarms.append(swarm_dict)
+            self._by_id[swarm_dict['id']] = swarm_dict
+
+    def remove(self, swarm_id):
+        """
+        Remove a swarm dict from the client_dict and the index
+        """
+        with self._lock:
+            self._unshare()
+            pos = self._pos.pop(swarm_id)
+            del self._swarms[pos]
+            del self._by_id[swarm_id]
+            for swarm in self._swarms[pos:]:
+                self._pos[swarm.get('id')] -= 1
+
+    def replace(self, swarm_dict):
+        """
+        Swap the stored dict of a swarm for swarm_dict, a copy of it
+        """
+        with self._lock:
+            self._unshare()
+            self._by_id[swarm_dict['id']] = swarm_dict
+            self._swarms[self._pos[swarm_dict['id']]] = swarm_dict
+
+    def get(self, swarm_id):
+        """
+        Return the swarm dict with the given id, or None
+        """
+        if swarm_id is None:
+            return None
+        return self._by_id.get(swarm_id)
+
+    def _unshare(self):
+        if not self._shared:
+            return
+        self._swarms = list(self._swarms)
+        self._by_id = dict(self._by_id)
+        self._pos = dict(self._pos)
+        self._shared = False
@@ -0,0 +1,143 @@
+"""
+Declarative schemas for client_dict entries. A schema is a tuple of rules
+that compile_schema() turns into a Python function checking an entry with
+the rules inlined, so validating an entry does not walk the rules again.
+"""
+import collections
+import functools
+
+
+# path is a key or a tuple of keys from the enclosing entry or field. Rules
+# run in order and add {error: message} to the error list when they fail.
+
+# The value at path is required, None (or any falsy value when truthy) fails.
+# fields are rules checked inside the value when it is present.
+Field = collections.namedtuple('Field', ('path', 'error', 'message', 'fields', 'truthy'),
+                               defaults=((), False))
+# The value at path, when present, must be one of values
+OneOf = collections.namedtuple('OneOf', ('path', 'values', 'error', 'message'))
+# The value at path is required when the value at when equals equals, or
+# when it is set if equals is NOT_NONE
+RequiredIf = collections.namedtuple('RequiredIf', ('path', 'when', 'equals', 'error', 'message'))
+NOT_NONE = object()
+# The value at path must be unique across entries. Uniqueness needs the other
+# entries so it is not checked by the validator, which returns the value and
+# the position in the error list where its error goes. The value is None when
+# it is missing or the value at when is.
+Unique = collections.namedtuple('Unique', ('name', 'path', 'when'), defaults=(None,))
+
+
+def unique_names(schema):
+    """
+    Names of the Unique rules of schema, in the order the validator returns them
+    """
+    names = []
+    for rule in schema:
+        if isinstance(rule, Unique):
+            names.append(rule.name)
+        elif isinstance(rule, Field):
+            names.extend(unique_names(rule.fields))
+    return tuple(names)
+
+
+class _Compiler:
+
+    def __init__(self):
+        self.lines = []
+        self.constants = {}
+        self._names = 0
+
+    def name(self, prefix):
+        self._names += 1
+        return f'{prefix}{self._names}'
+
+    def constant(self, value):
+        name = self.name('c')
+        self.constants[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def get(self, indent, parent, path, known):
+        """
+        Emit the lookup of path in the variable parent, returns the variable
+        holding the value. known maps the lookups already made in this scope
+        to their variables, so each value is only looked up once.
+        """
+        keys = (path,) if isinstance(path, str) else tuple(path)
+        value = parent
+        for position in range(len(keys)):
+            lookup = (parent,) + keys[:position + 1]
+            if lookup in known:
+                value = known[lookup]
+                continue
+            target = self.name('v')
+            key = keys[position]
+            if position == 0:
+                self.emit(indent, f'{target} = {value}.get({key!r})')
+            else:
+                self.emit(indent, f'{target} = {value}.get({key!r}) if {value} is not None else None')
+            known[lookup] = value = target
+        return value
+
+    def error(self, indent, rule):
+        # A new dict per error, as the hand written checks made
+        self.emit(indent, f'append({{{rule.error!r}: {rule.message!r}}})')
+
+    def rules(self, indent, parent, schema, uniques, known):
+        for rule in schema:
+            if isinstance(rule, Field):
+                value = self.get(indent, parent, rule.path, known)
+                self.emit(indent, f'if not {value}:' if rule.truthy else f'if {value} is None:')
+                self.error(indent + 1, rule)
+                if rule.fields:
+                    self.emit(indent, 'else:')
+                    self.rules(indent + 1, value, rule.fields, uniques, dict(known))
+            elif isinstance(rule, OneOf):
+                value = self.get(indent, parent, rule.path, known)
+                self.emit(indent, f'if {value} is not None and {value} not in {self.constant(tuple(rule.values))}:')
+                self.error(indent + 1, rule)
+            elif isinstance(rule, RequiredIf):
+                when = self.get(indent, parent, rule.when, known)
+                if rule.equals is NOT_NONE:
+                    self.emit(indent, f'if {when} is not None:')
+                else:
+                    self.emit(indent, f'if {when} == {self.constant(rule.equals)}:')
+                # Looked up only in the branch, so not known after it
+                value = self.get(indent + 1, parent, rule.path, dict(known))
+                self.emit(indent + 1, f'if {value} is None:')
+                self.error(indent + 2, rule)
+            elif isinstance(rule, Unique):
+                value = self.get(indent, parent, rule.path, known)
+                if rule.when is not None:
+                    when = self.get(indent, parent, rule.when, known)
+                    value = f'{value} if {when} is not None else None'
+                self.emit(indent, f'{uniques[rule.name]} = (len(errors), {value})')
+            else:
+                raise TypeError(f"Unknown schema rule {rule!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def compile_schema(schema, name='validate'):
+    """
+    Return a function that checks an entry against schema and returns its
+    error list and the (position, value) of each Unique rule, in the order of
+    unique_names(schema). Schemas are compiled once and cached.
+    """
+    compiler = _Compiler()
+    uniques = {unique: compiler.name('u') for unique in unique_names(schema)}
+    compiler.emit(0, f'def {name}(entry):')
+    compiler.emit(1, 'errors = []')
+    compiler.emit(1, 'append = errors.append')
+    for variable in uniques.values():
+        compiler.emit(1, f'{variable} = (0, None)')
+    compiler.rules(1, 'entry', schema, uniques, {})
+    compiler.emit(1, f"return errors, ({''.join(variable + ', ' for variable in uniques.values())})")
+
+    source = '\n'.join(compiler.lines)
+    namespace = dict(compiler.constants)
+    exec(source, namespace)
+    validator = namespace[name]
+    validator.source = source
+    return validator
@@ -0,0 +1,173 @@
+"""
+Maps Swarm.init and Swarm.update keyword arguments onto the swarm attrs and
+applies them as a single patch.
+"""
+import copy
+
+import docker
+
+
+# Keyword argument -> path of the field it sets in the swarm attrs.
+# data_path_addr is accepted by Docker but not reported in the swarm attrs.
+SWARM_FIELDS = {
+    'default_addr_pool': ('DefaultAddrPool',),
+    'subnet_size': ('SubnetSize',),
+    'name': ('Spec', 'Name'),
+    'labels': ('Spec', 'Labels'),
+    'task_history_retention_limit': ('Spec', 'Orchestration', 'TaskHistoryRetentionLimit'),
+    'snapshot_interval': ('Spec', 'Raft', 'SnapshotInterval'),
+    'keep_old_snapshots': ('Spec', 'Raft', 'KeepOldSnapshots'),
+    'log_entries_for_slow_followers': ('Spec', 'Raft', 'LogEntriesForSlowFollowers'),
+    'heartbeat_tick': ('Spec', 'Raft', 'HeartbeatTick'),
+    'election_tick': ('Spec', 'Raft', 'ElectionTick'),
+    'dispatcher_heartbeat_period': ('Spec', 'Dispatcher', 'HeartbeatPeriod'),
+    'node_cert_expiry': ('Spec', 'CAConfig', 'NodeCertExpiry'),
+    'external_ca': ('Spec', 'CAConfig', 'ExternalCAs'),
+    'signing_ca_cert': ('Spec', 'CAConfig', 'SigningCACert'),
+    'signing_ca_key': ('Spec', 'CAConfig', 'SigningCAKey'),
+    'ca_force_rotate': ('Spec', 'CAConfig', 'ForceRotate'),
+    'autolock_managers': ('Spec', 'EncryptionConfig', 'AutoLockManagers'),
+    'log_driver': ('Spec', 'TaskDefaults', 'LogDriver'),
+}
+
+# Swarm.update arguments that are not swarm fields
+UPDATE_OPTIONS = ('data_path_addr', 'rotate_worker_token', 'rotate_manager_token',
+                  'rotate_manager_unlock_key', 'spec_patch')
+
+# Keyword argument -> (parent path, key), split once so patches only walk to the parent
+_TARGETS = {kwarg: (path[:-1], path[-1]) for kwarg, path in SWARM_FIELDS.items()}
+
+# attrs of a newly initialized swarm before the init arguments are applied
+INIT_ATTRS = {
+    "ID": None,
+    "Version": {
+        "Index": 1
+    },
+    "CreatedAt": None,
+    "UpdatedAt": None,
+    "Spec": {
+        "Name": None,
+        "Labels": {},
+        "Orchestration": {
+            "TaskHistoryRetentionLimit": None
+        },
+        "Raft": {
+            "SnapshotInterval": None,
+            "KeepOldSnapshots": None,
+            "LogEntriesForSlowFollowers": None,
+            "ElectionTick": None,
+            "HeartbeatTick": None
+        },
+        "Dispatcher": {
+            "HeartbeatPeriod": None
+        },
+        "CAConfig": {
+            "NodeCertExpiry": None,
+            "ExternalCAs": None,
+            "SigningCACert": None,
+            "SigningCAKey": None,
+            "ForceRotate": None
+        },
+        "EncryptionConfig": {
+            "AutoLockManagers": False
+        },
+        "TaskDefaults": {
+            "LogDriver": None
+        }
+    },
+    "TLSInfo": {
+        "TrustRoot": "",
+        "CertIssuerSubject": "",
+        "CertIssuerPublicKey": ""
+    },
+    "RootRotationInProgress": False,
+    "DataPathPort": 4789,
+    "DefaultAddrPool": None,
+    "SubnetSize": None,
+    "JoinTokens": {
+        "Worker": None,
+        "Manager": None
+    }
+}
+
+
+def _set_item(container, key, value):
+    container[key] = value
+
+
+def _delete_item(container, key):
+    del container[key]
+
+
+def compile_patch(kwargs):
+    """
+    Return the (parent path, key, value) writes for the swarm keyword arguments
+    in kwargs. Arguments that are None or are not swarm fields are skipped.
+    """
+    return [_TARGETS[kwarg] + (value,) for kwarg, value in kwargs.items()
+            if value is not None and kwarg in _TARGETS]
+
+
+def check_update(kwargs):
+    """
+    Raise InvalidArgument if kwargs are not valid Swarm.update arguments
+    """
+    unknown = [kwarg for kwarg in kwargs if kwarg not in _TARGETS and kwarg not in UPDATE_OPTIONS]
+    if unknown:
+        raise docker.errors.InvalidArgument(f"Unknown swarm update arguments: {', '.join(sorted(unknown))}")
+    spec_patch = kwargs.get('spec_patch')
+    if spec_patch is not None and not isinstance(spec_patch, dict):
+        raise docker.errors.InvalidArgument("spec_patch must be a dict")
+
+
+def apply_patch(attrs, writes, set_item=_set_item):
+    """
+    Apply compiled writes to attrs. Each parent dict is resolved once, missing
+    parents are created.
+    """
+    parents = {(): attrs}
+    for parent_path, key, value in writes:
+        parent = parents.get(parent_path)
+        if parent is None:
+            parent = attrs
+            for part in parent_path:
+                child = parent.get(part)
+                if not isinstance(child, dict):
+                    child = {}
+                    set_item(parent, part, child)
+                parent = child
+            parents[parent_path] = parent
+        set_item(parent, key, value)
+
+
+def apply_merge_patch(target, patch, set_item=_set_item, delete_item=_delete_item):
+    """
+    Apply a JSON merge patch (RFC 7386) to target in place. Objects are merged
+    recursively, null removes a key and any other value replaces it.
+    """
+    for key, value in patch.items():
+        if value is None:
+            if key in target:
+                delete_item(target, key)
+        elif isinstance(value, dict):
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = {}
+                set_item(target, key, child)
+            apply_merge_patch(child, value, set_item, delete_item)
+        else:
+            set_item(target, key, copy.deepcopy(value))
+
+
+def init_attrs(swarm_id, timestamp, join_tokens, kwargs):
+    """
+    Return the attrs of a new swarm built from the Swarm.init keyword arguments
+    """
+    attrs = copy.deepcopy(INIT_ATTRS)
+    attrs['ID'] = swarm_id
+    attrs['CreatedAt'] = attrs['UpdatedAt'] = timestamp
+    attrs['JoinTokens'].update(join_tokens)
+    apply_patch(attrs, compile_patch(kwargs))
+    if kwargs.get('spec_patch'):
+        apply_merge_patch(attrs['Spec'], kwargs['spec_patch'])
+    return attrs
@@ -1,11 +1,28 @@
 import unittest
+import unittest.mock
 import os
+import sys
+import io
 import json
 import copy
+import tempfile
+import threading
+import asyncio
+import concurrent.futures
 
-from docker.errors import APIError, InvalidArgument
+from docker.errors import APIError, InvalidArgument, DockerException, NotFound
 
 from ..mock_docker import MockDocker
+from ..fixtures import fixture_cache
+from ..registry import PrefixIndex, NodeRegistry
+from ..endpoints import parse_base_url, Endpoint
+from ..aio import AsyncMockDocker
+from ..clock import Clock, VirtualClock, uniform
+from ..faults import FaultInjector
+from ..tokens import TokenService
+from ..validate import validate_swarm_data, validate_node_data, stream_validate, SWARM_SCHEMA, _map_chunks, _node_chunk
+from ..schema import Field, OneOf, RequiredIf, Unique, NOT_NONE, compile_schema
+from ..compile_fixture import compile_fixture, compile_store, load_compiled, load_client_dict, load_fixture, artifact_path
 
 
 class TestMockClient(unittest.TestCase):
@@ -152,7 +169,7 @@ class TestnodesClass(unittest.TestCase):
         short_id = node_dict['attrs']['ID'][:3]
         filtered_node_list = []
         for node in self.client_dict['nodes']:
-            if node['swarm'] == node_dict['swarm'] and short_id in node['attrs']['ID']:
+            if node['swarm'] == node_dict['swarm'] and node['attrs']['ID'].startswith(short_id):
                 filtered_node_list.append(node)
 
         self.assertEqual(len(client.nodes.list(filters={'id': short_id})), len(filtered_node_list))
@@ -176,7 +193,7 @@ class TestnodesClass(unittest.TestCase):
         name = node_dict['attrs']['Spec']['Name']
         filtered_node_list = []
         for node in self.client_dict['nodes']:
-            if node['swarm'] == node_dict['swarm'] and name in node['attrs']['Spec']['Name']:
+            if node['swarm'] == node_dict['swarm'] and node['attrs']['Spec']['Name'].startswith(name):
                 filtered_node_list.append(node)
 
         self.assertEqual(len(client.nodes.list(filters={'name': name})), len(filtered_node_list))
@@ -205,6 +222,46 @@ class TestnodesClass(unittest.TestCase):
         self.assertEqual(len(client.nodes.list(filters={'role': role})), len(filtered_node_list))
 
 
+    def test_iter_nodes_in_swarm(self):
+        """
+        Test that iter() lazily yields the same nodes as list()
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None:
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+
+        nodes = client.nodes.iter(filters={'role': node_dict['attrs']['Spec']['Role']})
+        self.assertNotIsInstance(nodes, list)
+        self.assertEqual([node.id for node in nodes],
+                         [node.id for node in client.nodes.list(filters={'role': node_dict['attrs']['Spec']['Role']})])
+        self.assertEqual(next(client.nodes.iter()).attrs['ID'], client.nodes.list()[0].id)
+
+    def test_iter_node_not_in_swarm(self):
+        """
+        Tests that iter() raises an APIError when called, before iterating
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is None:
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes not in swarm found")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+
+        with self.assertRaises(APIError):
+            client.nodes.iter()
+
+
 class TestNodeClass(unittest.TestCase):
     """
     Tests for MockDocker.Node class
@@ -300,16 +357,97 @@ class TestNodeClass(unittest.TestCase):
         self.assertEqual(client._active_server['state'], 'fail')
 
 
+    def test_node_update_bumps_version(self):
+        """
+        Test that each update advances Version.Index and UpdatedAt
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None and node['state'] == 'success':
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found with success state")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        node = client.nodes.get(node_dict['attrs']['ID'])
+        version = node.version
+        updated_at = node.attrs['UpdatedAt']
+
+        node.update({'Availability': 'drain', 'Role': 'worker', 'Name': 'bumped', 'Labels': {}})
+        self.assertEqual(node.version, version + 1)
+        self.assertNotEqual(node.attrs['UpdatedAt'], updated_at)
+        self.assertEqual(client.nodes.get('bumped').version, version + 1)
+
+    def test_node_update_stale_version(self):
+        """
+        Test that an update with an out of date version is rejected
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None and node['state'] == 'success':
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found with success state")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        first = client.nodes.get(node_dict['attrs']['ID'])
+        second = client.nodes.get(node_dict['attrs']['ID'])
+        version = first.version
+
+        first.update({'Availability': 'pause', 'Role': 'worker', 'Name': 'first', 'Labels': {}}, version=version)
+        with self.assertRaises(APIError):
+            second.update({'Availability': 'drain', 'Role': 'worker', 'Name': 'second', 'Labels': {}}, version=version)
+        self.assertEqual(client.nodes.get(node_dict['attrs']['ID']).attrs['Spec']['Name'], 'first')
+
+        second.update({'Availability': 'drain', 'Role': 'worker', 'Name': 'second', 'Labels': {}}, version=version + 1)
+        self.assertEqual(client.nodes.get(node_dict['attrs']['ID']).version, version + 2)
+
+    def test_node_is_view_over_entry(self):
+        """
+        Test that Node objects are slotted and derive their fields from the node entry
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None and node['state'] == 'success':
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found with success state")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        node = client.nodes.get(node_dict['attrs']['ID'])
+
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertIs(node.attrs, node_dict['attrs'])
+        self.assertEqual(node.short_id, node_dict['attrs']['ID'][:10])
+        self.assertEqual(node.version, node_dict['attrs']['Version']['Index'])
+        self.assertEqual(node._swarm, node_dict['swarm'])
+
+        node_dict['attrs']['Version']['Index'] += 1
+        self.assertEqual(node.version, node_dict['attrs']['Version']['Index'])
+        self.assertFalse(hasattr(client.swarm, '__dict__'))
+
+
 class TestSwarmClass(unittest.TestCase):
     """
     Tests to verify functionality of the MockDocker.Swarm class
     """
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
-        self.client_dict = json.load(f)
-        self.mock_client = MockDocker(client_dict=dict(self.client_dict))
+        cls.template = MockDocker(client_dict=json.load(f))
         f.close()
 
+    def setUp(self):
+        # Each test works on a fork, the template's client_dict is never modified
+        self.mock_client = self.template.fork()
+        self.client_dict = self.template._client_dict
+
     def test_swarm_init(self):
         """
         Test that when a connection is made swarm is generated and populated with expected data
@@ -625,7 +763,7 @@ class TestSwarmClass(unittest.TestCase):
         self.assertEqual(update_dict['subnet_size'], client.swarm.attrs['SubnetSize'])
         # data_path_addr - Not Sure of Mapping
         # self.assertEqual(update_dict['data_path_addr'], client.swarm.attrs['DataPathAddr'])
-        self.assertEqual(update_dict['task_history_retention_limit'], client.swarm.attrs['Spec']['TaskHistoryRetentionLimit'])
+        self.assertEqual(update_dict['task_history_retention_limit'], client.swarm.attrs['Spec']['Orchestration']['TaskHistoryRetentionLimit'])
         self.assertEqual(update_dict['snapshot_interval'], client.swarm.attrs['Spec']['Raft']['SnapshotInterval'])
         self.assertEqual(update_dict['keep_old_snapshots'], client.swarm.attrs['Spec']['Raft']['KeepOldSnapshots'])
         self.assertEqual(update_dict['log_entries_for_slow_followers'], client.swarm.attrs['Spec']['Raft']['LogEntriesForSlowFollowers'])
@@ -643,6 +781,81 @@ class TestSwarmClass(unittest.TestCase):
         self.assertEqual(update_dict['log_driver'], client.swarm.attrs['Spec']['TaskDefaults']['LogDriver'])
 
 
+    def test_update_swarm_only_given_fields(self):
+        """
+        Test that Swarm.update() only changes the given fields and bumps the version once
+        """
+        success_swarm = None
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] == 'success':
+                success_swarm = swarm
+                break
+        else:
+            raise Exception("No swarm in success state found")
+
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] == success_swarm['id']:
+                node_dict = node
+                break
+        else:
+            raise Exception(f"No node in swarm {success_swarm['id']} found")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        expected = copy.deepcopy(client.swarm.attrs)
+        version = client.swarm.version
+
+        client.swarm.update(autolock_managers=True, snapshot_interval=5)
+
+        expected['Spec']['EncryptionConfig']['AutoLockManagers'] = True
+        expected['Spec']['Raft']['SnapshotInterval'] = 5
+        expected['Version']['Index'] = version + 1
+        expected['UpdatedAt'] = client.swarm.attrs['UpdatedAt']
+        self.assertEqual(client.swarm.attrs, expected)
+        self.assertNotIn('AutolockManagers', client.swarm.attrs['Spec'])
+
+    def test_update_swarm_spec_patch(self):
+        """
+        Test that Swarm.update() applies a JSON merge patch to the Spec
+        """
+        success_swarm = None
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] == 'success':
+                success_swarm = swarm
+                break
+        else:
+            raise Exception("No swarm in success state found")
+
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] == success_swarm['id']:
+                node_dict = node
+                break
+        else:
+            raise Exception(f"No node in swarm {success_swarm['id']} found")
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        log_options = client.swarm.attrs['Spec']['TaskDefaults']['LogDriver']['Options']
+        version = client.swarm.version
+
+        client.swarm.update(name='patched', spec_patch={
+            'Raft': {'ElectionTick': 30},
+            'TaskDefaults': {'LogDriver': {'Options': {'max-file': None, 'compress': 'true'}}},
+            'Labels': {'team': 'infra'},
+        })
+
+        spec = client.swarm.attrs['Spec']
+        self.assertEqual(spec['Name'], 'patched')
+        self.assertEqual(spec['Raft']['ElectionTick'], 30)
+        self.assertEqual(spec['Raft']['HeartbeatTick'], 1)
+        self.assertEqual(spec['Labels'], {'team': 'infra'})
+        self.assertNotIn('max-file', spec['TaskDefaults']['LogDriver']['Options'])
+        self.assertEqual(spec['TaskDefaults']['LogDriver']['Options']['max-size'], log_options['max-size'])
+        self.assertEqual(spec['TaskDefaults']['LogDriver']['Options']['compress'], 'true')
+        self.assertEqual(client.swarm.version, version + 1)
+
     def test_update_token_rotation(self):
         """
         Test that update function rotates tokens
@@ -749,6 +962,7 @@ class TestSwarmClass(unittest.TestCase):
 
         self.assertIsNotNone(new_swarm)
         self.assertEqual(client.swarm._swarm_id, new_swarm)
+        self.assertEqual(client.swarm.attrs['ID'], new_swarm)
         self.assertEqual(init_dict['default_addr_pool'], client.swarm.attrs['DefaultAddrPool'])
         self.assertEqual(init_dict['subnet_size'], client.swarm.attrs['SubnetSize'])
         # data_path_addr - Not Sure of Mapping
@@ -915,4 +1129,1726 @@ class TestSwarmClass(unittest.TestCase):
         client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
 
         with self.assertRaises(APIError):
-            client.swarm.leave()
\ No newline at end of file
+            client.swarm.leave()
+
+class TestNodeRegistry(unittest.TestCase):
+    """
+    Tests for the node indexes kept by MockDocker
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+
+    def test_registry_lookups(self):
+        """
+        Test that nodes can be resolved by ID, address and swarm membership
+        """
+        registry = self.mock_client._node_registry
+        for node in self.client_dict['nodes']:
+            self.assertIs(registry.get(node['attrs']['ID']), node)
+            self.assertIs(registry.by_addr(node['attrs']['Status']['Addr']), node)
+            self.assertIn(node, list(registry.in_swarm(node['swarm'])))
+        self.assertIsNone(registry.get('non_existant_node'))
+        self.assertIsNone(registry.by_addr('0.0.0.0'))
+
+    def test_prefix_index_built_sorted(self):
+        """
+        Test that the prefix indexes built at construction are sorted like indexes built one node at a time
+        """
+        registry = self.mock_client._node_registry
+        for field, indexes in registry._prefixes.items():
+            for swarm_id, index in indexes.items():
+                incremental = PrefixIndex()
+                for key, node_id in index._entries:
+                    incremental.add(key, node_id)
+                self.assertEqual(index._entries, sorted(index._entries))
+                self.assertEqual(index._entries, incremental._entries)
+
+    def test_registry_follows_node_update(self):
+        """
+        Test that a renamed node can be found by its new name and not its old one
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None and node['state'] == 'success':
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found with success state")
+
+        old_name = node_dict['attrs']['Spec']['Name']
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        client.nodes.get(old_name).update({
+            'Availability': 'active',
+            'Role': 'manager',
+            'Name': 'renamed-node',
+            'Labels': {}
+        })
+
+        self.assertEqual(client.nodes.get('renamed-node').id, node_dict['attrs']['ID'])
+        with self.assertRaises(APIError):
+            client.nodes.get(old_name)
+
+    def test_registry_follows_join_and_leave(self):
+        """
+        Test that the swarm index is kept current when a node joins and leaves a swarm
+        """
+        node_dict = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is None:
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes not in swarm found")
+
+        swarm_dict = None
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] == 'success':
+                swarm_dict = swarm
+                break
+        else:
+            raise Exception("No swarm in success state found")
+
+        swarm_node = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] == swarm_dict['id']:
+                swarm_node = node
+                break
+        else:
+            raise Exception(f"No node in swarm {swarm_dict['id']} found")
+
+        registry = self.mock_client._node_registry
+        swarm_size = registry.swarm_size(swarm_dict['id'])
+
+        ip_address = node_dict['attrs']['Status']['Addr']
+        client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+        client.swarm.join(remote_addrs=[swarm_node['attrs']['Status']['Addr']],
+                          join_token=swarm_dict['attrs']['JoinTokens']['Worker'])
+        self.assertEqual(registry.swarm_size(swarm_dict['id']), swarm_size + 1)
+        self.assertEqual(len(client.nodes.list()), swarm_size + 1)
+
+        client.swarm.leave()
+        self.assertEqual(registry.swarm_size(swarm_dict['id']), swarm_size)
+        self.assertIn(node_dict, list(registry.in_swarm(None)))
+
+
+class TestSwarmCache(unittest.TestCase):
+    """
+    Tests for the swarm index and the Swarm objects cached by DockerClient
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+
+    def _swarm_nodes(self, state, count):
+        swarm_dict = None
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] == state:
+                nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm['id']]
+                if len(nodes) >= count:
+                    swarm_dict = swarm
+                    break
+        else:
+            raise Exception(f"No swarm in {state} state with {count} nodes found")
+        return swarm_dict, nodes
+
+    def test_swarm_registry_lookup(self):
+        """
+        Test that every swarm in the client_dict can be resolved by id
+        """
+        for swarm in self.client_dict['swarms']:
+            self.assertIs(self.mock_client._swarm_registry.get(swarm['id']), swarm)
+        self.assertIsNone(self.mock_client._swarm_registry.get('no_swarm'))
+        self.assertIsNone(self.mock_client._swarm_registry.get(None))
+
+    def test_swarm_object_reused_on_reconnect(self):
+        """
+        Test that reconnecting to the same node returns the cached Swarm object
+        """
+        swarm_dict, nodes = self._swarm_nodes('success', 1)
+        base_url = f"tcp://{nodes[0]['attrs']['Status']['Addr']}:2375"
+
+        first = self.mock_client.DockerClient(base_url=base_url).swarm
+        second = self.mock_client.DockerClient(base_url=base_url).swarm
+        self.assertIs(first, second)
+
+    def test_swarm_cache_invalidated_by_leave(self):
+        """
+        Test that a node reconnecting after leaving its swarm gets a Swarm object with no swarm
+        """
+        swarm_dict, nodes = self._swarm_nodes('success', 2)
+        worker = [node for node in nodes if node['attrs']['Spec']['Role'] == 'worker'][0]
+        base_url = f"tcp://{worker['attrs']['Status']['Addr']}:2375"
+
+        client = self.mock_client.DockerClient(base_url=base_url)
+        client.swarm.leave()
+        client = self.mock_client.DockerClient(base_url=base_url)
+        self.assertIsNone(client.swarm._swarm_id)
+        self.assertIsNone(client.swarm.attrs)
+
+    def test_swarm_cache_invalidated_by_key_rotation(self):
+        """
+        Test that rotating the unlock key from one node is seen by the other nodes in the swarm
+        """
+        swarm_dict, nodes = self._swarm_nodes('success', 2)
+        url_1 = f"tcp://{nodes[0]['attrs']['Status']['Addr']}:2375"
+        url_2 = f"tcp://{nodes[1]['attrs']['Status']['Addr']}:2375"
+
+        self.mock_client.DockerClient(base_url=url_2)
+        client = self.mock_client.DockerClient(base_url=url_1)
+        client.swarm.update(rotate_manager_unlock_key=True)
+        new_key = client.swarm.get_unlock_key()['UnlockKey']
+
+        client = self.mock_client.DockerClient(base_url=url_2)
+        self.assertEqual(client.swarm.get_unlock_key()['UnlockKey'], new_key)
+        self.assertEqual(swarm_dict['UnlockKey'], new_key)
+
+
+class TestNodeFilters(unittest.TestCase):
+    """
+    Tests for the filters accepted by Nodes.list()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+
+        swarm_nodes = None
+        for swarm in self.client_dict['swarms']:
+            swarm_nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm['id']]
+            if len(swarm_nodes) >= 2:
+                break
+        else:
+            raise Exception("No swarm with 2 nodes found")
+        self.swarm_nodes = swarm_nodes
+        ip_address = swarm_nodes[0]['attrs']['Status']['Addr']
+        self.client = self.mock_client.DockerClient(base_url=f"tcp://{ip_address}:2375")
+
+    def test_filter_by_membership(self):
+        """
+        Test that nodes without Spec.Membership are treated as accepted
+        """
+        self.swarm_nodes[1]['attrs']['Spec']['Membership'] = 'pending'
+        self.mock_client._node_registry.reindex(self.swarm_nodes[1])
+
+        pending = self.client.nodes.list(filters={'membership': 'pending'})
+        accepted = self.client.nodes.list(filters={'membership': 'accepted'})
+        self.assertEqual([node.id for node in pending], [self.swarm_nodes[1]['attrs']['ID']])
+        self.assertEqual(len(accepted), len(self.swarm_nodes) - 1)
+
+    def test_filter_by_node_label(self):
+        """
+        Test node.label filters by key and by key=value, multiple labels must all match
+        """
+        self.swarm_nodes[0]['attrs']['Spec']['Labels'] = {'zone': 'a', 'ssd': 'true'}
+        self.swarm_nodes[1]['attrs']['Spec']['Labels'] = {'zone': 'b'}
+
+        self.assertEqual(len(self.client.nodes.list(filters={'node.label': 'zone'})), 2)
+        self.assertEqual(len(self.client.nodes.list(filters={'node.label': 'zone=b'})), 1)
+        self.assertEqual(len(self.client.nodes.list(filters={'node.label': ['zone=a', 'ssd']})), 1)
+        self.assertEqual(len(self.client.nodes.list(filters={'node.label': ['zone=b', 'ssd']})), 0)
+
+    def test_filter_by_engine_label(self):
+        """
+        Test label filters match the engine labels of a node
+        """
+        self.swarm_nodes[0]['attrs']['Description']['Engine']['Labels'] = {'storage': 'ssd'}
+        nodes = self.client.nodes.list(filters={'label': 'storage=ssd'})
+        self.assertEqual([node.id for node in nodes], [self.swarm_nodes[0]['attrs']['ID']])
+
+    def test_filter_values_are_ored(self):
+        """
+        Test that a list of roles returns nodes with any of the roles
+        """
+        nodes = self.client.nodes.list(filters={'role': ['manager', 'worker']})
+        self.assertEqual(len(nodes), len(self.swarm_nodes))
+
+    def test_invalid_filter(self):
+        """
+        Test that unknown filters and invalid role values raise an APIError
+        """
+        with self.assertRaises(APIError):
+            self.client.nodes.list(filters={'not_a_filter': 'value'})
+        with self.assertRaises(APIError):
+            self.client.nodes.list(filters={'role': 'leader'})
+
+
+class TestPrefixMatching(unittest.TestCase):
+    """
+    Tests for prefix matching of id and name filters and short ID resolution
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+
+        swarm_nodes = None
+        for swarm in self.client_dict['swarms']:
+            swarm_nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm['id']]
+            if len(swarm_nodes) >= 2:
+                break
+        else:
+            raise Exception("No swarm with 2 nodes found")
+        self.swarm_nodes = swarm_nodes
+        self.base_url = f"tcp://{swarm_nodes[0]['attrs']['Status']['Addr']}:2375"
+
+    def test_id_filter_matches_prefix(self):
+        """
+        Test that the id filter only matches IDs starting with the filter value
+        """
+        client = MockDocker(client_dict=self.client_dict).DockerClient(base_url=self.base_url)
+        node_id = self.swarm_nodes[0]['attrs']['ID']
+
+        self.assertEqual([node.id for node in client.nodes.list(filters={'id': node_id})], [node_id])
+        self.assertEqual(len(client.nodes.list(filters={'id': node_id[1:]})), 0)
+
+    def test_name_filter_matches_prefix(self):
+        """
+        Test that the name filter matches names starting with the filter value
+        """
+        client = MockDocker(client_dict=self.client_dict).DockerClient(base_url=self.base_url)
+        name = self.swarm_nodes[0]['attrs']['Spec']['Name']
+
+        self.assertEqual(len(client.nodes.list(filters={'name': name[:2]})), len(self.swarm_nodes))
+        self.assertEqual(len(client.nodes.list(filters={'name': name[1:]})), 0)
+
+    def test_substring_mode(self):
+        """
+        Test that filter_match='substring' matches id and name anywhere in the value
+        """
+        mock_client = MockDocker(client_dict=self.client_dict, filter_match='substring')
+        client = mock_client.DockerClient(base_url=self.base_url)
+        node_id = self.swarm_nodes[0]['attrs']['ID']
+        name = self.swarm_nodes[0]['attrs']['Spec']['Name']
+
+        self.assertEqual([node.id for node in client.nodes.list(filters={'id': node_id[1:]})], [node_id])
+        self.assertEqual(len(client.nodes.list(filters={'name': name[1:]})), 1)
+
+    def test_get_by_short_id(self):
+        """
+        Test that get() resolves a unique ID prefix and rejects an ambiguous one
+        """
+        client = MockDocker(client_dict=self.client_dict).DockerClient(base_url=self.base_url)
+        node_id = self.swarm_nodes[0]['attrs']['ID']
+        other_id = self.swarm_nodes[1]['attrs']['ID']
+        common = os.path.commonprefix([node_id, other_id])
+
+        self.assertEqual(client.nodes.get(node_id[:len(common) + 1]).id, node_id)
+        with self.assertRaises(APIError):
+            client.nodes.get(common)
+
+
+class TestFork(unittest.TestCase):
+    """
+    Tests for MockDocker.fork()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+        self.pristine = copy.deepcopy(self.client_dict)
+
+    def _node(self, swarm=True, state='success'):
+        for node in self.client_dict['nodes']:
+            if (node['swarm'] is not None) == swarm and node['state'] == state:
+                return node
+        raise Exception("No matching node found")
+
+    def test_fork_shares_entries_until_written(self):
+        """
+        Test that a fork shares node dicts with its parent until it updates one
+        """
+        node_dict = self._node()
+        node_id = node_dict['attrs']['ID']
+        fork = self.mock_client.fork()
+        self.assertIs(fork._node_registry.get(node_id), node_dict)
+
+        client = fork.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'forked', 'Labels': {}})
+
+        self.assertIsNot(fork._node_registry.get(node_id), node_dict)
+        self.assertEqual(fork._node_registry.get(node_id)['attrs']['Spec']['Name'], 'forked')
+        self.assertEqual(self.client_dict, self.pristine)
+        # Other nodes are still shared
+        other = [node for node in self.client_dict['nodes'] if node is not node_dict][0]
+        self.assertIs(fork._node_registry.get(other['attrs']['ID']), other)
+
+    def test_reload_reads_copied_entry(self):
+        """
+        Test that a Node reloaded after its entry was copied on write can update with its version
+        """
+        node_dict = self._node()
+        node_id = node_dict['attrs']['ID']
+        fork = self.mock_client.fork()
+        client = fork.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+        stale = client.nodes.get(node_id)
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'forked', 'Labels': {}})
+
+        with self.assertRaises(APIError):
+            stale.update({'Availability': 'pause', 'Role': 'worker', 'Name': 'stale', 'Labels': {}}, version=stale.version)
+        stale.reload()
+        self.assertEqual(stale.attrs['Spec']['Name'], 'forked')
+        stale.update({'Availability': 'pause', 'Role': 'worker', 'Name': 'reloaded', 'Labels': {}}, version=stale.version)
+        self.assertEqual(fork._node_registry.get(node_id)['attrs']['Spec']['Name'], 'reloaded')
+        self.assertEqual(self.client_dict, self.pristine)
+
+    def test_fork_copies_only_written_indexes(self):
+        """
+        Test that a write on a fork copies only the indexes it changes and leaves the parent's untouched
+        """
+        node_dict = self._node()
+        node_id = node_dict['attrs']['ID']
+        swarm_id = node_dict['swarm']
+        availability = node_dict['attrs']['Spec']['Availability']
+        parent = self.mock_client._node_registry
+        fork = self.mock_client.fork()
+
+        client = fork.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+        client.nodes.get(node_id).update({'Availability': 'pause', 'Role': node_dict['attrs']['Spec']['Role'],
+                                          'Name': node_dict['attrs']['Spec']['Name'],
+                                          'Labels': node_dict['attrs']['Spec'].get('Labels')})
+
+        registry = fork._node_registry
+        self.assertIn(node_id, registry.bucket('availability', (swarm_id, 'pause')))
+        self.assertNotIn(node_id, registry.bucket('availability', (swarm_id, availability)))
+        self.assertIn(node_id, parent.bucket('availability', (swarm_id, availability)))
+        self.assertNotIn(node_id, parent.bucket('availability', (swarm_id, 'pause')))
+        # Indexes of fields that did not change are still shared
+        for field in ('name', 'addr', 'swarm', 'hostname'):
+            self.assertIs(registry._indexes[field], parent._indexes[field])
+        self.assertIs(registry._prefixes['name'][swarm_id], parent._prefixes['name'][swarm_id])
+
+    def test_fork_isolated_from_parent(self):
+        """
+        Test that swarm changes made on the parent after forking are not seen by the fork
+        """
+        fork = self.mock_client.fork()
+        node_dict = self._node(swarm=False)
+        client = self.mock_client.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+        swarm_id = client.swarm.init(name='parent_swarm')
+
+        self.assertIsNotNone(self.mock_client._swarm_registry.get(swarm_id))
+        self.assertIsNone(fork._swarm_registry.get(swarm_id))
+        self.assertEqual(len(fork._client_dict['swarms']), len(self.pristine['swarms']))
+        self.assertIsNone(fork._node_registry.get(node_dict['attrs']['ID'])['swarm'])
+
+    def test_forks_isolated_from_each_other(self):
+        """
+        Test that two forks of the same instance do not see each other's swarm updates
+        """
+        success_ids = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success']
+        node_dict = [node for node in self.client_dict['nodes'] if node['swarm'] in success_ids][0]
+        base_url = f"tcp://{node_dict['attrs']['Status']['Addr']}:2375"
+        fork_1 = self.mock_client.fork()
+        fork_2 = self.mock_client.fork()
+
+        fork_1.DockerClient(base_url=base_url).swarm.update(rotate_worker_token=True)
+        tokens_1 = fork_1.DockerClient(base_url=base_url).swarm.attrs['JoinTokens']
+        tokens_2 = fork_2.DockerClient(base_url=base_url).swarm.attrs['JoinTokens']
+
+        self.assertNotEqual(tokens_1['Worker'], tokens_2['Worker'])
+        self.assertEqual(self.client_dict, self.pristine)
+
+
+class TestSavepoint(unittest.TestCase):
+    """
+    Tests for MockDocker.savepoint() and MockDocker.rollback()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+        self.pristine = copy.deepcopy(self.client_dict)
+
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] == 'success':
+                self.swarm_dict = swarm
+                break
+        else:
+            raise Exception("No swarm in success state found")
+        for node in self.client_dict['nodes']:
+            if node['swarm'] == self.swarm_dict['id'] and node['attrs']['Spec']['Role'] == 'manager':
+                self.node_dict = node
+                break
+        else:
+            raise Exception(f"No manager node found in swarm {self.swarm_dict['id']}")
+        self.base_url = f"tcp://{self.node_dict['attrs']['Status']['Addr']}:2375"
+
+    def test_rollback_node_update(self):
+        """
+        Test that rollback restores a node's Spec and the name index
+        """
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+        old_name = self.node_dict['attrs']['Spec']['Name']
+        savepoint = self.mock_client.savepoint()
+        client.nodes.get(old_name).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'renamed', 'Labels': {}})
+
+        self.mock_client.rollback(savepoint)
+        self.assertEqual(self.client_dict, self.pristine)
+        self.assertEqual(client.nodes.get(old_name).id, self.node_dict['attrs']['ID'])
+        with self.assertRaises(APIError):
+            client.nodes.get('renamed')
+
+    def test_rollback_swarm_changes(self):
+        """
+        Test that rollback undoes swarm updates, leave and init
+        """
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+        with self.mock_client.savepoint():
+            client.swarm.update(name='changed', rotate_worker_token=True, rotate_manager_unlock_key=True)
+            client.swarm.leave(force=True)
+            client.swarm.init(name='new_swarm')
+            self.assertNotEqual(self.client_dict, self.pristine)
+
+        self.assertEqual(self.client_dict, self.pristine)
+        self.assertEqual(client.swarm._swarm_id, self.swarm_dict['id'])
+        self.assertEqual(client.swarm.get_unlock_key()['UnlockKey'], self.swarm_dict['UnlockKey'])
+        self.assertEqual(len(client.nodes.list()), len([node for node in self.client_dict['nodes']
+                                                        if node['swarm'] == self.swarm_dict['id']]))
+
+    def test_nested_savepoints(self):
+        """
+        Test that rolling back an inner savepoint keeps changes made before it
+        """
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+        outer = self.mock_client.savepoint()
+        client.swarm.update(name='outer')
+        inner = self.mock_client.savepoint()
+        client.swarm.update(name='inner')
+
+        self.mock_client.rollback(inner)
+        self.assertEqual(self.swarm_dict['attrs']['Spec']['Name'], 'outer')
+        self.mock_client.rollback(outer)
+        self.assertEqual(self.client_dict, self.pristine)
+        self.assertIsNone(self.mock_client._journal)
+        with self.assertRaises(ValueError):
+            self.mock_client.rollback(outer)
+
+    def test_rollback_reload_state(self):
+        """
+        Test that rollback restores the state flipped by reload
+        """
+        fail_node = None
+        for node in self.client_dict['nodes']:
+            if node['swarm'] is not None and node['state'] == 'fail':
+                fail_node = node
+                break
+        else:
+            raise Exception("No Nodes in swarm found with fail state")
+
+        client = self.mock_client.DockerClient(base_url=f"tcp://{fail_node['attrs']['Status']['Addr']}:2375")
+        node = client.nodes.get(fail_node['attrs']['ID'])
+        with self.mock_client.savepoint():
+            node.reload()
+            self.assertEqual(node._state, 'reload')
+        self.assertEqual(node._state, 'fail')
+
+
+class TestFromFile(unittest.TestCase):
+    """
+    Tests for MockDocker.from_file() and the fixture cache
+    """
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(__file__), 'mockClient.json')
+        fixture_cache.clear()
+
+    def tearDown(self):
+        fixture_cache.maxsize = 32
+        fixture_cache.clear()
+
+    def test_file_parsed_once(self):
+        """
+        Test that loading the same file twice hits the cache and returns isolated instances
+        """
+        mock_1 = MockDocker.from_file(self.path)
+        mock_2 = MockDocker.from_file(self.path)
+        self.assertEqual((fixture_cache.misses, fixture_cache.hits), (1, 1))
+        self.assertIsNot(mock_1, mock_2)
+
+        node_dict = None
+        for node in mock_1._client_dict['nodes']:
+            if node['swarm'] is None:
+                node_dict = node
+                break
+        else:
+            raise Exception("No Nodes not in swarm found")
+        client = mock_1.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+        swarm_id = client.swarm.init(name='from_file')
+
+        self.assertIsNone(mock_2._swarm_registry.get(swarm_id))
+        self.assertIsNone(MockDocker.from_file(self.path)._swarm_registry.get(swarm_id))
+
+    def test_modified_file_reloaded(self):
+        """
+        Test that a change to the file's size or mtime invalidates the cached entry
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'client.json')
+            with open(self.path, 'r') as source:
+                client_dict = json.load(source)
+            with open(path, 'w') as target:
+                json.dump(client_dict, target)
+            self.assertEqual(len(MockDocker.from_file(path)._client_dict['swarms']), len(client_dict['swarms']))
+
+            client_dict['swarms'].pop()
+            with open(path, 'w') as target:
+                json.dump(client_dict, target)
+            self.assertEqual(len(MockDocker.from_file(path)._client_dict['swarms']), len(client_dict['swarms']))
+            self.assertEqual(fixture_cache.misses, 2)
+            self.assertEqual(len(fixture_cache), 1)
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used file is evicted when the cache is full
+        """
+        fixture_cache.maxsize = 1
+        MockDocker.from_file(self.path)
+        MockDocker.from_file(self.path, filter_match='substring')
+        MockDocker.from_file(self.path)
+        self.assertEqual(fixture_cache.misses, 3)
+        self.assertEqual(len(fixture_cache), 1)
+
+
+class TestCompiledFixture(unittest.TestCase):
+    """
+    Tests for compiled client_dict artifacts
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'client.json')
+        with open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r') as source:
+            self.client_dict = json.load(source)
+        with open(self.path, 'w') as target:
+            json.dump(self.client_dict, target)
+        fixture_cache.clear()
+
+    def tearDown(self):
+        fixture_cache.clear()
+        self.tmp_dir.cleanup()
+
+    def test_compiled_round_trip(self):
+        """
+        Test that a compiled artifact loads the same client_dict as the json
+        """
+        artifact = compile_fixture(self.path)
+        self.assertEqual(artifact, artifact_path(self.path))
+        self.assertEqual(load_compiled(self.path), self.client_dict)
+        self.assertEqual(load_client_dict(self.path), (self.client_dict, True))
+        self.assertEqual(MockDocker.from_file(self.path)._client_dict, self.client_dict)
+
+    def test_compiled_node_index(self):
+        """
+        Test that the artifact stores the node indexes and a registry loaded from
+        them matches one built from the nodes
+        """
+        compile_fixture(self.path)
+        client_dict, validated, node_index = load_fixture(self.path)
+        self.assertTrue(validated)
+        built = NodeRegistry(self.client_dict['nodes'])
+        self.assertEqual(node_index, built.snapshot())
+        loaded = NodeRegistry.from_snapshot(client_dict['nodes'], node_index)
+        self.assertEqual(loaded.snapshot(), built.snapshot())
+
+        node_dict = next(node for node in self.client_dict['nodes'] if node['swarm'] is not None)
+        base_url = f"tcp://{node_dict['attrs']['Status']['Addr']}:2375"
+        short_id = node_dict['attrs']['ID'][:3]
+        expected = [node['attrs']['ID'] for node in self.client_dict['nodes']
+                    if node['swarm'] == node_dict['swarm'] and node['attrs']['ID'].startswith(short_id)]
+        client = MockDocker.from_file(self.path).DockerClient(base_url=base_url)
+        self.assertCountEqual([node.id for node in client.nodes.list(filters={'id': short_id})], expected)
+
+    def test_older_versions_rebuilt(self):
+        """
+        Test that artifacts and stores written by an older version are not used
+        """
+        fixture_module = sys.modules[compile_fixture.__module__]
+        store_module = sys.modules[fixture_module.build_store.__module__]
+        with unittest.mock.patch.object(fixture_module, 'SCHEMA_VERSION', fixture_module.SCHEMA_VERSION - 1):
+            compile_fixture(self.path)
+        self.assertIsNone(load_compiled(self.path))
+        self.assertEqual(load_client_dict(self.path), (self.client_dict, False))
+
+        with unittest.mock.patch.object(store_module, 'STORE_VERSION', store_module.STORE_VERSION - 1):
+            store = compile_store(self.path)
+        with self.assertRaises(ValueError):
+            MockDocker.from_store(store)
+
+    def test_stale_artifact_falls_back_to_json(self):
+        """
+        Test that the json is used when it changed after it was compiled
+        """
+        compile_fixture(self.path)
+        self.client_dict['swarms'].pop()
+        with open(self.path, 'w') as target:
+            json.dump(self.client_dict, target)
+
+        self.assertIsNone(load_compiled(self.path))
+        self.assertEqual(load_client_dict(self.path), (self.client_dict, False))
+
+    def test_touched_json_still_uses_artifact(self):
+        """
+        Test that an artifact is still used when only the json's mtime changed
+        """
+        compile_fixture(self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(load_compiled(self.path), self.client_dict)
+
+    def test_invalid_json_not_compiled(self):
+        """
+        Test that a client_dict that fails validation is not compiled
+        """
+        del self.client_dict['swarms'][0]['id']
+        with open(self.path, 'w') as target:
+            json.dump(self.client_dict, target)
+
+        with self.assertRaises(Exception):
+            compile_fixture(self.path)
+        self.assertFalse(os.path.exists(artifact_path(self.path)))
+
+
+class TestNodeStore(unittest.TestCase):
+    """
+    Tests for MockDocker.from_store() and memory mapped node stores
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        json_path = os.path.join(self.tmp_dir.name, 'client.json')
+        with open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r') as source:
+            self.client_dict = json.load(source)
+        with open(json_path, 'w') as target:
+            json.dump(self.client_dict, target)
+        self.path = compile_store(json_path)
+
+        swarm_nodes = None
+        for swarm in self.client_dict['swarms']:
+            swarm_nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm['id']]
+            if swarm['state'] == 'success' and len(swarm_nodes) >= 2:
+                break
+        else:
+            raise Exception("No swarm in success state with 2 nodes found")
+        self.swarm_nodes = swarm_nodes
+        self.base_url = f"tcp://{swarm_nodes[0]['attrs']['Status']['Addr']}:2375"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_nodes_decoded_on_access(self):
+        """
+        Test that connecting and filtering only decodes the nodes that are returned
+        """
+        mock_client = MockDocker.from_store(self.path)
+        store = mock_client._client_dict['nodes']
+        self.assertEqual(store.cached, 0)
+
+        client = mock_client.DockerClient(base_url=self.base_url)
+        self.assertEqual(store.cached, 1)
+        nodes = client.nodes.list(filters={'role': 'worker'})
+        self.assertEqual(store.cached, 1 + len(nodes))
+        self.assertEqual(client.nodes.get(self.swarm_nodes[1]['attrs']['ID']).attrs,
+                         self.swarm_nodes[1]['attrs'])
+
+    def test_decoded_cache_is_bounded(self):
+        """
+        Test that at most cache_size decoded entries are kept
+        """
+        mock_client = MockDocker.from_store(self.path, cache_size=2)
+        for node in mock_client._node_registry:
+            self.assertIsNotNone(node)
+        self.assertEqual(mock_client._client_dict['nodes'].cached, 2)
+
+    def test_updates_survive_eviction(self):
+        """
+        Test that an updated node keeps its changes after it would have been evicted
+        """
+        mock_client = MockDocker.from_store(self.path, cache_size=1)
+        client = mock_client.DockerClient(base_url=self.base_url)
+        node_id = self.swarm_nodes[1]['attrs']['ID']
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'stored', 'Labels': {}})
+
+        for node in mock_client._node_registry:
+            self.assertIsNotNone(node)
+        self.assertEqual(client.nodes.get('stored').attrs['Spec']['Availability'], 'drain')
+
+    def test_evicted_entries_stay_in_sync(self):
+        """
+        Test that a Node holding an evicted entry sees updates made through a later lookup
+        """
+        mock_client = MockDocker.from_store(self.path, cache_size=1)
+        client = mock_client.DockerClient(base_url=self.base_url)
+        node_id = self.swarm_nodes[1]['attrs']['ID']
+        node = client.nodes.get(node_id)
+        for entry in mock_client._node_registry:
+            self.assertIsNotNone(entry)
+
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'stored', 'Labels': {}})
+        self.assertEqual(node.attrs['Spec']['Availability'], 'drain')
+
+
+class TestBulkOperations(unittest.TestCase):
+    """
+    Tests for Nodes.update_many(), Nodes.set_availability() and Swarm.update_batch()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+
+    def _connect(self, state):
+        for swarm in self.client_dict['swarms']:
+            if swarm['state'] != state:
+                continue
+            for node in self.client_dict['nodes']:
+                if node['swarm'] == swarm['id']:
+                    return self.mock_client.DockerClient(base_url=f"tcp://{node['attrs']['Status']['Addr']}:2375")
+        raise Exception(f"No node in a swarm in {state} state found")
+
+    def test_update_many(self):
+        """
+        Test that update_many updates every node and bumps each version once
+        """
+        client = self._connect('success')
+        nodes = [node for node in client.nodes.list() if node._state != 'fail']
+        versions = {node.id: node.version for node in nodes}
+
+        updated = client.nodes.update_many({
+            node.id: {'Availability': 'drain', 'Role': 'worker', 'Name': f'bulk-{idx}', 'Labels': {}}
+            for idx, node in enumerate(nodes)
+        })
+
+        self.assertEqual(len(updated), len(nodes))
+        for idx, node in enumerate(nodes):
+            current = client.nodes.get(f'bulk-{idx}')
+            self.assertEqual(current.attrs['Spec']['Availability'], 'drain')
+            self.assertEqual(current.version, versions[node.id] + 1)
+
+    def test_update_many_is_atomic(self):
+        """
+        Test that update_many changes nothing if any node or spec is invalid
+        """
+        client = self._connect('success')
+        node = next(node for node in client.nodes.list() if node._state != 'fail')
+        pristine = copy.deepcopy(self.client_dict)
+
+        with self.assertRaises(APIError):
+            client.nodes.update_many({
+                node.id: {'Availability': 'drain', 'Role': 'worker', 'Name': 'bulk', 'Labels': {}},
+                'missing-node': {'Availability': 'drain', 'Role': 'worker', 'Name': 'missing', 'Labels': {}},
+            })
+        with self.assertRaises(APIError):
+            client.nodes.update_many({node.id: {'Availability': 'asleep'}})
+        self.assertEqual(self.client_dict, pristine)
+
+    def test_set_availability_by_filter(self):
+        """
+        Test that set_availability only changes the nodes matching the filters
+        """
+        client = self._connect('success')
+        workers = [node.id for node in client.nodes.list(filters={'role': 'worker'}) if node._state != 'fail']
+        managers = {node.id: node.attrs['Spec']['Availability'] for node in client.nodes.list(filters={'role': 'manager'})}
+        if len(workers) != len(client.nodes.list(filters={'role': 'worker'})):
+            self.skipTest("A worker node is in a fail state")
+
+        changed = client.nodes.set_availability('drain', filters={'role': 'worker'})
+
+        self.assertEqual(sorted(node.id for node in changed),
+                         sorted(node_id for node_id in workers))
+        self.assertEqual(sorted(node.id for node in client.nodes.list(filters={'availability': 'drain', 'role': 'worker'})),
+                         sorted(workers))
+        for node_id, availability in managers.items():
+            self.assertEqual(client.nodes.get(node_id).attrs['Spec']['Availability'], availability)
+        self.assertEqual(client.nodes.set_availability('drain', filters={'role': 'worker'}), [])
+
+    def test_set_availability_invalid(self):
+        """
+        Test that set_availability rejects unknown availabilities
+        """
+        client = self._connect('success')
+        with self.assertRaises(APIError):
+            client.nodes.set_availability('asleep')
+
+    def test_swarm_update_batch(self):
+        """
+        Test that update_batch applies every entry in order with a single version bump
+        """
+        client = self._connect('success')
+        version = client.swarm.version
+
+        client.swarm.update_batch([
+            {'snapshot_interval': 10, 'name': 'first'},
+            {'name': 'second', 'rotate_worker_token': True},
+        ])
+
+        self.assertEqual(client.swarm.attrs['Spec']['Raft']['SnapshotInterval'], 10)
+        self.assertEqual(client.swarm.attrs['Spec']['Name'], 'second')
+        self.assertEqual(client.swarm.version, version + 1)
+
+    def test_swarm_update_batch_checks_every_entry(self):
+        """
+        Test that an invalid entry in update_batch leaves the swarm unchanged
+        """
+        client = self._connect('success')
+        attrs = copy.deepcopy(client.swarm.attrs)
+
+        with self.assertRaises(InvalidArgument):
+            client.swarm.update_batch([{'name': 'first'}, {'not_a_field': 1}])
+        self.assertEqual(client.swarm.attrs, attrs)
+
+
+class TestClientSessions(unittest.TestCase):
+    """
+    Tests for the Client sessions returned by MockDocker.DockerClient()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+
+    def test_sessions_are_independent(self):
+        """
+        Test that connecting to a second node does not change the first session
+        """
+        in_swarm = [node for node in self.client_dict['nodes'] if node['swarm'] is not None][0]
+        no_swarm = [node for node in self.client_dict['nodes'] if node['swarm'] is None][0]
+
+        first = self.mock_client.DockerClient(base_url=f"tcp://{in_swarm['attrs']['Status']['Addr']}:2375")
+        second = self.mock_client.DockerClient(base_url=f"tcp://{no_swarm['attrs']['Status']['Addr']}:2375")
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first._active_server, in_swarm)
+        self.assertEqual(second._active_server, no_swarm)
+        self.assertEqual(first.swarm._swarm_id, in_swarm['swarm'])
+        self.assertIsNone(second.swarm._swarm_id)
+        self.assertEqual(len(first.nodes.list()),
+                         len([node for node in self.client_dict['nodes'] if node['swarm'] == in_swarm['swarm']]))
+        with self.assertRaises(APIError):
+            second.nodes.list()
+
+    def test_sessions_share_cluster_state(self):
+        """
+        Test that a change made through one session is seen by another
+        """
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm_id]
+        first = self.mock_client.DockerClient(base_url=f"tcp://{nodes[0]['attrs']['Status']['Addr']}:2375")
+        second = self.mock_client.DockerClient(base_url=f"tcp://{nodes[1]['attrs']['Status']['Addr']}:2375")
+
+        first.nodes.get(nodes[1]['attrs']['ID']).update({'Availability': 'drain', 'Role': 'worker', 'Name': 'shared', 'Labels': {}})
+        self.assertEqual(second._active_server['attrs']['Spec']['Name'], 'shared')
+        self.assertEqual(second.nodes.get('shared').id, nodes[1]['attrs']['ID'])
+
+    def test_threaded_updates(self):
+        """
+        Test that concurrent updates, bulk updates and swarm updates from many
+        sessions leave consistent indexes and versions
+        """
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm_id and node['state'] != 'fail']
+        # Enough workers for their savepoints to overlap
+        worker_node = [node for node in nodes if node['attrs']['Spec']['Role'] == 'worker'][0]
+        for idx in range(8):
+            node = copy.deepcopy(worker_node)
+            node['attrs']['ID'] = f"{worker_node['attrs']['ID']}_{idx}"
+            node['attrs']['Status']['Addr'] = f"10.99.0.{idx + 1}"
+            node['attrs']['Spec']['Name'] = node['attrs']['Description']['Hostname'] = f"extra-{idx}"
+            self.client_dict['nodes'].append(node)
+            nodes.append(node)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        swarm_version = self.mock_client._swarm_registry.get(swarm_id)['attrs']['Version']['Index']
+        versions = {node['attrs']['ID']: node['attrs']['Version']['Index'] for node in nodes}
+        rounds = 50
+        errors = []
+
+        def worker(node_dict):
+            try:
+                client = self.mock_client.DockerClient(base_url=f"tcp://{node_dict['attrs']['Status']['Addr']}:2375")
+                node_id = node_dict['attrs']['ID']
+                for idx in range(rounds):
+                    client.nodes.get(node_id).update({
+                        'Availability': 'active', 'Role': 'worker', 'Name': f"{node_id}-{idx}", 'Labels': {}})
+                    client.nodes.update_many({node_id: {
+                        'Availability': ('active', 'drain')[idx % 2], 'Role': 'worker',
+                        'Name': f"{node_id}-{idx}", 'Labels': {}}})
+                    client.swarm.update(snapshot_interval=idx + 1)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker, args=(node,)) for node in nodes]
+        # Switch threads often so the bulk updates' savepoints interleave
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        client = self.mock_client.DockerClient(base_url=f"tcp://{nodes[0]['attrs']['Status']['Addr']}:2375")
+        for node_dict in nodes:
+            node = client.nodes.get(f"{node_dict['attrs']['ID']}-{rounds - 1}")
+            self.assertEqual(node.version, versions[node_dict['attrs']['ID']] + 2 * rounds)
+        self.assertEqual(len(client.nodes.list(filters={'availability': 'drain'})), len(nodes))
+        self.assertEqual(self.mock_client._swarm_registry.get(swarm_id)['attrs']['Version']['Index'],
+                         swarm_version + rounds * len(nodes))
+
+
+class TestEndpoints(unittest.TestCase):
+    """
+    Tests for base_url parsing and session reuse in MockDocker.DockerClient()
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+        self.node_dict = [node for node in self.client_dict['nodes'] if node['swarm'] is not None][0]
+        self.addr = self.node_dict['attrs']['Status']['Addr']
+
+    def test_parse_base_url(self):
+        """
+        Test that supported base_url formats are normalized
+        """
+        self.assertEqual(parse_base_url('tcp://10.0.0.1:2375'), Endpoint('tcp', '10.0.0.1', 2375, None))
+        self.assertEqual(parse_base_url('10.0.0.1'), Endpoint('tcp', '10.0.0.1', 2375, None))
+        self.assertEqual(parse_base_url('https://Node-1'), Endpoint('https', 'node-1', 2376, None))
+        self.assertEqual(parse_base_url('ssh://admin@node-1:2222'), Endpoint('ssh', 'node-1', 2222, None))
+        self.assertEqual(parse_base_url('tcp://[::1]:2375'), Endpoint('tcp', '::1', 2375, None))
+        self.assertEqual(parse_base_url('unix:///var/run/docker.sock'),
+                         Endpoint('unix', None, None, '/var/run/docker.sock'))
+        for base_url in ('ftp://10.0.0.1', 'tcp://10.0.0.1:port', 'unix://'):
+            with self.assertRaises(DockerException):
+                parse_base_url(base_url)
+
+    def test_sessions_reused(self):
+        """
+        Test that connecting to the same endpoint again returns the open session
+        """
+        client = self.mock_client.DockerClient(base_url=f"tcp://{self.addr}:2375")
+        self.assertIs(self.mock_client.DockerClient(base_url=f"{self.addr}:2375"), client)
+        self.assertIsNot(self.mock_client.DockerClient(base_url=f"tcp://{self.addr}:2376"), client)
+
+    def test_connect_by_hostname_and_ssh(self):
+        """
+        Test that hosts are matched against node host names when no address matches
+        """
+        hostname = self.node_dict['attrs']['Description']['Hostname']
+        for base_url in (f"tcp://{hostname.upper()}:2375", f"ssh://admin@{hostname}", f"ssh://{self.addr}"):
+            client = self.mock_client.DockerClient(base_url=base_url)
+            self.assertEqual(client._active_server, self.node_dict)
+
+    def test_unknown_endpoint_raises(self):
+        """
+        Test that DockerClient raises instead of returning None when no node matches
+        """
+        with self.assertRaises(APIError):
+            self.mock_client.DockerClient(base_url="tcp://10.255.255.1:2375")
+        with self.assertRaises(APIError):
+            self.mock_client.DockerClient()
+
+    def test_from_env_and_registered_socket(self):
+        """
+        Test that from_env connects to DOCKER_HOST, or the registered default socket
+        """
+        client = self.mock_client.from_env(environment={'DOCKER_HOST': f"tcp://{self.addr}:2375"})
+        self.assertEqual(client._active_server, self.node_dict)
+
+        self.mock_client.register_endpoint('unix:///var/run/docker.sock', self.node_dict['attrs']['ID'])
+        self.assertEqual(self.mock_client.from_env(environment={})._active_server, self.node_dict)
+        self.assertIs(self.mock_client.DockerClient(), self.mock_client.from_env(environment={}))
+
+
+class TestAsyncMockDocker(unittest.IsolatedAsyncioTestCase):
+    """
+    Tests for the asyncio facade in aio.py
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        self.mock_client = MockDocker(client_dict=self.client_dict)
+        f.close()
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        self.nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm_id]
+        self.base_url = f"tcp://{self.nodes[0]['attrs']['Status']['Addr']}:2375"
+
+    async def test_nodes(self):
+        """
+        Test that get, list and iter return the same nodes as the sync client
+        """
+        client = AsyncMockDocker(self.mock_client).DockerClient(base_url=self.base_url)
+        sync_client = self.mock_client.DockerClient(base_url=self.base_url)
+
+        node = await client.nodes.get(self.nodes[0]['attrs']['ID'])
+        self.assertEqual(node.attrs, self.nodes[0]['attrs'])
+        self.assertEqual([node.id for node in await client.nodes.list()],
+                         [node.id for node in sync_client.nodes.list()])
+        self.assertEqual([node.id async for node in client.nodes.iter(filters={'role': 'manager'})],
+                         [node.id for node in sync_client.nodes.list(filters={'role': 'manager'})])
+
+    async def test_updates_share_state(self):
+        """
+        Test that async updates change the shared MockDocker state
+        """
+        client = AsyncMockDocker(self.mock_client).DockerClient(base_url=self.base_url)
+        node = await client.nodes.get(self.nodes[0]['attrs']['ID'])
+        await node.update({'Availability': 'drain', 'Role': 'manager', 'Name': 'async', 'Labels': {}})
+        await client.swarm.update(name='async-swarm')
+
+        sync_client = self.mock_client.DockerClient(base_url=self.base_url)
+        self.assertEqual(sync_client.nodes.get('async').id, self.nodes[0]['attrs']['ID'])
+        self.assertEqual(sync_client.swarm.attrs['Spec']['Name'], 'async-swarm')
+        with self.assertRaises(APIError):
+            await client.nodes.get('missing-node')
+
+    async def test_concurrent_calls_with_latency(self):
+        """
+        Test that simulated latency runs concurrently on the event loop
+        """
+        aio = AsyncMockDocker(self.mock_client, latency=0.05)
+        client = aio.DockerClient(base_url=self.base_url)
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        results = await asyncio.gather(*(client.nodes.list() for _ in range(100)))
+        self.assertLess(loop.time() - start, 1)
+        self.assertEqual(len(results), 100)
+
+        delays = iter([0.02, 0.01])
+        aio.latency = lambda: next(delays)
+        await client.nodes.get(self.nodes[0]['attrs']['ID'])
+        await client.nodes.list()
+        with self.assertRaises(StopIteration):
+            next(delays)
+
+    async def test_clock_latency_does_not_block(self):
+        """
+        Test that the latency of the MockDocker clock is awaited, not slept on the event loop
+        """
+        self.mock_client._clock.set_latency(0.05)
+        client = AsyncMockDocker(self.mock_client).DockerClient(base_url=self.base_url)
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        results = await asyncio.gather(*(client.nodes.list() for _ in range(20)))
+        self.assertLess(loop.time() - start, 0.5)
+        self.assertEqual(len(results), 20)
+
+    async def test_fault_latency_does_not_block(self):
+        """
+        Test that the latency of fault rules is awaited and their errors still raised
+        """
+        self.mock_client.faults.add('nodes.list', error=None, latency=0.05)
+        client = AsyncMockDocker(self.mock_client).DockerClient(base_url=self.base_url)
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        await asyncio.gather(*(client.nodes.list() for _ in range(20)))
+        self.assertLess(loop.time() - start, 0.5)
+
+        self.mock_client.faults.add('nodes.get', times=1, latency=0.05, message='slow failure')
+        start = loop.time()
+        with self.assertRaises(APIError):
+            await client.nodes.get(self.nodes[0]['attrs']['ID'])
+        self.assertGreaterEqual(loop.time() - start, 0.05)
+        await client.nodes.get(self.nodes[0]['attrs']['ID'])
+
+    async def test_virtual_clock_latency(self):
+        """
+        Test that concurrent async calls wait out their latency together on a
+        VirtualClock, without sleeping
+        """
+        clock = VirtualClock(start=0)
+        clock.set_latency(5)
+        mock_client = MockDocker(client_dict=self.client_dict, clock=clock)
+        client = AsyncMockDocker(mock_client, latency=1).DockerClient(base_url=self.base_url)
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        await asyncio.gather(*(client.nodes.list() for _ in range(10)))
+        self.assertLess(loop.time() - start, 1)
+        self.assertEqual(clock.now(), 6)
+
+        # Sequential calls still add up, a shorter wait finishes first
+        await client.nodes.list()
+        self.assertEqual(clock.now(), 12)
+        clock.set_latency(None)
+        finished = []
+
+        async def call(delay):
+            await clock.async_sleep(delay)
+            finished.append((delay, clock.now()))
+
+        await asyncio.gather(call(3), call(1))
+        self.assertEqual(finished, [(1, 13), (3, 15)])
+
+
+class TestVirtualClock(unittest.TestCase):
+    """
+    Tests for MockDocker with a clock.VirtualClock
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        self.clock = VirtualClock(start=0, seed=1)
+        self.mock_client = MockDocker(client_dict=self.client_dict, clock=self.clock)
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        self.node_dict = [node for node in self.client_dict['nodes']
+                          if node['swarm'] == swarm_id and node['state'] == 'success'][0]
+        self.base_url = f"tcp://{self.node_dict['attrs']['Status']['Addr']}:2375"
+
+    def test_timestamps_follow_clock(self):
+        """
+        Test that updates are stamped with the virtual time
+        """
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+        node = client.nodes.get(self.node_dict['attrs']['ID'])
+        node.update({'Availability': 'active', 'Role': 'manager', 'Name': 'clock', 'Labels': {}})
+        self.assertEqual(node.attrs['UpdatedAt'], '1970-01-01T00:00:00.000000Z')
+
+        self.clock.advance(90.5)
+        client.swarm.update(name='clock')
+        self.assertEqual(client.swarm.attrs['UpdatedAt'], '1970-01-01T00:01:30.500000Z')
+
+    def test_clock_is_abstract(self):
+        """
+        Test that a Clock must implement now() and sleep()
+        """
+        with self.assertRaises(TypeError):
+            Clock()
+
+    def test_latency_per_endpoint(self):
+        """
+        Test that API calls advance the clock by the latency of their endpoint
+        """
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+        self.clock.set_latency(0.25)
+        client.nodes.list()
+        self.assertEqual(self.clock.now(), 0.25)
+
+        self.clock.set_latency(uniform(1, 2), endpoint=parse_base_url(self.base_url))
+        client.nodes.get(self.node_dict['attrs']['ID'])
+        self.assertTrue(1.25 <= self.clock.now() <= 2.25)
+
+        other = [node for node in self.client_dict['nodes'] if node['swarm'] is None][0]
+        start = self.clock.now()
+        self.mock_client.DockerClient(base_url=f"tcp://{other['attrs']['Status']['Addr']}:2375").swarm.get_unlock_key()
+        self.assertEqual(self.clock.now(), start + 0.25)
+
+    def test_heartbeat_transitions(self):
+        """
+        Test that a node is marked down after missing heartbeats and ready after it resumes
+        """
+        node_id = self.node_dict['attrs']['ID']
+        period = self.mock_client._swarm_registry.get(self.node_dict['swarm'])['attrs']['Spec']['Dispatcher']['HeartbeatPeriod'] / 1e9
+        version = self.node_dict['attrs']['Version']['Index']
+        client = self.mock_client.DockerClient(base_url=self.base_url)
+
+        self.mock_client.stop_heartbeat(node_id)
+        self.clock.advance(period * 3 - 0.001)
+        self.assertEqual(client.nodes.get(node_id).attrs['Status']['State'], 'ready')
+        self.clock.advance(0.001)
+        node = client.nodes.get(node_id)
+        self.assertEqual(node.attrs['Status']['State'], 'down')
+        self.assertEqual(node.version, version + 1)
+        self.assertEqual(node.attrs['UpdatedAt'], self.clock.timestamp())
+
+        self.mock_client.resume_heartbeat(node_id)
+        self.clock.advance(period / 2)
+        self.assertEqual(client.nodes.get(node_id).attrs['Status']['State'], 'down')
+        self.clock.advance(period / 2)
+        self.assertEqual(client.nodes.get(node_id).attrs['Status']['State'], 'ready')
+
+    def test_resume_cancels_pending_down(self):
+        """
+        Test that resuming before the grace period ends keeps the node ready
+        """
+        node_id = self.node_dict['attrs']['ID']
+        self.mock_client.stop_heartbeat(node_id)
+        self.clock.advance(1)
+        self.mock_client.resume_heartbeat(node_id)
+        self.clock.advance(3600)
+        self.assertEqual(self.mock_client._node_registry.get(node_id)['attrs']['Status']['State'], 'ready')
+        self.assertEqual(self.mock_client._node_registry.get(node_id)['attrs']['Version']['Index'],
+                         self.node_dict['attrs']['Version']['Index'])
+
+    def test_heartbeats_need_virtual_clock(self):
+        """
+        Test that heartbeats cannot be simulated on the system clock
+        """
+        mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict))
+        with self.assertRaises(RuntimeError):
+            mock_client.stop_heartbeat(self.node_dict['attrs']['ID'])
+
+
+class TestFaultInjection(unittest.TestCase):
+    """
+    Tests for fault rules added to MockDocker.faults
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        self.clock = VirtualClock(start=0)
+        self.mock_client = MockDocker(client_dict=self.client_dict, clock=self.clock, faults=FaultInjector(seed=7))
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        self.nodes = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm_id]
+        self.swarm_id = swarm_id
+        self.client = self.mock_client.DockerClient(base_url=f"tcp://{self.nodes[0]['attrs']['Status']['Addr']}:2375")
+        self.node_spec = {'Availability': 'active', 'Role': 'manager', 'Name': 'faulty', 'Labels': {}}
+
+    def test_fail_n_times(self):
+        """
+        Test that a rule with times fails that many calls then stops
+        """
+        node = self.client.nodes.get(self.nodes[0]['attrs']['ID'])
+        self.mock_client.faults.add('node.update', times=2)
+        for _ in range(2):
+            with self.assertRaises(APIError):
+                node.update(self.node_spec)
+        self.assertTrue(node.update(self.node_spec))
+        self.assertEqual(len(self.mock_client.faults), 0)
+
+    def test_target_and_error_type(self):
+        """
+        Test that a rule for one object does not affect others and raises the chosen error
+        """
+        self.mock_client.faults.add('node.update', target=self.nodes[1]['attrs']['ID'],
+                                    error=NotFound, message='gone')
+        self.client.nodes.get(self.nodes[0]['attrs']['ID']).update(self.node_spec)
+        with self.assertRaises(NotFound) as raised:
+            self.client.nodes.get(self.nodes[1]['attrs']['ID']).update(self.node_spec)
+        self.assertIn('gone', str(raised.exception))
+
+        self.mock_client.faults.add('swarm.update', target=self.swarm_id, error=InvalidArgument('bad'))
+        with self.assertRaises(InvalidArgument):
+            self.client.swarm.update(name='faulty')
+
+    def test_probability_is_seeded(self):
+        """
+        Test that probabilistic rules fail the same calls for the same seed
+        """
+        def failures(seed):
+            mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict), faults=FaultInjector(seed=seed))
+            mock_client.faults.add('nodes.list', probability=0.3)
+            client = mock_client.DockerClient(base_url=f"tcp://{self.nodes[0]['attrs']['Status']['Addr']}:2375")
+            failed = []
+            for idx in range(200):
+                try:
+                    client.nodes.list()
+                except APIError:
+                    failed.append(idx)
+            return failed
+
+        self.assertEqual(failures(3), failures(3))
+        self.assertTrue(30 < len(failures(3)) < 90)
+
+    def test_latency_spike(self):
+        """
+        Test that a rule without an error only adds latency
+        """
+        rule = self.mock_client.faults.add('nodes.get', error=None, latency=30)
+        self.client.nodes.get(self.nodes[0]['attrs']['ID'])
+        self.assertEqual(self.clock.now(), 30)
+        self.mock_client.faults.remove(rule)
+        self.client.nodes.get(self.nodes[0]['attrs']['ID'])
+        self.assertEqual(self.clock.now(), 30)
+
+    def test_forks_copy_rules(self):
+        """
+        Test that a fork starts with a copy of the rules
+        """
+        self.mock_client.faults.add('nodes.list', times=1)
+        fork = self.mock_client.fork()
+        fork_client = fork.DockerClient(base_url=f"tcp://{self.nodes[0]['attrs']['Status']['Addr']}:2375")
+        with self.assertRaises(APIError):
+            fork_client.nodes.list()
+        fork_client.nodes.list()
+        with self.assertRaises(APIError):
+            self.client.nodes.list()
+
+
+class TestTokenService(unittest.TestCase):
+    """
+    Tests for the TokenService used by Swarm.init() and token rotation
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        self.no_swarm = [node for node in self.client_dict['nodes'] if node['swarm'] is None][0]
+        self.base_url = f"tcp://{self.no_swarm['attrs']['Status']['Addr']}:2375"
+
+    def _init_swarm(self, tokens):
+        mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict), tokens=tokens)
+        client = mock_client.DockerClient(base_url=self.base_url)
+        client.swarm.init()
+        client.swarm.update(rotate_worker_token=True, rotate_manager_unlock_key=True)
+        return client.swarm
+
+    def test_seeded_tokens_repeat(self):
+        """
+        Test that the same seed produces the same swarm id, tokens and unlock key
+        """
+        first = self._init_swarm(TokenService(seed=42))
+        second = self._init_swarm(TokenService(seed=42))
+        other = self._init_swarm(TokenService(seed=43))
+
+        self.assertEqual(first._swarm_id, second._swarm_id)
+        self.assertEqual(first.attrs['JoinTokens'], second.attrs['JoinTokens'])
+        self.assertEqual(first.get_unlock_key(), second.get_unlock_key())
+        self.assertNotEqual(first.attrs['JoinTokens'], other.attrs['JoinTokens'])
+
+    def test_copies(self):
+        """
+        Test that seeded copies continue the same tokens and unseeded forks get their own
+        """
+        seeded = TokenService(seed=7)
+        seeded.token()
+        self.assertEqual(seeded.copy().token(), seeded.copy().token())
+
+        unseeded = TokenService()
+        self.assertEqual(unseeded._alphanumeric._chars, '')
+        unseeded.token()
+        self.assertNotEqual(unseeded.copy().token(), unseeded.copy().token())
+
+        template = MockDocker(client_dict=copy.deepcopy(self.client_dict))
+        swarms = []
+        for fork in (template.fork(), template.fork()):
+            client = fork.DockerClient(base_url=self.base_url)
+            client.swarm.init()
+            swarms.append(client.swarm)
+        self.assertNotEqual(swarms[0]._swarm_id, swarms[1]._swarm_id)
+        self.assertNotEqual(swarms[0].attrs['JoinTokens'], swarms[1].attrs['JoinTokens'])
+
+    def test_default_token_format(self):
+        """
+        Test that tokens keep their alphanumeric format and lengths by default
+        """
+        tokens = TokenService(seed=1, pool_size=64)
+        values = [tokens.token() for _ in range(100)]
+        self.assertTrue(all(len(value) == 32 and value.isalnum() for value in values))
+        self.assertEqual(len(set(values)), 100)
+        self.assertEqual(len(tokens.swarm_id()), 16)
+        self.assertEqual(len(tokens.unlock_key()), 64)
+
+    def test_docker_token_format(self):
+        """
+        Test Docker formatted join tokens keep the CA digest of the swarm on rotation
+        """
+        swarm = self._init_swarm(TokenService(seed=5, docker_format=True))
+        worker = swarm.attrs['JoinTokens']['Worker']
+        manager = swarm.attrs['JoinTokens']['Manager']
+
+        self.assertRegex(worker, r'^SWMTKN-1-[0-9a-z]{50}-[0-9a-z]{25}$')
+        self.assertRegex(manager, r'^SWMTKN-1-[0-9a-z]{50}-[0-9a-z]{25}$')
+        self.assertEqual(worker.split('-')[2], manager.split('-')[2])
+        self.assertNotEqual(worker, manager)
+        self.assertRegex(swarm.get_unlock_key()['UnlockKey'], r'^SWMKEY-1-[A-Za-z0-9+/]{43}$')
+        self.assertRegex(swarm._swarm_id, r'^[0-9a-z]{25}$')
+
+
+class TestStreamValidation(unittest.TestCase):
+    """
+    Tests for validating client_dict json without loading the whole file
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        # Duplicate swarm id, missing state, duplicate node address and unknown swarm
+        self.client_dict['swarms'].append(copy.deepcopy(self.client_dict['swarms'][0]))
+        self.client_dict['swarms'].append({'id': 'no_state_swarm'})
+        self.client_dict['nodes'].append(dict(copy.deepcopy(self.client_dict['nodes'][0]), id='duplicate_addr_node'))
+        self.client_dict['nodes'].append({'id': 'orphan_node', 'swarm': 'missing_swarm'})
+
+    def _stream(self, client_dict, chunk_size):
+        results = stream_validate(io.StringIO(json.dumps(client_dict, indent=2)), chunk_size=chunk_size)
+        problems = []
+        while True:
+            try:
+                problems.append(next(results))
+            except StopIteration as done:
+                return problems, done.value
+
+    def _expected(self):
+        expected = [('swarms', key, 'errors', error)
+                    for key, errors in validate_swarm_data(self.client_dict['swarms']).items() for error in errors]
+        for key, result in validate_node_data(self.client_dict['nodes'], self.client_dict['swarms']).items():
+            for level in ('errors', 'warnings'):
+                expected.extend(('nodes', key, level, message) for message in result[level])
+        return expected
+
+    def test_stream_matches_validate(self):
+        """
+        Test that streaming finds the same problems as validate_swarm_data and validate_node_data
+        """
+        for chunk_size in (1, 13, 1 << 16):
+            problems, counts = self._stream(self.client_dict, chunk_size)
+            self.assertEqual(problems, self._expected())
+            self.assertEqual(counts, {'swarms': len(self.client_dict['swarms']), 'nodes': len(self.client_dict['nodes'])})
+
+    def test_stream_nodes_before_swarms(self):
+        """
+        Test that swarm warnings wait for the swarms when the nodes come first in the file
+        """
+        reordered = {'nodes': self.client_dict['nodes'], 'other': [1, 2.5, None], 'swarms': self.client_dict['swarms']}
+        problems, _ = self._stream(reordered, 7)
+
+        self.assertCountEqual(problems, self._expected())
+        self.assertEqual([problem[1] for problem in problems if problem[2] == 'warnings'], ['node_7_no_id'])
+
+    def test_stream_null_sections(self):
+        """
+        Test that null swarms or nodes are treated as missing sections
+        """
+        problems, counts = self._stream({'swarms': None, 'nodes': self.client_dict['nodes']}, 5)
+        expected = [('nodes', key, level, message)
+                    for key, result in validate_node_data(self.client_dict['nodes']).items()
+                    for level in ('errors', 'warnings') for message in result[level]]
+        self.assertEqual(problems, expected)
+        self.assertEqual(counts, {'nodes': len(self.client_dict['nodes'])})
+
+        problems, counts = self._stream({'swarms': self.client_dict['swarms'], 'nodes': None}, 5)
+        self.assertEqual(counts, {'swarms': len(self.client_dict['swarms'])})
+        self.assertTrue(all(problem[0] == 'swarms' for problem in problems))
+
+    def test_stream_invalid_json(self):
+        """
+        Test that malformed json raises a JSONDecodeError
+        """
+        results = stream_validate(io.StringIO('{"swarms": [{"id": 1} {"id": 2}]}'), chunk_size=4)
+        with self.assertRaises(json.JSONDecodeError):
+            list(results)
+
+
+class TestParallelValidation(unittest.TestCase):
+    """
+    Tests for validating with a pool of processes
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        self.client_dict['swarms'].append(copy.deepcopy(self.client_dict['swarms'][0]))
+        self.client_dict['swarms'].append({'state': 'unknown'})
+        duplicate = copy.deepcopy(self.client_dict['nodes'][0])
+        duplicate.update(id='duplicate_addr_node', state=None)
+        self.client_dict['nodes'].append(duplicate)
+        self.client_dict['nodes'].append({'id': 'orphan_node', 'swarm': 'missing_swarm'})
+
+    def test_parallel_matches_serial(self):
+        """
+        Test that validating with several jobs gives the same errors, in the same order, as one job
+        """
+        swarms = self.client_dict['swarms']
+        nodes = self.client_dict['nodes']
+        for jobs in (2, 3):
+            self.assertEqual(json.dumps(validate_swarm_data(swarms, jobs=jobs)), json.dumps(validate_swarm_data(swarms)))
+            self.assertEqual(json.dumps(validate_node_data(nodes, swarms, jobs=jobs)), json.dumps(validate_node_data(nodes, swarms)))
+
+        errors = validate_node_data(nodes, swarms, jobs=2)['node_6_duplicate_id']['errors']
+        self.assertEqual([list(error)[0] for error in errors], ['state_error', 'attrs_ID_error', 'IP_addr_error'])
+
+    def test_workers_do_not_receive_pickled_nodes(self):
+        """
+        Test that forked workers are sent chunk bounds, not the nodes
+        """
+        nodes = self.client_dict['nodes']
+        original = concurrent.futures.ProcessPoolExecutor.map
+        with unittest.mock.patch.object(concurrent.futures.ProcessPoolExecutor, 'map', autospec=True,
+                                        side_effect=original) as pool_map:
+            results = _map_chunks(_node_chunk, nodes, 2)
+
+        _, func, funcs, starts, stops = pool_map.call_args[0]
+        self.assertEqual(func.__name__, '_shared_chunk')
+        self.assertEqual(set(funcs), {_node_chunk})
+        self.assertTrue(all(isinstance(bound, int) for bound in list(starts) + list(stops)))
+        self.assertEqual(results, [_node_chunk(start, nodes[start:stop]) for start, stop in zip(starts, stops)])
+
+
+class TestNodeValidation(unittest.TestCase):
+    """
+    Tests for validate_node_data and node validation in MockDocker
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+
+    def test_results_keyed_by_node_id(self):
+        """
+        Test that every node gets its own result, keyed by ID or by index without a unique ID
+        """
+        nodes = self.client_dict['nodes'] + [copy.deepcopy(self.client_dict['nodes'][0]), {'state': 'success', 'swarm': 'missing_swarm'}]
+        response = validate_node_data(nodes, self.client_dict['swarms'])
+
+        self.assertEqual(list(response), [node['attrs']['ID'] for node in self.client_dict['nodes']] + ['node_6_duplicate_id', 'node_7_no_id'])
+        self.assertEqual(response['node_6_duplicate_id']['errors'][0],
+                         {'attrs_ID_error': 'Node attrs ID must be unique, duplicate found at index: 0 and 6'})
+        self.assertEqual(response['node_7_no_id']['warnings'], [{'swarm_warning': 'No swarm found with id missing_swarm'}])
+
+    def test_mock_docker_validates_nodes(self):
+        """
+        Test that MockDocker rejects invalid nodes unless validation is turned off
+        """
+        self.client_dict['nodes'][1]['state'] = 'unknown'
+        with self.assertRaises(Exception) as error:
+            MockDocker(client_dict=copy.deepcopy(self.client_dict))
+        self.assertIn('Node state must be success or fail', str(error.exception))
+
+        mock_client = MockDocker(client_dict=self.client_dict, validate=False)
+        self.assertEqual(len(mock_client._client_dict['nodes']), 6)
+
+
+class TestSchema(unittest.TestCase):
+    """
+    Tests for compiling declarative schemas into validator functions
+    """
+    SCHEMA = (
+        Unique('name', 'name'),
+        Field('name', 'name_error', 'Name is required'),
+        OneOf('mode', ('fast', 'slow'), 'mode_error', 'Mode must be fast or slow'),
+        RequiredIf('key', 'mode', 'slow', 'key_error', 'Slow mode requires a key'),
+        Field('spec', 'spec_error', 'Spec is required', truthy=True, fields=(
+            Unique('port', ('net', 'port'), when='host'),
+            Field('host', 'spec_host_error', 'Spec host is required'),
+        )),
+    )
+
+    def test_compiled_validator(self):
+        """
+        Test that a compiled schema reports errors in rule order and returns the unique values
+        """
+        validate = compile_schema(self.SCHEMA)
+
+        self.assertEqual(validate({'name': 'a', 'mode': 'fast', 'spec': {'host': 'h', 'net': {'port': 80}}}),
+                         ([], ((0, 'a'), (0, 80))))
+        self.assertEqual(validate({'mode': 'slow', 'spec': {}}),
+                         ([{'name_error': 'Name is required'}, {'key_error': 'Slow mode requires a key'},
+                           {'spec_error': 'Spec is required'}], ((0, None), (0, None))))
+        errors, uniques = validate({'name': 'b', 'mode': 'other', 'spec': {'net': {'port': 81}}})
+        self.assertEqual(errors, [{'mode_error': 'Mode must be fast or slow'}, {'spec_host_error': 'Spec host is required'}])
+        # No host, so the port is not checked for uniqueness
+        self.assertEqual(uniques, ((0, 'b'), (1, None)))
+
+    def test_required_if_not_none(self):
+        """
+        Test that a RequiredIf on NOT_NONE applies whenever its condition is set
+        """
+        validate = compile_schema((RequiredIf(('spec', 'role'), 'group', NOT_NONE, 'role_error', 'Grouped entries need a role'),))
+
+        self.assertEqual(validate({'group': None})[0], [])
+        self.assertEqual(validate({'group': 'g', 'spec': {'role': 'r'}})[0], [])
+        self.assertEqual(validate({'group': 'g', 'spec': {}})[0], [{'role_error': 'Grouped entries need a role'}])
+        self.assertEqual(validate({'group': 0})[0], [{'role_error': 'Grouped entries need a role'}])
+
+    def test_compiled_once(self):
+        """
+        Test that compiled validators are cached and keep their generated source
+        """
+        self.assertIs(compile_schema(SWARM_SCHEMA, 'validate_swarm'), compile_schema(SWARM_SCHEMA, 'validate_swarm'))
+        self.assertIn("'Swarm attrs Spec Name is required'", compile_schema(SWARM_SCHEMA, 'validate_swarm').source)
+
+
+class TestStrictMode(unittest.TestCase):
+    """
+    Tests for validating the entries written by API calls in strict mode
+    """
+    def setUp(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'mockClient.json'), 'r')
+        self.client_dict = json.load(f)
+        f.close()
+        swarm_id = [swarm['id'] for swarm in self.client_dict['swarms'] if swarm['state'] == 'success'][0]
+        self.node = [node for node in self.client_dict['nodes'] if node['swarm'] == swarm_id][0]
+        self.swarm_id = swarm_id
+
+    def _client(self, strict):
+        mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict), strict=strict)
+        return mock_client, mock_client.DockerClient(base_url=f"tcp://{self.node['attrs']['Status']['Addr']}:2375")
+
+    def test_only_written_entries_validated(self):
+        """
+        Test that strict mode validates the entries an API call wrote and caches their results
+        """
+        mock_client, client = self._client(strict=True)
+        node_id = self.node['attrs']['ID']
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'manager'})
+
+        self.assertEqual(mock_client._entry_errors, {('node', node_id): []})
+        self.assertEqual(mock_client.validation_errors(), {'nodes': {}, 'swarms': {}})
+
+    def test_invalid_write_raises(self):
+        """
+        Test that a write leaving a swarm invalid raises in strict mode only
+        """
+        _, client = self._client(strict=False)
+        client.swarm.update(spec_patch={'Name': None})
+
+        mock_client, client = self._client(strict=True)
+        with self.assertRaises(Exception) as error:
+            client.swarm.update(spec_patch={'Name': None})
+        self.assertIn('attrs_Spec_Name_error', str(error.exception))
+        self.assertEqual(mock_client.validation_errors()['swarms'],
+                         {self.swarm_id: [{'attrs_Spec_Name_error': 'Swarm attrs Spec Name is required'}]})
+
+        # Writes to other entries are not held up by the invalid swarm
+        client.nodes.get(self.node['attrs']['ID']).update({'Availability': 'pause', 'Role': 'manager'})
+
+    def test_partial_node_update_raises(self):
+        """
+        Test that an update leaving a swarm node without a role or availability raises in strict mode
+        """
+        mock_client, client = self._client(strict=True)
+        node_id = self.node['attrs']['ID']
+        with self.assertRaises(Exception) as error:
+            client.nodes.get(node_id).update({'Availability': 'drain'})
+        self.assertIn('attrs_Spec_Role_error', str(error.exception))
+        self.assertEqual(mock_client.validation_errors()['nodes'],
+                         {node_id: [{'attrs_Spec_Role_error': 'Node attrs Spec Role is required for nodes in a swarm'}]})
+
+        client.nodes.get(node_id).update({'Availability': 'drain', 'Role': 'worker'})
+        self.assertEqual(mock_client.validation_errors()['nodes'], {})
+        with self.assertRaises(Exception) as error:
+            client.nodes.get(node_id).update({'Role': 'worker'})
+        self.assertIn('attrs_Spec_Availability_error', str(error.exception))
+
+    def test_leave_then_init(self):
+        """
+        Test that a worker that leaves its swarm can init a new one in strict mode
+        """
+        worker = [node for node in self.client_dict['nodes']
+                  if node['swarm'] == self.swarm_id and node['attrs']['Spec']['Role'] == 'worker'][0]
+        mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict), strict=True)
+        client = mock_client.DockerClient(base_url=f"tcp://{worker['attrs']['Status']['Addr']}:2375")
+        client.swarm.leave()
+        swarm_id = client.swarm.init(name='y')
+
+        node = mock_client._node_registry.get(worker['attrs']['ID'])
+        self.assertEqual(node['swarm'], swarm_id)
+        self.assertEqual(node['attrs']['Spec']['Role'], 'manager')
+        self.assertEqual(mock_client.validation_errors(), {'nodes': {}, 'swarms': {}})
+
+    def test_new_swarm_validated(self):
+        """
+        Test that a swarm created by init is validated in strict mode
+        """
+        no_swarm = [node for node in self.client_dict['nodes'] if node['swarm'] is None][0]
+        mock_client = MockDocker(client_dict=copy.deepcopy(self.client_dict), strict=True)
+        client = mock_client.DockerClient(base_url=f"tcp://{no_swarm['attrs']['Status']['Addr']}:2375")
+        swarm_id = client.swarm.init(name='strict_swarm')
+
+        self.assertEqual(mock_client._entry_errors[('swarm', swarm_id)], [])
+        self.assertEqual(mock_client._entry_errors[('node', no_swarm['attrs']['ID'])], [])
@@ -0,0 +1,131 @@
+"""
+Token generation for swarm ids, join tokens and unlock keys. Tokens are cut
+from pools of characters decoded in bulk from random bytes of a seedable
+generator.
+"""
+import base64
+import random
+import string
+import threading
+
+
+class _CharacterPool:
+    """
+    Characters of an alphabet decoded from random bytes. Bytes that would
+    make some characters more likely than others are dropped, which keeps
+    every character equally likely.
+    """
+
+    def __init__(self, alphabet, rng, size):
+        usable = 256 - 256 % len(alphabet)
+        self._table = bytes(ord(alphabet[byte % len(alphabet)]) for byte in range(usable)) + bytes(256 - usable)
+        self._rejected = bytes(range(usable, 256))
+        self._rng = rng
+        self._size = size
+        self._chars = ''
+        self._pos = 0
+
+    def copy(self, rng, keep=True):
+        """
+        Return a pool drawing from rng, with the same remaining characters
+        when keep is True and empty otherwise
+        """
+        clone = _CharacterPool.__new__(_CharacterPool)
+        clone.__dict__.update(self.__dict__)
+        clone._rng = rng
+        if not keep:
+            clone._chars = ''
+            clone._pos = 0
+        return clone
+
+    def take(self, length):
+        if self._pos + length > len(self._chars):
+            self._refill(length)
+        token = self._chars[self._pos:self._pos + length]
+        self._pos += length
+        return token
+
+    def _refill(self, length):
+        chars = [self._chars[self._pos:]]
+        available = len(chars[0])
+        while available < max(length, self._size):
+            decoded = self._rng.randbytes(self._size).translate(self._table, self._rejected).decode('ascii')
+            chars.append(decoded)
+            available += len(decoded)
+        self._chars = ''.join(chars)
+        self._pos = 0
+
+
+class TokenService:
+    """
+    Generates the tokens of a MockDocker. Pass a seed for reproducible runs.
+    With docker_format the ids and tokens look like Docker's: 25 character
+    base 36 swarm ids, SWMTKN-1-<CA digest>-<secret> join tokens and
+    SWMKEY-1-<key> unlock keys. Otherwise they are random alphanumeric strings.
+    """
+
+    JOIN_TOKEN_PREFIX = 'SWMTKN-1-'
+    UNLOCK_KEY_PREFIX = 'SWMKEY-1-'
+
+    def __init__(self, seed=None, docker_format=False, pool_size=1 << 10):
+        self.seed = seed
+        self.docker_format = docker_format
+        self.pool_size = pool_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Filled on the first take(), every MockDocker builds a service and
+        # most never generate a token
+        self._alphanumeric = _CharacterPool(string.ascii_letters + string.digits, self._rng, pool_size)
+        self._base36 = _CharacterPool(string.digits + string.ascii_lowercase, self._rng, pool_size)
+
+    def token(self, length=32):
+        """
+        Return a random alphanumeric token
+        """
+        with self._lock:
+            return self._alphanumeric.take(length)
+
+    def swarm_id(self):
+        if self.docker_format:
+            with self._lock:
+                return self._base36.take(25)
+        return self.token(16)
+
+    def join_token(self, previous=None):
+        """
+        Return a new join token. Docker join tokens of a swarm share the digest
+        of its root CA, it is kept from previous when that is a Docker token.
+        """
+        if not self.docker_format:
+            return self.token(32)
+        with self._lock:
+            if previous and previous.startswith(self.JOIN_TOKEN_PREFIX):
+                digest = previous[len(self.JOIN_TOKEN_PREFIX):].split('-')[0]
+            else:
+                digest = self._base36.take(50)
+            return f"{self.JOIN_TOKEN_PREFIX}{digest}-{self._base36.take(25)}"
+
+    def unlock_key(self):
+        if not self.docker_format:
+            return self.token(64)
+        with self._lock:
+            key = base64.b64encode(self._rng.randbytes(32)).rstrip(b'=').decode('ascii')
+        return f"{self.UNLOCK_KEY_PREFIX}{key}"
+
+    def copy(self):
+        """
+        Return a service that continues from the same random state when it is
+        seeded. Unseeded copies are reseeded from the system so forks of the
+        same instance do not generate the same tokens.
+        """
+        clone = TokenService.__new__(TokenService)
+        clone.__dict__.update(self.__dict__)
+        clone._rng = random.Random()
+        clone._lock = threading.Lock()
+        seeded = self.seed is not None
+        with self._lock:
+            if seeded:
+                clone._rng.setstate(self._rng.getstate())
+            clone._alphanumeric = self._alphanumeric.copy(clone._rng, keep=seeded)
+            clone._base36 = self._base36.copy(clone._rng, keep=seeded)
+        return clone
@@ -1,70 +1,195 @@
 """
 Validation functions to validate teh data used to create MockDocker instances
 """
+import concurrent.futures
 import json
+import multiprocessing
 
+try:
+    from .schema import Field, OneOf, RequiredIf, Unique, NOT_NONE, compile_schema
+except ImportError:
+    from schema import Field, OneOf, RequiredIf, Unique, NOT_NONE, compile_schema
 
-def validate_swarm_data(swarm_dict):
+
+# Rules for swarm and node definitions, see schema.py
+SWARM_SCHEMA = (
+    Unique('id', 'id'),
+    Field('id', 'id_error', 'Swarm ID is required'),
+    Field('state', 'state_error', 'Swarm state is required'),
+    OneOf('state', ('success', 'locked', 'fail'), 'state_error', 'Swarm state must be success or locked'),
+    RequiredIf('UnlockKey', 'state', 'locked', 'UnlockKey_error', 'Swarm status is locked, UnlockKey is required'),
+    Field('attrs', 'attrs_error', 'Swarm attrs is required', fields=(
+        Field('ID', 'attrs_ID_error', 'Swarm attrs ID is required'),
+        Field('Spec', 'attrs_Spec_error', 'Swarm attrs Spec is required', fields=(
+            Field('Name', 'attrs_Spec_Name_error', 'Swarm attrs Spec Name is required'),
+        )),
+        Field('JoinTokens', 'attrs_JoinTokens_error', 'Swarm attrs JoinTokens is required', fields=(
+            Field('Worker', 'attrs_JoinTokens_Worker_error', 'Swarm attrs JoinTokens Worker is required'),
+            Field('Manager', 'attrs_JoinTokens_Manager_error', 'Swarm attrs JoinTokens Manager is required'),
+        )),
+    )),
+)
+
+NODE_SCHEMA = (
+    Field('state', 'state_error', 'Node state is required'),
+    OneOf('state', ('success', 'fail'), 'state_error', 'Node state must be success or fail'),
+    Field('attrs', 'attrs_error', 'Node attrs is required', truthy=True, fields=(
+        Field('ID', 'attrs_ID_error', 'Node attrs ID is required'),
+        Unique('id', 'ID'),
+        # Addresses of nodes without an ID are not checked
+        Unique('addr', ('Status', 'Addr'), when='ID'),
+        Field('Status', 'attrs_Status_error', 'Node attrs Status is required', fields=(
+            Field('Addr', 'IP_addr_error', 'Node IP Address is required'),
+        )),
+    )),
+)
+
+# Rules for the nodes of a running MockDocker, on top of NODE_SCHEMA. API
+# calls write the spec fields, a node in a swarm needs a valid role and
+# availability.
+NODE_ENTRY_SCHEMA = NODE_SCHEMA + (
+    RequiredIf(('attrs', 'Spec', 'Role'), 'swarm', NOT_NONE, 'attrs_Spec_Role_error',
+               'Node attrs Spec Role is required for nodes in a swarm'),
+    OneOf(('attrs', 'Spec', 'Role'), ('manager', 'worker'), 'attrs_Spec_Role_error',
+          'Node attrs Spec Role must be manager or worker'),
+    RequiredIf(('attrs', 'Spec', 'Availability'), 'swarm', NOT_NONE, 'attrs_Spec_Availability_error',
+               'Node attrs Spec Availability is required for nodes in a swarm'),
+    OneOf(('attrs', 'Spec', 'Availability'), ('active', 'pause', 'drain'), 'attrs_Spec_Availability_error',
+          'Node attrs Spec Availability must be active, pause or drain'),
+)
+
+# Compiled once on import, worker processes compile their own
+_validate_swarm = compile_schema(SWARM_SCHEMA, 'validate_swarm')
+_validate_node = compile_schema(NODE_SCHEMA, 'validate_node')
+_validate_node_entry = compile_schema(NODE_ENTRY_SCHEMA, 'validate_node_entry')
+
+
+def _swarm_checks(swarm, idx):
+    """
+    The checks of one swarm definition that do not depend on other swarms,
+    returns its key and error list. The uniqueness of the id is checked by
+    _check_swarm, its error goes first in the list.
+    """
+    error_list, ((_, swarm_id),) = _validate_swarm(swarm)
+    # If No id, use a temporary key
+    swarm_key = f'swarm_{idx}_no_id' if swarm_id is None else swarm_id
+    return swarm_key, error_list
+
+
+def _check_swarm(swarm, idx, swarm_ids):
+    """
+    Validate one swarm definition, returns its key and error list. swarm_ids
+    maps the ids seen so far to their index and is updated.
+    """
+    swarm_key, error_list = _swarm_checks(swarm, idx)
+    _check_swarm_id(swarm.get('id'), idx, error_list, swarm_ids)
+    return swarm_key, error_list
+
+
+def _check_swarm_id(swarm_id, idx, error_list, swarm_ids):
+    if swarm_id is None:
+        return
+    # If id, add to swarm_ids dict to verify uniqueness
+    if swarm_id in swarm_ids:
+        error_list.insert(0, {'id_error': f'Swarm ID must be unique, duplicate found at index: {swarm_ids[swarm_id]} and {idx}'})
+    else:
+        # If id is not in swarm_ids, add to swarm_ids
+        swarm_ids[swarm_id] = idx
+
+
+def _swarm_chunk(start, swarms):
+    return [_swarm_checks(swarm, idx) for idx, swarm in enumerate(swarms, start)]
+
+
+def _node_chunk(start, nodes):
+    """
+    _node_checks of a chunk of nodes and their swarms, in columns with only
+    the error lists that are not empty so the result pickles compactly
+    """
+    swarm_ids, node_ids, positions, addrs, errors = [], [], [], [], {}
+    for offset, node in enumerate(nodes):
+        error_list, node_id, position, addr = _node_checks(node)
+        swarm_ids.append(node.get('swarm'))
+        node_ids.append(node_id)
+        positions.append(position)
+        addrs.append(addr)
+        if error_list:
+            errors[offset] = error_list
+    return swarm_ids, node_ids, positions, addrs, errors
+
+
+def _node_chunk_results(chunks):
     """
-    Loops through the swarm definitions and validates that data is present and correct
+    Iterate over the (swarm, error list, node ID, position, addr) of each node
+    in the results of _node_chunk
+    """
+    for swarm_ids, node_ids, positions, addrs, errors in chunks:
+        for offset, row in enumerate(zip(swarm_ids, node_ids, positions, addrs)):
+            yield row[0], errors.get(offset, []), row[1], row[2], row[3]
+
+
+# Entries being validated by _map_chunks, read by forked workers
+_shared_entries = None
+
+
+def _shared_chunk(func, start, stop):
+    return func(start, _shared_entries[start:stop])
+
+
+def _map_chunks(func, entries, jobs):
+    """
+    Call func(start, chunk) for chunks of entries in a pool of jobs processes,
+    returns the list of chunk results in order
+    """
+    global _shared_entries
+    # A few chunks per process keeps the processes busy when chunks take uneven time
+    size = max(1, -(-len(entries) // (jobs * 4)))
+    starts = range(0, len(entries), size)
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(func, starts, [entries[start:start + size] for start in starts]))
+
+    # Forked workers slice the entries from their copy of this process, pickling
+    # the entries to send them costs more than checking them
+    _shared_entries = entries
+    try:
+        context = multiprocessing.get_context('fork')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+            return list(executor.map(_shared_chunk, [func] * len(starts), starts, [start + size for start in starts]))
+    finally:
+        _shared_entries = None
+
+
+def _parallel_swarm_data(swarm_dict, jobs):
+    """
+    validate_swarm_data with the independent checks run in a process pool.
+    The id uniqueness checks are done here in order, so the result matches a
+    serial run.
     """
     response = {}
     swarm_ids = {}
 
-    for idx, swarm in enumerate(swarm_dict):
-        error_list = []
-        swarm_key = swarm.get('id')
-        # Check for Swarm id
-        if swarm.get('id') is None:
-            # If No id, create temporary id and add id error to error list
-            swarm_key = f'swarm_{idx}_no_id'
-            error_list.append({'id_error': 'Swarm ID is required'})
-        else:
-            # If id, add to swarm_ids dict to verify uniqueness
-            if swarm['id'] in swarm_ids.keys():
-                error_list.append({'id_error': f'Swarm ID must be unique, duplicate found at index: {swarm_ids[swarm["id"]]} and {idx}'})
-            else:
-                # If id is not in swarm_ids, add to swarm_ids
-                swarm_ids[swarm_key] = idx 
-
-        # Check swarm state is a valid option
-        if swarm.get('state') is None:
-            # If state not in swarm, add state error to error list
-            error_list.append({'state_error': 'Swarm state is required'})
-        elif swarm['state'] not in ['success', 'locked', 'fail']:
-            error_list.append({'state_error': 'Swarm state must be success or locked'})
-        # If swarm state is locked, UnlockKey must be present
-        if swarm.get('state') == 'locked' and swarm.get('UnlockKey') is None:
-            error_list.append({'UnlockKey_error': 'Swarm status is locked, UnlockKey is required'})
-
-        # check for attributes
-        if swarm.get('attrs') is None:
-            error_list.append({'attrs_error': 'Swarm attrs is required'})
-        else:
-            # Check for required attrs
-            attrs = swarm['attrs']
-            if attrs.get('ID') is None:
-                error_list.append({'attrs_ID_error': 'Swarm attrs ID is required'})
-            # Check for Spec dictionary
-            if attrs.get('Spec') is None:
-                error_list.append({'attrs_Spec_error': 'Swarm attrs Spec is required'})
-            else:
-                spec = attrs['Spec']
-                # Check for required Spec attrs
-                if spec.get('Name') is None:
-                    error_list.append({'attrs_Spec_Name_error': 'Swarm attrs Spec Name is required'})
-            
-            # Check for Work and Manager Join Tokens
-            if attrs.get('JoinTokens') is None:
-                error_list.append({'attrs_JoinTokens_error': 'Swarm attrs JoinTokens is required'})
-            else:
-                tokens = attrs['JoinTokens']
-                if tokens.get('Worker') is None:
-                    error_list.append({'attrs_JoinTokens_Worker_error': 'Swarm attrs JoinTokens Worker is required'})
-                if tokens.get('Manager') is None:
-                    error_list.append({'attrs_JoinTokens_Manager_error': 'Swarm attrs JoinTokens Manager is required'})
-                
+    results = (result for chunk in _map_chunks(_swarm_chunk, swarm_dict, jobs) for result in chunk)
+    for idx, (swarm_key, error_list) in enumerate(results):
+        _check_swarm_id(swarm_dict[idx].get('id'), idx, error_list, swarm_ids)
+        if len(error_list) > 0:
+            response[swarm_key] = error_list
 
+    return response
+
+
+def validate_swarm_data(swarm_dict, jobs=None):
+    """
+    Loops through the swarm definitions and validates that data is present and correct.
+    jobs is the number of processes to validate with, one when None.
+    """
+    if jobs is not None and jobs > 1 and len(swarm_dict) > 1:
+        return _parallel_swarm_data(swarm_dict, jobs)
+    response = {}
+    swarm_ids = {}
+
+    for idx, swarm in enumerate(swarm_dict):
+        swarm_key, error_list = _check_swarm(swarm, idx, swarm_ids)
         # Add error list to response dict
         if len(error_list) > 0:
             response[swarm_key] = error_list
@@ -72,54 +197,315 @@ def validate_swarm_data(swarm_dict):
     return response
 
 
-def validate_node_data(node_list, swarm_list=None):
+def _node_checks(node):
+    """
+    The checks of one node definition that do not depend on other nodes.
+    Returns the error list, the node ID, the position in the list where
+    _check_node_indexes puts uniqueness errors, and the address to check for
+    uniqueness (None when the node has no ID or address).
     """
-    Loops through the swarm definitions and validates that data is present and correct
+    error_list, ((position, node_id), (_, addr)) = _validate_node(node)
+    return error_list, node_id, position, addr
+
+
+def _check_node_indexes(idx, checks, node_ids, node_ips):
+    """
+    Add the ID and address uniqueness errors to the result of _node_checks,
+    returns the key of the node and its error list. node_ids maps the IDs seen
+    so far to their index and node_ips the addresses to the ID of their node,
+    both are updated. Nodes are keyed by ID, or by index when the ID is
+    missing or taken.
+    """
+    error_list, node_id, position, addr = checks
+    if node_id is None:
+        key = f'node_{idx}_no_id'
+    elif node_id in node_ids:
+        key = f'node_{idx}_duplicate_id'
+        error_list.insert(position, {'attrs_ID_error': f'Node attrs ID must be unique, duplicate found at index: {node_ids[node_id]} and {idx}'})
+        position += 1
+    else:
+        key = node_id
+        node_ids[node_id] = idx
+
+    if addr is not None:
+        if addr in node_ips:
+            error_list.insert(position, {'IP_addr_error': f"Node Address must be unique, duplicate found at index: {node_ips[addr]} and {node_id}"})
+        else:
+            node_ips[addr] = node_id
+    return key, error_list
+
+
+def _check_node(node, idx, node_ids, node_ips):
+    """
+    Validate one node definition, returns its key and error list
+    """
+    return _check_node_indexes(idx, _node_checks(node), node_ids, node_ips)
+
+
+def check_node_entry(node, addr_nodes=None):
+    """
+    Validate one node of a running MockDocker against NODE_ENTRY_SCHEMA,
+    returns its error list. addr_nodes(addr) returns the IDs of the nodes with an address, it is used
+    to check the address of the node is unique.
+    """
+    error_list, ((position, node_id), (_, addr)) = _validate_node_entry(node)
+    if addr is not None and addr_nodes is not None:
+        others = [other for other in addr_nodes(addr) if other != node_id]
+        if others:
+            error_list.insert(position, {'IP_addr_error': f"Node Address must be unique, duplicate found at index: {others[0]} and {node_id}"})
+    return error_list
+
+
+def check_swarm_entry(swarm):
+    """
+    Validate one swarm of a running MockDocker, returns its error list
+    """
+    return _swarm_checks(swarm, 0)[1]
+
+
+def _swarm_warnings(swarm_id, swarm_ids):
+    """
+    Warn when a node is assigned to a swarm not in swarm_ids, a set of the
+    swarm ids or None when there are no swarms to check against
+    """
+    if swarm_id is None or swarm_ids is None or swarm_id in swarm_ids:
+        return []
+    return [{'swarm_warning': f"No swarm found with id {swarm_id}"}]
+
+
+def validate_node_data(node_list, swarm_list=None, jobs=None):
+    """
+    Loops through the node definitions and validates that data is present and correct.
+    Results are keyed by node ID, or node_<index>_no_id and node_<index>_duplicate_id
+    for nodes without a unique ID. jobs is the number of processes to validate with,
+    one when None, the result is the same either way.
     """
     response = {}
+    node_ids = {}
     node_ips = {}
+    swarm_ids = None if swarm_list is None else {swarm.get('id') for swarm in swarm_list}
 
-    for idx, node in enumerate(node_list):
-        error_list = []
-        warning_list = []
-        # Check if node is assigned to an existing swarm
-        if node.get('swarm') is not None:
-            if swarm_list is not None:
-                for swarm in swarm_list:
-                    if node.get('swarm') == swarm.get('id'):
-                        break
-                else:
-                    warning_list.append({'swarm_warning': f"No swarm found with id {node.get('swarm')}"})
-        if node.get('state') is None:
-            error_list.append({'state_error': 'Node state is required'})
-        elif node.get('state') not in ['success', 'fail']:
-            error_list.append({'state_error': 'Node state must be success or fail'})
-        
-        attrs = node.get('attrs')
-        if not attrs:
-            error_list.append({'attrs_error': 'Node attrs is required'})
-        else:
-            if attrs.get('ID') is None:
-                error_list.append({'attrs_ID_error': 'Node attrs ID is required'})
-            
-            if attrs.get('ID') is not None and attrs.get('Status') is not None and attrs.get('Status').get('Addr') is not None:
-                if attrs['Status']['Addr'] in node_ips.keys():
-                    error_list.append({'IP_addr_error': f"Node Address must be unique, duplicate found at index: {node_ips[attrs['Status']['Addr']]} and {attrs['ID']}"})
-                else:
-                    node_ips[attrs['Status']['Addr']] = attrs.get('ID')
-            if attrs.get('Status') is None:
-                error_list.append({'attrs_Status_error': 'Node attrs Status is required'})
-            elif attrs.get('Status').get('Addr') is None:
-                error_list.append({'IP_addr_error': 'Node IP Address is required'})
-        # Check for Node id
-        response[node.get('id')] ={
+    if jobs is not None and jobs > 1 and len(node_list) > 1:
+        # Only the independent checks run in the pool, the index checks below are done in order
+        results = _node_chunk_results(_map_chunks(_node_chunk, node_list, jobs))
+    else:
+        results = ((node.get('swarm'),) + _node_checks(node) for node in node_list)
+
+    for idx, (swarm_id, *checks) in enumerate(results):
+        key, error_list = _check_node_indexes(idx, checks, node_ids, node_ips)
+        response[key] = {
             "errors": error_list,
-            "warnings": warning_list
+            "warnings": _swarm_warnings(swarm_id, swarm_ids)
         }
 
     return response
 
 
+def node_errors(node_list, swarm_list=None):
+    """
+    Return the errors of validate_node_data for the nodes that have any
+    """
+    return {key: value['errors'] for key, value in validate_node_data(node_list, swarm_list).items()
+            if len(value['errors']) > 0}
+
+
+class _JSONStream:
+    """
+    Reads a json document from a file in chunks. Values are decoded one at a
+    time with raw_decode and the buffer is refilled when a value runs past it.
+    """
+
+    _WHITESPACE = ' \t\n\r'
+
+    def __init__(self, source, chunk_size):
+        self._source = source
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, minimum):
+        if self._eof:
+            return False
+        # Drop what has been consumed so the buffer only holds the current value
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        chunk = self._source.read(max(self._chunk_size, minimum))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def peek(self):
+        """
+        Return the next character that is not whitespace, '' at the end of the file
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(0):
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def end(self):
+        """
+        Check that nothing but whitespace follows the document
+        """
+        if self.peek() != '':
+            raise json.JSONDecodeError("Extra data", self._buffer, self._pos)
+
+    def value(self):
+        """
+        Decode the next value. A value that ends with the buffer may be cut
+        short, a number for example, so it is decoded again with more input.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Double the read so a large value is not decoded once per chunk
+                if not self._fill(len(self._buffer)):
+                    raise
+                continue
+            if end < len(self._buffer) or not self._fill(len(self._buffer)):
+                self._pos = end
+                return value
+
+    def items(self):
+        """
+        Iterate over the (key, position) pairs of the object that starts next,
+        the caller reads each value before moving on
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        """
+        Iterate over the values of the array that starts next
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def stream_validate(source, chunk_size=1 << 16):
+    """
+    Validate a client_dict definition json read from the file object source
+    without loading it. Yields (section, key, level, message) as problems are
+    found, where section is 'swarms' or 'nodes', key is the entry key used by
+    validate_swarm_data and validate_node_data, level is 'errors' or
+    'warnings' and message is the error dict. Returns the number of entries
+    checked in each section found. Only the swarm ids and node IDs and
+    addresses are kept, so memory does not grow with the size of the file.
+
+    Nodes that name a swarm not seen yet are warned about once the swarms
+    have been read, since the swarms may come after the nodes in the file.
+    """
+    stream = _JSONStream(source, chunk_size)
+    swarm_ids = {}
+    node_ids = {}
+    node_ips = {}
+    swarms_read = False
+    # Swarm id -> keys of nodes waiting for the swarms to be read
+    pending = {}
+    counts = {}
+
+    for section in stream.items():
+        if section in ('swarms', 'nodes') and stream.peek() == 'n':
+            # null, the section is treated as missing like validate.py does
+            stream.value()
+        elif section == 'swarms':
+            counts['swarms'] = 0
+            for idx, swarm in enumerate(stream.elements()):
+                swarm_key, error_list = _check_swarm(swarm, idx, swarm_ids)
+                for error in error_list:
+                    yield 'swarms', swarm_key, 'errors', error
+                counts['swarms'] += 1
+            swarms_read = True
+            for swarm_id, node_keys in pending.items():
+                if swarm_id not in swarm_ids:
+                    for node_key in node_keys:
+                        yield 'nodes', node_key, 'warnings', {'swarm_warning': f"No swarm found with id {swarm_id}"}
+            pending.clear()
+        elif section == 'nodes':
+            counts.setdefault('nodes', 0)
+            for node in stream.elements():
+                node_key, error_list = _check_node(node, counts['nodes'], node_ids, node_ips)
+                for error in error_list:
+                    yield 'nodes', node_key, 'errors', error
+                swarm_id = node.get('swarm')
+                if swarm_id is not None and swarm_id not in swarm_ids:
+                    if swarms_read:
+                        yield 'nodes', node_key, 'warnings', {'swarm_warning': f"No swarm found with id {swarm_id}"}
+                    else:
+                        pending.setdefault(swarm_id, []).append(node_key)
+                counts['nodes'] += 1
+        else:
+            stream.value()
+    stream.end()
+    # Without a swarms section node swarms are not checked, as in validate_node_data
+    return counts
+
+
+def _stream_main(file_path):
+    """
+    Print the problems in the client_dict json at file_path as they are found
+    """
+    failed = {'swarms': set(), 'nodes': set()}
+    warnings = 0
+    with open(file_path, 'r') as client_dict_file:
+        results = stream_validate(client_dict_file)
+        while True:
+            try:
+                section, key, level, message = next(results)
+            except StopIteration as done:
+                counts = done.value
+                break
+            if level == 'errors':
+                failed[section].add(key)
+            else:
+                warnings += 1
+            for ekey, msg in message.items():
+                print(f"{section} {key}: {ekey}: {msg}")
+
+    for section, label in (('swarms', 'Swarm'), ('nodes', 'Node')):
+        if section not in counts:
+            print(f"No {label}s to Validate\n")
+        elif failed[section]:
+            print('*'*10, f'{label} Validation Failed', '*'*10)
+            print(f"{counts[section]} Checked, {len(failed[section])} Failed - {(len(failed[section]) / counts[section])*100}%\n")
+        else:
+            print('*'*10, f'{label} Validation Successful', '*'*10)
+            print(f"{counts[section]} Checked\n")
+    if warnings > 0:
+        print('*'*10, 'Node Validation Warnings Found', '*'*10)
+        print(f"{counts['nodes']} Checked, {warnings} Warnings")
+
+
 def __main__():
     """
     Takes in a file path as an argument and parses the file to check if it is a 
@@ -129,17 +515,24 @@ def __main__():
     import os
     parser = argparse.ArgumentParser(description='Validate client_dict definition json')
     parser.add_argument('file_path', help='File path to client_dict definition json')
+    parser.add_argument('--stream', action='store_true',
+                        help='Validate without loading the file, printing problems as they are found')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes to validate with')
     args = parser.parse_args()
     file_path = args.file_path
     script_dir = os.path.dirname(__file__)
 
     abs_file_path = os.path.join(script_dir, file_path)
+    if args.stream:
+        _stream_main(abs_file_path)
+        return
     with open(abs_file_path, 'r') as client_dict_file:
         client_dict = json.load(client_dict_file)
     
     # Validate Swarm Entries
     if client_dict.get('swarms') is not None:
-        response = validate_swarm_data(client_dict['swarms'])
+        response = validate_swarm_data(client_dict['swarms'], jobs=args.jobs)
         if len(response) > 0:
             print('*'*10, 'Swarm Validation Failed', '*'*10)
             print(f"{len(client_dict['swarms'])} Checked, {len(response)} Failed - {(len(response) / len(client_dict['swarms']))*100}%\n")
@@ -157,7 +550,7 @@ def __main__():
     
     # Validate Node Entries
     if client_dict.get('nodes') is not None:
-        response = validate_node_data(client_dict['nodes'], client_dict.get('swarms'))
+        response = validate_node_data(client_dict['nodes'], client_dict.get('swarms'), jobs=args.jobs)
         # Count the number of nodes with an error
         failed_nodes = 0
         warnings = 0